@@ -1,45 +1,152 @@
 # -*- coding: utf-8 -*-
-from flask import Flask, Response, jsonify
+import time
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from platforms import PlatformFactory
+from platforms.batch import get_book_details
+from platforms.downloads import download_response, download_stats
+from platforms.fanout import search_platforms
+from platforms.mirrors import mirror_stats
+from platforms.pagination import search_paginated
+from platforms.streaming import STREAM_FORMATS, stream_search, stream_platforms, encode_events
+from platforms.warmer import get_warmer, start_cache_warmer
 from utils.errors import BookSearchError
+from utils.admission import admission_stats, admit
 from config import Config
+from utils.book_index import get_book_index
+from utils.cache import get_cache
+from utils.decorators import cache_key, get_single_flight, get_async_single_flight
+from utils.event_loop import get_loop
+from utils.http_cache import cached_json_response
+from utils.logs import logging_stats, set_request_id, setup_logging
+from utils.metrics import HTTP_IN_FLIGHT, HTTP_REQUEST_SECONDS, REGISTRY, render_metrics
+from utils.profiling import RequestProfiler, is_authorized
+from utils.query import canonicalize, parse_isbn, query_stats
+from utils.ratelimit import rate_limit_stats
+from utils.resilience import resilience_stats
+from utils.serialization import json_response
 import logging
-import os
-from logging.handlers import RotatingFileHandler
+import uuid
 from flask_cors import CORS
 
-# Create logs directory if it doesn't exist
-if not os.path.exists('logs'):
-    os.makedirs('logs')
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-
-# Create file handler
-file_handler = RotatingFileHandler(
-    'logs/app.log',
-    maxBytes=1024 * 1024,  # 1MB
-    backupCount=10
-)
-file_handler.setFormatter(logging.Formatter(
-    '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-))
+# Queue-based logging: formatting and file I/O run on a background thread
+setup_logging()
 
 # Get logger
 logger = logging.getLogger(__name__)
-logger.addHandler(file_handler)
 
 app = Flask(__name__)
 CORS(app)  # 启用CORS支持
 
+# Platforms are imported on first use; a preloading master imports them
+# up front instead, so its workers inherit the loaded modules
+if Config.PLATFORM_WARMUP:
+    logger.info(f"Warmed up platforms: {', '.join(PlatformFactory.warm_up())}")
+
+@app.before_request
+def _start_request():
+    g.request_started = time.perf_counter()
+    # Keep popular queries warm in the response cache; started by each
+    # worker's first request, as threads of a preloading master are not forked
+    start_cache_warmer()
+    # Honour an id set by the proxy so log lines can be joined across tiers
+    g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+    set_request_id(g.request_id)
+    g.metrics_endpoint = request.endpoint or 'unmatched'
+    HTTP_IN_FLIGHT.inc(g.metrics_endpoint)
+    # Admin-only: ?profile=1 or X-Profile: 1, with the X-Admin-Token header
+    if request.args.get('profile') == '1' or request.headers.get('X-Profile') == '1':
+        if not is_authorized(request.headers.get('X-Admin-Token')):
+            raise BookSearchError("Profiling requires a valid X-Admin-Token", 403)
+        profiler = RequestProfiler()
+        if not profiler.start():
+            raise BookSearchError("Another request is being profiled", 409)
+        g.profiler = profiler
+
+@app.after_request
+def _finish_request(response: Response) -> Response:
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+        # The report replaces the body; a streamed body is never consumed
+        response = jsonify(profiler.report(response.status_code))
+        response.headers['Cache-Control'] = 'no-store'
+    started = g.get('request_started')
+    if started is not None:
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, g.metrics_endpoint, response.status_code)
+    if 'request_id' in g:
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+@app.teardown_request
+def _end_request(error=None):
+    set_request_id(None)
+    endpoint = g.pop('metrics_endpoint', None)
+    if endpoint is not None:
+        HTTP_IN_FLIGHT.dec(endpoint)
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.stop()
+
+def _stream_format() -> str:
+    """
+    Get the requested stream format from the 'stream' query arg
+    Returns:
+        'ndjson', 'sse', or '' for a regular JSON response
+    Raises:
+        BookSearchError: If the format is not supported
+    """
+    stream_format = request.args.get('stream', '').strip().lower()
+    if stream_format and stream_format not in STREAM_FORMATS:
+        raise BookSearchError(f"Unsupported stream format '{stream_format}'", 400)
+    return stream_format
+
+def _stream_response(events, stream_format: str) -> Response:
+    """Send events as they are produced, without buffering the whole result"""
+    response = Response(stream_with_context(encode_events(events, stream_format)),
+                        mimetype=STREAM_FORMATS[stream_format])
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # keep reverse proxies from buffering
+    return response
+
+def _response_shape() -> str:
+    """
+    Get the requested response shape from the 'shape' query arg
+    Returns:
+        'columns' (book lists as field names plus one array per book) or ''
+    Raises:
+        BookSearchError: If the shape is not supported
+    """
+    shape = request.args.get('shape', '').strip().lower()
+    if shape and shape != 'columns':
+        raise BookSearchError(f"Unsupported response shape '{shape}'", 400)
+    return shape
+
+def _json_response(payload, status: int = 200) -> Response:
+    """Serialize a response through the fast JSON path, in the requested shape"""
+    return json_response(payload, status, _response_shape())
+
+def _local_search(keyword: str, platform_ids: list) -> dict:
+    """
+    Answer a search from the local book index instead of upstream
+    Raises:
+        BookSearchError: If the local index is disabled
+    """
+    index = get_book_index()
+    if index is None:
+        raise BookSearchError("Local index is disabled", 503)
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    books = index.search(keyword, platform_ids, limit)
+    return {'books': books, 'total': len(books), 'mode': 'local'}
+
 @app.errorhandler(BookSearchError)
 def handle_book_search_error(error):
     """Global error handler for book search errors"""
     logger.error(f"Book search error: {str(error)}")
-    return jsonify({'error': str(error)}), error.status_code
+    response = jsonify({'error': str(error)})
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(retry_after)
+    return response, error.status_code
 
 @app.route('/<platform>/s/<keyword>')
 def search(platform: str, keyword: str):
@@ -48,23 +155,69 @@ def search(platform: str, keyword: str):
     Args:
         platform: Platform name (e.g., 'zlibrary')
         keyword: Search keyword
+    Query args:
+        stream: 'ndjson' or 'sse' to stream books as they are parsed
+        mode: 'local' to answer from the local book index only
+        limit: Maximum number of books in local mode
+        shape: 'columns' for book lists as field names plus rows
+    Regular responses carry an ETag and are compressed per Accept-Encoding
+    (see utils.http_cache). They go through admission control: when the
+    platform is busy a cached result is served, or the request waits
+    briefly, or it gets 429/503 with Retry-After (see utils.admission)
     """
-    logger.info(f"Received search request - Platform: {platform}, Keyword: {keyword}")
+    logger.info(f"Received search request - Platform: {platform}, Keyword: {keyword}",
+                extra={'event': 'search_request', 'platform': platform, 'keyword': keyword})
+    stream_format = _stream_format()
     
     try:
-        platform_instance = PlatformFactory.get_platform(platform)
-        result = platform_instance.search(keyword)
+        if request.args.get('mode') == 'local':
+            return _json_response(_local_search(keyword, [platform.lower()]))
+        if stream_format:
+            return _stream_response(stream_search(platform, keyword), stream_format)
+        # ISBNs go to the exact-match lookup instead of a keyword search
+        isbn = parse_isbn(keyword)
+        if Config.ASYNC_SERVING:
+            search_platform = PlatformFactory.get_async_platform(platform)
+            call = lambda: get_loop().run(search_platform.search_isbn(isbn) if isbn else search_platform.search(keyword))
+        else:
+            search_platform = PlatformFactory.get_platform(platform)
+            call = lambda: search_platform.search_isbn(isbn) if isbn else search_platform.search(keyword)
+        key = cache_key(search_platform.platform_id, 'search', canonicalize(keyword))
+        result = admit(search_platform.platform_id, search_platform.config, key, call)
         
         # Log search results
         if isinstance(result['content'], dict):
             total_books = result['content'].get('total', 0)
             logger.info(f"Search completed - Found {total_books} books")
         
-        return jsonify(result['content']), result['status']
+        return cached_json_response(result, key, _response_shape())
     except Exception as e:
         logger.error(f"Search failed: {str(e)}")
         raise
 
+@app.route('/<platform>/search')
+def search_paged(platform: str):
+    """
+    Cursor-paginated search on specified platform
+    Query args:
+        q: Search keyword (first slice)
+        cursor: next_cursor of the previous slice (replaces q)
+        per_page: Books per slice (defaults to Config.SEARCH_PER_PAGE)
+    """
+    keyword = request.args.get('q', '').strip()
+    cursor = request.args.get('cursor', '').strip()
+    if not keyword and not cursor:
+        raise BookSearchError("Missing search keyword 'q' or 'cursor'", 400)
+    per_page = request.args.get('per_page', type=int)
+    logger.info(f"Received paginated search request - Platform: {platform}, Keyword: {keyword}, Cursor: {cursor}")
+    
+    try:
+        result = search_paginated(platform, keyword, per_page, cursor or None)
+    except ValueError as e:
+        raise BookSearchError(str(e), 400)
+    logger.info(f"Paginated search completed - Returned {result['total']} books from offset {result['offset']}")
+    return _json_response(result)
+
 @app.route('/<platform>/book/<book_id>')
 def get_book(platform: str, book_id: str):
     """
@@ -72,17 +225,261 @@ def get_book(platform: str, book_id: str):
     Args:
         platform: Platform name (e.g., 'zlibrary')
         book_id: Book identifier
+    Responses carry an ETag and are compressed per Accept-Encoding, and go
+    through admission control like searches
     """
     logger.info(f"Received book detail request - Platform: {platform}, Book ID: {book_id}")
     
     try:
-        platform_instance = PlatformFactory.get_platform(platform)
-        result = platform_instance.get_book_detail(book_id)
-        return jsonify(result['content']), result['status']
+        if Config.ASYNC_SERVING:
+            detail_platform = PlatformFactory.get_async_platform(platform)
+            call = lambda: get_loop().run(detail_platform.get_book_detail(book_id))
+        else:
+            detail_platform = PlatformFactory.get_platform(platform)
+            call = lambda: detail_platform.get_book_detail(book_id)
+        key = cache_key(detail_platform.platform_id, 'get_book_detail', book_id)
+        result = admit(detail_platform.platform_id, detail_platform.config, key, call)
+        return cached_json_response(result, key)
     except Exception as e:
         logger.error(f"Get book detail failed: {str(e)}")
         raise
 
+@app.route('/<platform>/download/<book_id>')
+def download_book(platform: str, book_id: str):
+    """
+    Download a book's file through the backend
+    Args:
+        platform: Platform name (e.g., 'zlibrary')
+        book_id: Book identifier
+    The file is streamed in fixed-size chunks and Range requests are
+    supported (206), so downloads can be resumed. With DOWNLOAD_CACHE_DIR set
+    it is also kept on disk and later served by sendfile or nginx
+    """
+    logger.info(f"Received download request - Platform: {platform}, Book ID: {book_id}")
+    try:
+        return download_response(platform, book_id)
+    except ValueError as e:
+        raise BookSearchError(str(e), 400)
+
+@app.route('/<platform>/books')
+def get_books(platform: str):
+    """
+    Get details of several books in one round trip
+    Cached books are answered without touching upstream; the rest are fetched
+    concurrently (at most Config.BATCH_CONCURRENCY at a time)
+    Query args:
+        ids: Comma separated book identifiers
+        deadline: Seconds to wait for upstream fetches (defaults to Config.SEARCH_DEADLINE)
+    """
+    book_ids = [book_id.strip() for book_id in request.args.get('ids', '').split(',') if book_id.strip()]
+    if not book_ids:
+        raise BookSearchError("Missing book identifiers 'ids'", 400)
+    if len(book_ids) > Config.BATCH_MAX_IDS:
+        raise BookSearchError(f"At most {Config.BATCH_MAX_IDS} ids per request", 400)
+    deadline = request.args.get('deadline', type=float)
+    logger.info(f"Received batch book detail request - Platform: {platform}, Books: {len(book_ids)}")
+    
+    try:
+        result = get_book_details(platform, book_ids, deadline)
+    except ValueError as e:
+        raise BookSearchError(str(e), 400)
+    logger.info(f"Batch book detail completed - {result['cached']} cached, {result['fetched']} fetched, "
+                f"{len(result['errors'])} failed")
+    return _json_response(result)
+
+@app.route('/search')
+def search_multi():
+    """
+    Search several platforms concurrently
+    Query args:
+        q: Search keyword
+        platforms: Comma separated platform names (defaults to all registered)
+        deadline: Global deadline in seconds (defaults to Config.SEARCH_DEADLINE)
+        stream: 'ndjson' or 'sse' to stream each platform's books as it finishes
+        mode: 'local' to answer from the local book index only
+    """
+    keyword = request.args.get('q', '').strip()
+    if not keyword:
+        raise BookSearchError("Missing search keyword 'q'", 400)
+    names = [name.strip().lower() for name in request.args.get('platforms', '').split(',') if name.strip()]
+    if not names:
+        names = PlatformFactory.available_platforms()
+    deadline = request.args.get('deadline', type=float)
+    logger.info(f"Received multi-platform search request - Platforms: {','.join(names)}, Keyword: {keyword}")
+    if request.args.get('mode') == 'local':
+        return _json_response(_local_search(keyword, names))
+    stream_format = _stream_format()
+    if stream_format:
+        return _stream_response(stream_platforms(keyword, names, deadline), stream_format)
+    
+    result = search_platforms(keyword, names, deadline)
+    logger.info(f"Multi-platform search completed - Found {result['total']} books in {result['latency_ms']}ms")
+    return _json_response(result)
+
+@app.route('/suggest')
+def suggest():
+    """
+    Autocomplete book titles from the local book index
+    Query args:
+        q: Query typed so far
+        platforms: Comma separated platform names (defaults to all)
+        limit: Maximum number of suggestions (defaults to 10)
+    """
+    prefix = request.args.get('q', '').strip()
+    if not prefix:
+        return jsonify({'query': prefix, 'suggestions': []})
+    index = get_book_index()
+    if index is None:
+        raise BookSearchError("Local index is disabled", 503)
+    names = [name.strip().lower() for name in request.args.get('platforms', '').split(',') if name.strip()]
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    return jsonify({'query': prefix, 'suggestions': index.suggest(prefix, names or None, limit)})
+
+@app.route('/stats/pools')
+def pool_stats():
+    """Connection pool statistics (connections reused vs. opened) per platform"""
+    return jsonify(PlatformFactory.pool_stats())
+
+@app.route('/stats/platforms')
+def platform_stats():
+    """Registered platforms and those imported so far (they load on first use)"""
+    return jsonify({
+        'available': PlatformFactory.available_platforms(),
+        'loaded': PlatformFactory.loaded_platforms()
+    })
+
+@app.route('/stats/cache')
+def cache_stats():
+    """Response cache hit/miss/eviction counters"""
+    return jsonify(get_cache().info())
+
+@app.route('/stats/coalescing')
+def coalescing_stats():
+    """Counts of upstream calls deduplicated by request coalescing"""
+    stats = get_single_flight().stats()
+    stats['async'] = get_async_single_flight().stats()
+    return jsonify(stats)
+
+@app.route('/stats/resilience')
+def resilience_stats_view():
+    """Circuit breaker state and retry budget counters per platform"""
+    return jsonify(resilience_stats())
+
+@app.route('/stats/admission')
+def admission_stats_view():
+    """Admission control slots, queue depth and shed requests per platform"""
+    return jsonify(admission_stats())
+
+@app.route('/stats/ratelimit')
+def rate_limit_stats_view():
+    """Outbound requests granted, delayed and refused by the rate limiter per platform"""
+    return jsonify(rate_limit_stats())
+
+@app.route('/stats/downloads')
+def download_stats_view():
+    """Download cache hits, misses, size and evictions"""
+    return jsonify(download_stats())
+
+@app.route('/stats/index')
+def index_stats():
+    """Local book index size and ingestion counters"""
+    index = get_book_index()
+    return jsonify(index.stats() if index is not None else {'enabled': False})
+
+@app.route('/stats/queries')
+def query_stats_view():
+    """How many distinct raw queries collapse onto each canonical query"""
+    return jsonify(query_stats())
+
+@app.route('/stats/mirrors')
+def mirror_stats_view():
+    """Mirror latency/error scores, health and hedging counters per platform"""
+    return jsonify(mirror_stats())
+
+def _cache_samples():
+    stats = get_cache().info()
+    for result, field in (('hit', 'hits'), ('stale', 'stale_hits'), ('negative', 'negative_hits'),
+                          ('miss', 'misses'), ('stale_if_error', 'stale_if_error_hits'),
+                          ('stale_if_overload', 'stale_if_overload_hits')):
+        yield '', (('result', result),), stats[field]
+
+def _cache_ratio_samples():
+    stats = get_cache().info()
+    lookups = stats['hits'] + stats['stale_hits'] + stats['negative_hits'] + stats['misses']
+    for result, field in (('hit', 'hits'), ('stale', 'stale_hits'), ('negative', 'negative_hits'), ('miss', 'misses')):
+        yield '', (('result', result),), stats[field] / lookups if lookups else 0.0
+
+def _cache_size_samples():
+    stats = get_cache().info()
+    yield '', (('unit', 'entries'),), stats['memory_entries']
+    yield '', (('unit', 'bytes'),), stats['memory_bytes']
+
+def _breaker_samples():
+    for platform_id, stats in resilience_stats().items():
+        yield '', (('platform', platform_id), ('state', stats['state'])), 1
+
+def _retry_budget_samples():
+    for platform_id, stats in resilience_stats().items():
+        yield '', (('platform', platform_id),), stats['retry_budget_exhausted']
+
+def _coalescing_samples():
+    for flavour, stats in (('sync', get_single_flight().stats()), ('async', get_async_single_flight().stats())):
+        for field in ('calls', 'executions', 'deduplicated'):
+            yield '', (('mode', flavour), ('result', field)), stats[field]
+
+def _pool_samples():
+    for platform_id, stats in PlatformFactory.pool_stats().items():
+        yield '', (('platform', platform_id), ('connection', 'opened')), stats['connections_opened']
+        yield '', (('platform', platform_id), ('connection', 'reused')), stats['connections_reused']
+
+def _admission_queue_samples():
+    for platform_id, stats in admission_stats().items():
+        yield '', (('platform', platform_id), ('state', 'active')), stats['active']
+        yield '', (('platform', platform_id), ('state', 'waiting')), stats['waiting']
+
+def _admission_samples():
+    for platform_id, stats in admission_stats().items():
+        yield '', (('platform', platform_id), ('result', 'admitted')), stats['admitted']
+        yield '', (('platform', platform_id), ('result', 'served_stale')), stats['served_stale']
+        for reason, count in stats['shed'].items():
+            yield '', (('platform', platform_id), ('result', reason)), count
+
+def _rate_limit_samples():
+    for platform_id, stats in rate_limit_stats().items():
+        for result in ('granted', 'delayed', 'rejected'):
+            yield '', (('platform', platform_id), ('result', result)), stats[result]
+
+def _rate_limit_wait_samples():
+    for platform_id, stats in rate_limit_stats().items():
+        yield '', (('platform', platform_id),), stats['wait_seconds']
+
+REGISTRY.register_collector('booksearch_cache_lookups_total', 'counter', 'Response cache lookups by result', _cache_samples)
+REGISTRY.register_collector('booksearch_cache_lookup_ratio', 'gauge', 'Share of cache lookups by result', _cache_ratio_samples)
+REGISTRY.register_collector('booksearch_cache_memory', 'gauge', 'In-memory cache tier size', _cache_size_samples)
+REGISTRY.register_collector('booksearch_circuit_breaker_state', 'gauge', 'Circuit breaker state per platform (1 = current)', _breaker_samples)
+REGISTRY.register_collector('booksearch_retry_budget_exhausted_total', 'counter', 'Retries refused by the retry budget', _retry_budget_samples)
+REGISTRY.register_collector('booksearch_coalescing_calls_total', 'counter', 'Coalesced platform calls', _coalescing_samples)
+REGISTRY.register_collector('booksearch_admission_requests', 'gauge', 'Requests holding or waiting for an admission slot', _admission_queue_samples)
+REGISTRY.register_collector('booksearch_admission_decisions_total', 'counter', 'Admission decisions: admitted, served stale or shed', _admission_samples)
+REGISTRY.register_collector('booksearch_rate_limit_tokens_total', 'counter', 'Outbound rate limiter decisions', _rate_limit_samples)
+REGISTRY.register_collector('booksearch_rate_limit_wait_seconds_total', 'counter', 'Time spent waiting for rate limiter tokens', _rate_limit_wait_samples)
+REGISTRY.register_collector('booksearch_upstream_connections_total', 'counter', 'Upstream connections opened and reused', _pool_samples)
+
+@app.route('/metrics')
+def metrics():
+    """This worker's metrics in the Prometheus text format"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/stats/logging')
+def logging_stats_view():
+    """Log queue depth and records dropped because the queue was full"""
+    return jsonify(logging_stats())
+
+@app.route('/stats/warmer')
+def warmer_stats():
+    """Cache warmer passes, refresh budget and the current query popularity ranking"""
+    return jsonify(get_warmer().stats())
+
 if __name__ == '__main__':
     logger.info(f"Starting server - Debug: {Config.DEBUG}, Host: {Config.HOST}, Port: {Config.PORT}")
     app.run(
@@ -1,4 +1,5 @@
 from flask import Blueprint, request, jsonify
+from utils.errors import BookSearchError
 from .search import search_books
 
 main = Blueprint('main', __name__)
@@ -16,6 +17,8 @@ def search():
     try:
         results = search_books(keywords, page, per_page)
         return jsonify(results)
+    except BookSearchError as e:
+        return jsonify({'error': str(e)}), e.status_code
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -1,15 +1,29 @@
 import asyncio
-import aiohttp
-from bs4 import BeautifulSoup
-import re
+import logging
 import urllib.parse
+from platforms.pagination import get_cursor_store
+from utils.errors import SearchError
+from utils.event_loop import get_loop
+from utils.query import Query, parse_isbn
 
-async def search_zlibrary(session, keyword):
-    """Search Z-Library for books"""
+logger = logging.getLogger(__name__)
+
+async def search_zlibrary(session, keyword, page=1):
+    """
+    Search Z-Library for books (one upstream result page)
+    Returns:
+        Books of the page; an empty list only when the page has no results
+    Raises:
+        SearchError: If the page cannot be fetched, so it is not taken for
+            the end of the results
+    """
+    import aiohttp
     try:
         # URL encode the keyword
-        encoded_keyword = urllib.parse.quote(keyword)
+        encoded_keyword = urllib.parse.quote(keyword, safe='')
         url = f"https://z-library.sk/s/{encoded_keyword}"
+        if page > 1:
+            url = f"{url}?page={page}"
         headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -19,17 +33,19 @@ async def search_zlibrary(session, keyword):
         
         async with session.get(url, headers=headers, timeout=30) as response:
             if response.status != 200:
-                print(f"Error: Received status code {response.status} from Z-Library")
-                return []
+                raise SearchError(f"status code {response.status}", 'Z-Library',
+                                  retryable=response.status == 429 or response.status >= 500)
                 
             html = await response.text()
-            soup = BeautifulSoup(html, 'html.parser')
+            from bs4 import BeautifulSoup, SoupStrainer
+            # Only build the tree for result boxes, not the whole page
+            soup = BeautifulSoup(html, 'html.parser', parse_only=SoupStrainer('div', class_='resItemBox'))
             
             results = []
             books = soup.find_all('div', class_='resItemBox')
             
             if not books:
-                print("Warning: No books found in the response HTML")
+                logger.warning(f"No books found in the Z-Library response for: {keyword} (page {page})")
                 return []
             
             for book in books:
@@ -49,62 +65,62 @@ async def search_zlibrary(session, keyword):
                         }
                         results.append(result)
                 except Exception as e:
-                    print(f"Error parsing book element: {str(e)}")
+                    logger.warning(f"Error parsing book element: {str(e)}")
                     continue
             
             return results
-    except asyncio.TimeoutError:
-        print(f"Timeout while searching Z-Library for: {keyword}")
-        return []
-    except Exception as e:
-        print(f"Error searching Z-Library: {str(e)}")
-        return []
+    except asyncio.TimeoutError as e:
+        logger.error(f"Timeout while searching Z-Library for: {keyword}")
+        raise SearchError('timeout', 'Z-Library', retryable=True) from e
+    except aiohttp.ClientError as e:
+        logger.error(f"Error searching Z-Library: {str(e)}")
+        raise SearchError(str(e), 'Z-Library', retryable=True) from e
 
 def is_isbn(keyword):
-    """Check if the keyword is an ISBN (10 or 13 digits)"""
-    isbn_pattern = re.compile(r'^(?:\d{10}|\d{13})$')
-    return bool(isbn_pattern.match(keyword.replace('-', '')))
+    """Check if the keyword is an ISBN-10/13 with a valid checksum"""
+    return parse_isbn(keyword) is not None
 
-async def search_all_sources(keyword):
+async def search_all_sources(keyword, page=1):
     """Search all configured sources for a single book"""
-    async with aiohttp.ClientSession() as session:
-        try:
-            results = await search_zlibrary(session, keyword)
-            return results
-        except Exception as e:
-            print(f"Error in search_all_sources: {str(e)}")
-            return []
+    # Shared, long-lived session of the worker's background loop
+    session = await get_loop().session()
+    return await search_zlibrary(session, keyword, page)
 
 def search_books(keywords, page=1, per_page=10):
-    """Main search function that coordinates the search across all sources"""
+    """
+    Main search function that coordinates the search across all sources
+    Raises:
+        SearchError: If an upstream page the slice needs cannot be fetched
+    """
     if not keywords:
         return {'error': 'No keywords provided'}
     
-    # Clean up the input - we only take the first keyword now
-    keyword = keywords.split(',')[0].strip()
+    # Clean up the input - we only take the first keyword now; equivalent
+    # spellings share fetched pages through its canonical form
+    keyword = Query(keywords.split(',')[0])
     if not keyword:
         return {'error': 'Invalid keyword'}
     
-    # Run async search
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    try:
-        all_results = loop.run_until_complete(search_all_sources(keyword))
-    except Exception as e:
-        print(f"Error in search_books: {str(e)}")
-        all_results = []
-    finally:
-        loop.close()
+    # Upstream pages are fetched on demand and kept per query, so paging
+    # deeper only fetches the pages it needs and the next one is prefetched.
+    # A failed fetch raises, so it is neither kept nor read as the last page
+    def fetch_page(number):
+        return get_loop().run(search_all_sources(keyword, number))
     
-    # Calculate pagination
-    start_idx = (page - 1) * per_page
-    end_idx = start_idx + per_page
-    paginated_results = all_results[start_idx:end_idx]
+    pages = get_cursor_store().get('api', keyword.canonical, fetch_page)
+    paginated_results, has_more = pages.slice((page - 1) * per_page, per_page)
     
+    # The full result count is unknown until the last upstream page is read;
+    # `loaded` counts the books of the pages fetched so far. `total` and
+    # `total_pages` are kept for existing callers as lower bounds from it;
+    # `has_more` tells whether another slice follows
+    loaded = pages.loaded_count()
     return {
         'results': paginated_results,
-        'total': len(all_results),
+        'total': loaded,
+        'loaded': loaded,
         'page': page,
         'per_page': per_page,
-        'total_pages': (len(all_results) + per_page - 1) // per_page
+        'total_pages': (loaded + per_page - 1) // per_page,
+        'has_more': has_more
     } 
\ No newline at end of file
@@ -0,0 +1,135 @@
+"""
+Z-Library style result pages for parser checks and benchmarks.
+
+Saved pages live in benchmarks/corpus/*.html; generate_search_page() builds
+synthetic ones of any size with the quirks seen in real pages (entities,
+nested markup in slots, comments, missing slots and attributes), and
+generate_detail_page() builds book pages.
+"""
+import glob
+import html
+import os
+import random
+from typing import Dict
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+
+_TITLES = [
+    '高等数学（第七版）', 'Clean Code: A Handbook of Agile Software Craftsmanship',
+    'Structure & Interpretation of Computer Programs', 'Operating Systems: Three Easy Pieces',
+    '"Quoted" <Title> Edition', 'Introduction to Algorithms', '操作系统概念', 'The Rust Programming Language'
+]
+_AUTHORS = ['同济大学数学系', 'Robert C. Martin', 'Harold Abelson; Gerald Jay Sussman', 'Remzi Arpaci-Dusseau',
+            'Thomas H. Cormen', 'Abraham Silberschatz', 'Steve Klabnik & Carol Nichols']
+_EXTENSIONS = ['pdf', 'epub', 'djvu', 'mobi', 'azw3']
+_LANGUAGES = ['chinese', 'english', 'german', 'russian']
+
+def _card(rng: random.Random, index: int) -> str:
+    attrs = {
+        'id': str(1000000 + index),
+        'isbn': f"978{rng.randrange(10 ** 9, 10 ** 10)}",
+        'href': f"/book/{1000000 + index}/{rng.randrange(16 ** 6):06x}/book-{index}.html",
+        'download': f"/dl/{1000000 + index}/{rng.randrange(16 ** 6):06x}",
+        'publisher': rng.choice(['高等教育出版社', 'Prentice Hall', 'MIT Press', "O'Reilly Media"]),
+        'language': rng.choice(_LANGUAGES),
+        'year': str(rng.randrange(1980, 2025)),
+        'extension': rng.choice(_EXTENSIONS),
+        'filesize': f"{rng.uniform(0.2, 80):.2f} MB",
+        'rating': f"{rng.uniform(0, 5):.1f}",
+        'quality': f"{rng.uniform(0, 5):.1f}",
+    }
+    # Drop some optional attributes so defaults get exercised
+    for optional in ('publisher', 'language', 'rating', 'quality', 'year', 'isbn'):
+        if rng.random() < 0.1:
+            del attrs[optional]
+    if rng.random() < 0.03:
+        del attrs['href']
+    rendered = ' '.join(f'{name}="{html.escape(value)}"' for name, value in attrs.items())
+
+    title = html.escape(rng.choice(_TITLES))
+    author = html.escape(rng.choice(_AUTHORS))
+    roll = rng.random()
+    if roll < 0.1:
+        title = f"<b>{title}</b> <!-- promoted --> <span>  </span>"
+    elif roll < 0.15:
+        title = f"\n   {title}\n  <div class=\"subtitle\">Vol. {index % 4}</div>\n"
+    slots = f'<div slot="title">{title}</div>'
+    if rng.random() > 0.05:
+        slots += f'\n    <div slot="author">{author}</div>'
+    return (
+        f'<z-bookcard {rendered}>\n'
+        f'    <img src="/covers/{index}.jpg" alt="cover">\n'
+        f'    {slots}\n'
+        f'</z-bookcard>'
+    )
+
+def generate_search_page(cards: int = 50, seed: int = 0) -> bytes:
+    """
+    Build a synthetic result page
+    Args:
+        cards: Number of z-bookcard elements
+        seed: Random seed, so pages are reproducible
+    Returns:
+        UTF-8 encoded HTML
+    """
+    rng = random.Random(seed)
+    boilerplate = '\n'.join(
+        f'<div class="nav-item"><a href="/category/{i}">Category {i}</a></div>' for i in range(200)
+    )
+    body = '\n'.join(
+        f'<div class="book-item resItemBoxBooks">\n{_card(rng, seed * 1000 + i)}\n</div>' for i in range(cards)
+    )
+    page = (
+        '<!DOCTYPE html>\n<html lang="en"><head><meta charset="utf-8"><title>Search</title>\n'
+        '<script>window.__config = {"a": "<z-bookcard-like>"};</script>\n'
+        f'</head><body>\n<nav>{boilerplate}</nav>\n'
+        f'<div id="searchResultBox">\n{body}\n</div>\n'
+        '<footer><p>&copy; Z-Library</p></footer>\n</body></html>\n'
+    )
+    return page.encode('utf-8')
+
+def generate_detail_page(book_id: str, seed: int = 0) -> bytes:
+    """
+    Build a synthetic book page in the layout BookDetailParser reads
+    Args:
+        book_id: Book identifier used in the page's links
+        seed: Random seed, so pages are reproducible
+    Returns:
+        UTF-8 encoded HTML
+    """
+    rng = random.Random(seed)
+    authors = ', '.join(f'<a href="/author/{i}">{html.escape(name.strip())}</a>'
+                        for i, name in enumerate(rng.choice(_AUTHORS).split(';')))
+    properties = '\n'.join(
+        f'<div class="bookProperty property_{key}"><div class="property_label">{key.strip("_").title()}:</div>'
+        f'<div class="property_value">{html.escape(value)}</div></div>'
+        for key, value in (('year', str(rng.randrange(1980, 2025))), ('language', rng.choice(_LANGUAGES)),
+                           ('_file', f"{rng.choice(_EXTENSIONS).upper()}, {rng.uniform(0.2, 80):.2f} MB"))
+    )
+    description = ' '.join(['A <b>thorough</b> treatment of the subject.'] * rng.randrange(5, 40))
+    page = (
+        '<!DOCTYPE html>\n<html lang="en"><head><meta charset="utf-8"><title>Book</title></head><body>\n'
+        f'<div class="col-sm-9"><h1 class="book-title" itemprop="name">{html.escape(rng.choice(_TITLES))}</h1>\n'
+        f'<i class="authors">{authors}</i>\n'
+        f'<z-cover id="{book_id}"><img class="image" data-src="/covers/{book_id}.jpg"></z-cover>\n'
+        f'<div id="bookDescriptionBox">{description}</div>\n'
+        f'<div class="bookDetailsBox">{properties}</div>\n'
+        f'<a class="btn addDownloadedBook" href="/dl/{book_id}/{rng.randrange(16 ** 6):06x}">Download</a>'
+        '</div>\n</body></html>\n'
+    )
+    return page.encode('utf-8')
+
+def load_corpus() -> Dict[str, bytes]:
+    """
+    Load saved result pages plus a spread of synthetic ones
+    Returns:
+        Page contents keyed by name
+    """
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, '*.html'))):
+        with open(path, 'rb') as f:
+            pages[os.path.basename(path)] = f.read()
+    for seed, cards in enumerate([0, 1, 10, 50, 50, 100]):
+        pages[f"synthetic-{seed}-{cards}"] = generate_search_page(cards, seed)
+    return pages
+
@@ -0,0 +1,206 @@
+"""
+Local stand-in for Z-Library, for load tests that must not hit the real site.
+
+Usage (from backend/):
+    python -m benchmarks.fake_upstream [--port 8765] [--latency 0.15] [--jitter 0.05]
+                                       [--error-rate 0.0] [--throttle-rps 0]
+
+Serves search result pages (/s/<keyword>, ?page=N) made of the saved corpus
+pages and generated ones, book pages (/book/<id>) and small files
+(/dl/<id>/..., answering single byte Range requests with 206). Every response is delayed by `latency` +- `jitter` seconds; a
+share of them (`error_rate`) fail with 500, and beyond `throttle_rps`
+requests per second the server answers 429 with Retry-After, like the real
+site does. Point the backend at it with ZLIBRARY_BASE_URL=http://127.0.0.1:<port>.
+"""
+import argparse
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+from benchmarks.corpus import generate_detail_page, generate_search_page, load_corpus
+
+class FakeUpstream:
+    """
+    Threaded HTTP server imitating Z-Library's search, book and download pages.
+    Pages are built once per keyword/page/book and kept, so serving costs the
+    backend under test rather than this process.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.15, jitter: float = 0.05,
+                 error_rate: float = 0.0, throttle_rps: float = 0, pages_per_query: int = 3,
+                 cards: int = 50):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rps = throttle_rps
+        self.pages_per_query = pages_per_query
+        self.cards = cards
+        self.counts: Dict[str, int] = {'requests': 0, 'errors': 0, 'throttled': 0, 'ranges': 0}
+        # Saved real pages only; generated ones are built per query below
+        self._recorded: List[bytes] = [page for name, page in load_corpus().items() if name.endswith('.html')]
+        self._pages: Dict[str, bytes] = {}
+        self._window: List[float] = []
+        self._lock = threading.Lock()
+        self._rng = random.Random(0)
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeUpstream':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-upstream', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _page(self, name: str, build) -> bytes:
+        page = self._pages.get(name)
+        if page is None:
+            page = self._pages.setdefault(name, build())
+        return page
+
+    def _search_page(self, keyword: str, page: int) -> bytes:
+        if page > self.pages_per_query:
+            return generate_search_page(0)
+        seed = zlib.crc32(keyword.encode('utf-8')) % 100000 + page
+        # Mix recorded pages in, so parsers see their quirks under load too
+        if self._recorded and seed % 5 == 0:
+            return self._recorded[seed % len(self._recorded)]
+        return self._page(f"s:{keyword}:{page}", lambda: generate_search_page(self.cards, seed))
+
+    def _throttled(self, now: float) -> bool:
+        if self.throttle_rps <= 0:
+            return False
+        with self._lock:
+            horizon = now - 1.0
+            self._window = [stamp for stamp in self._window if stamp > horizon]
+            if len(self._window) >= self.throttle_rps:
+                return True
+            self._window.append(now)
+            return False
+
+    def _count(self, field: str):
+        with self._lock:
+            self.counts[field] += 1
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                upstream._count('requests')
+                with upstream._lock:
+                    delay = max(0.0, upstream.latency + upstream._rng.uniform(-upstream.jitter, upstream.jitter))
+                    failed = upstream._rng.random() < upstream.error_rate
+                if upstream._throttled(time.monotonic()):
+                    upstream._count('throttled')
+                    return self._send(429, b'Too many requests', {'Retry-After': '1'})
+                time.sleep(delay)
+                if failed:
+                    upstream._count('errors')
+                    return self._send(500, b'Internal error')
+
+                parts = urlsplit(self.path)
+                segments = [unquote(segment) for segment in parts.path.split('/') if segment]
+                if len(segments) >= 2 and segments[0] == 's':
+                    page = int(parse_qs(parts.query).get('page', ['1'])[0])
+                    return self._send(200, upstream._search_page(segments[1], page))
+                if len(segments) >= 2 and segments[0] == 'book':
+                    book_id = segments[1]
+                    body = upstream._page(f"b:{book_id}", lambda: generate_detail_page(book_id, zlib.crc32(book_id.encode())))
+                    return self._send(200, body)
+                if len(segments) >= 2 and segments[0] == 'dl':
+                    return self._send_file(bytes(range(256)) * 1024, {
+                        'Content-Type': 'application/pdf',
+                        'Content-Disposition': f'attachment; filename="{segments[1]}.pdf"'
+                    })
+                if parts.path == '/':
+                    return self._send(200, b'<html><body>fake z-library</body></html>')
+                return self._send(404, b'Not found')
+
+            def _send_file(self, body: bytes, headers: Dict[str, str]):
+                """Send a file, or the single byte range asked for (If-Range with the ETag)"""
+                etag = f'"{zlib.crc32(body):08x}"'
+                headers = dict(headers, **{'Accept-Ranges': 'bytes', 'ETag': etag})
+                requested = self.headers.get('Range')
+                if_range = self.headers.get('If-Range')
+                if not requested or (if_range and if_range != etag):
+                    return self._send(200, body, headers)
+                byte_range = _byte_range(requested, len(body))
+                if byte_range is None:
+                    return self._send(200, body, headers)
+                start, end = byte_range
+                if start >= len(body):
+                    return self._send(416, b'', {'Content-Range': f"bytes */{len(body)}"})
+                upstream._count('ranges')
+                headers['Content-Range'] = f"bytes {start}-{end}/{len(body)}"
+                return self._send(206, body[start:end + 1], headers)
+
+            def _send(self, status: int, body: bytes, headers: Dict[str, str] = None):
+                headers = headers or {}
+                self.send_response(status)
+                if 'Content-Type' not in headers:
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+def _byte_range(value: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range Range header
+    Returns:
+        First and last byte offsets (the first may lie past the end), or None
+        for anything else, which is answered with the whole file
+    """
+    unit, _, spec = value.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        return None
+    first, _, last = spec.strip().partition('-')
+    try:
+        if not first:
+            suffix = int(last)
+            return (max(size - suffix, 0), size - 1) if suffix > 0 else None
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    except ValueError:
+        return None
+    return (start, end) if start <= end or start >= size else None
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument('--port', type=int, default=8765)
+    arg_parser.add_argument('--latency', type=float, default=0.15, help='Seconds added to every response')
+    arg_parser.add_argument('--jitter', type=float, default=0.05, help='Latency varies by +- this much')
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help='Share of responses that are 500s')
+    arg_parser.add_argument('--throttle-rps', type=float, default=0, help='429 beyond this many requests/s (0: never)')
+    args = arg_parser.parse_args()
+
+    upstream = FakeUpstream(args.port, args.latency, args.jitter, args.error_rate, args.throttle_rps).start()
+    print(f"Fake Z-Library listening on {upstream.url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        upstream.stop()
+
+if __name__ == '__main__':
+    main()
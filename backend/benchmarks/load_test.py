@@ -0,0 +1,338 @@
+"""
+Load test of the backend against the fake Z-Library.
+
+Usage (from backend/):
+    python -m benchmarks.load_test [--concurrency 16] [--duration 20] [--warmup 3]
+                                   [--mix search=6,detail=3,multi=1] [--latency 0.15]
+                                   [--error-rate 0.0] [--throttle-rps 0]
+                                   [--env KEY=VALUE ...] [--json out.json]
+    python -m benchmarks.load_test --target http://127.0.0.1:5000 [--server-pid PID]
+
+By default it starts benchmarks.fake_upstream in this process and the
+backend (python app.py, or --server-cmd) as a child process pointed at it,
+then drives /<platform>/s/<keyword>, /<platform>/book/<id> and /search
+(the frontend's /api/search behind nginx) from `concurrency` client threads.
+The download and resume mix entries fetch /<platform>/download/<id>, whole
+or from a Range offset as a resumed download would.
+Keywords and book ids follow a skewed popularity, so the caches see a
+realistic mix of hits and misses.
+
+Reports throughput, p50/p95/p99 latency and status codes per endpoint, plus
+the server's CPU seconds and peak RSS (read from /proc, so Linux only; the
+whole process tree is counted, e.g. gunicorn workers). The client is Python
+too: past a few hundred requests per second, check that it is not the
+bottleneck by running it on another machine with --target.
+"""
+import argparse
+import json
+import os
+import random
+import shlex
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+import requests
+from benchmarks.fake_upstream import FakeUpstream
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Settings for the backend under test; the rate limiter stays off even if
+# the environment enables it for the real site (override with --env)
+SERVER_ENV = {
+    'HOST': '127.0.0.1',
+    'ZLIBRARY_MIRRORS': '',
+    'ZLIBRARY_RATE_LIMIT': '0',
+    'ZLIBRARY_MIRROR_RATE_LIMIT': '0',
+    'ENABLE_CACHE': 'True',
+    'LOG_FILE': '',
+    'LOG_LEVEL': 'WARNING'
+}
+
+def percentile(values: List[float], share: float) -> Optional[float]:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(share * len(values))) - 1))]
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def _process_tree(pid: int) -> List[int]:
+    """pid and its descendants, from /proc"""
+    children = defaultdict(list)
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                # The command name may contain spaces; fields resume after ')'
+                parent = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children[parent].append(int(entry))
+    tree, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        tree.append(current)
+        pending.extend(children.get(current, []))
+    return tree
+
+def server_usage(pid: Optional[int]) -> Dict[str, Optional[float]]:
+    """
+    CPU seconds used so far and peak RSS of a server process tree
+    Returns:
+        {'cpu_seconds', 'peak_rss_mib'}, None where /proc is unavailable
+    """
+    if pid is None or not os.path.exists(f'/proc/{pid}'):
+        return {'cpu_seconds': None, 'peak_rss_mib': None}
+    ticks = os.sysconf('SC_CLK_TCK')
+    cpu, peak = 0.0, 0
+    for member in _process_tree(pid):
+        try:
+            with open(f'/proc/{member}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / ticks  # utime, stime
+            with open(f'/proc/{member}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        peak += int(line.split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    return {'cpu_seconds': round(cpu, 3), 'peak_rss_mib': round(peak / 1024, 1)}
+
+class BackendProcess:
+    """The backend under test, started as a child process on a free port"""
+
+    def __init__(self, upstream_url: str, command: str = None, env: Dict[str, str] = None):
+        self.port = _free_port()
+        self.state_dir = tempfile.mkdtemp(prefix='booksearch-bench-')
+        self.env = dict(os.environ, **SERVER_ENV, PORT=str(self.port), ZLIBRARY_BASE_URL=upstream_url,
+                        STATE_DIR=self.state_dir, **(env or {}))
+        self.command = shlex.split(command.format(port=self.port)) if command else [sys.executable, 'app.py']
+        self.log_path = ''
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self, timeout: float = 30.0) -> 'BackendProcess':
+        # A file rather than a pipe, so a chatty server never blocks on a full pipe
+        self.log_path = os.path.join(self.state_dir, 'server.log')
+        with open(self.log_path, 'wb') as log:
+            self.process = subprocess.Popen(self.command, cwd=BACKEND_DIR, env=self.env,
+                                            stdout=log, stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                with open(self.log_path, 'rb') as log:
+                    raise RuntimeError(f"Backend exited: {log.read()[-2000:].decode(errors='replace')}")
+            try:
+                requests.get(f"{self.url}/stats/cache", timeout=1)
+                return self
+            except requests.RequestException:
+                time.sleep(0.2)
+        self.stop()
+        raise RuntimeError(f"Backend did not answer on {self.url} within {timeout}s")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+class Workload:
+    """Picks the next request: endpoint by weight, query and book by skewed popularity"""
+
+    def __init__(self, mix: Dict[str, float], platform: str = 'zlibrary', keywords: int = 500,
+                 books: int = 2000, seed: int = 0):
+        self.mix = mix
+        self.platform = platform
+        self.keywords = [f"topic {i}" for i in range(keywords)]
+        self.books = [str(1000000 + i) for i in range(books)]
+        self.seed = seed
+
+    def _skewed(self, rng: random.Random, items: List[str]) -> str:
+        # P(rank < k) = (k / n) ** (1 / 3): with 500 items the top 10 get about
+        # a quarter of the traffic and a long tail stays uncached
+        return items[int(len(items) * rng.random() ** 3)]
+
+    def request(self, rng: random.Random) -> Tuple[str, str, Dict[str, str]]:
+        endpoint = rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        if endpoint == 'detail':
+            return endpoint, f"/{self.platform}/book/{self._skewed(rng, self.books)}", {}
+        if endpoint in ('download', 'resume'):
+            path = f"/{self.platform}/download/{self._skewed(rng, self.books)}"
+            # A resumed download asks for the rest of the file from some offset
+            return endpoint, path, {'Range': f"bytes={rng.randrange(256 * 1024)}-"} if endpoint == 'resume' else {}
+        keyword = quote(self._skewed(rng, self.keywords))
+        if endpoint == 'multi':
+            return endpoint, f"/search?q={keyword}&platforms={self.platform}", {}
+        return endpoint, f"/{self.platform}/s/{keyword}", {}
+
+def drive(base_url: str, workload: Workload, concurrency: int, duration: float,
+          warmup: float = 0.0, timeout: float = 30.0) -> Dict[str, Any]:
+    """
+    Send requests from `concurrency` threads, each waiting for its previous answer
+    Args:
+        base_url: Backend URL
+        workload: Request generator
+        concurrency: Client threads
+        duration: Measured seconds
+        warmup: Seconds of unmeasured traffic first
+        timeout: Per-request timeout
+    Returns:
+        Per-endpoint and overall throughput, latency percentiles and status counts
+    """
+    samples: List[Tuple[str, int, float]] = []
+    lock = threading.Lock()
+    started = time.monotonic()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+
+    def client(index: int):
+        rng = random.Random(workload.seed * 1000 + index)
+        session = requests.Session()
+        local = []
+        while True:
+            now = time.monotonic()
+            if now >= stop_at:
+                break
+            endpoint, path, headers = workload.request(rng)
+            try:
+                status = session.get(base_url + path, headers=headers, timeout=timeout).status_code
+            except requests.RequestException:
+                status = 0
+            finished = time.monotonic()
+            if now >= measure_from:
+                local.append((endpoint, status, finished - now))
+        with lock:
+            samples.extend(local)
+
+    threads = [threading.Thread(target=client, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    def summarize(rows: List[Tuple[str, int, float]]) -> Dict[str, Any]:
+        latencies = sorted(latency for _, _, latency in rows)
+        statuses: Dict[str, int] = defaultdict(int)
+        for _, status, _ in rows:
+            statuses[str(status) if status else 'error'] += 1
+        return {
+            'requests': len(rows),
+            'throughput_rps': round(len(rows) / duration, 1),
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+            'max_ms': round(latencies[-1] * 1000, 2) if latencies else None,
+            'statuses': dict(statuses)
+        }
+
+    by_endpoint = defaultdict(list)
+    for row in samples:
+        by_endpoint[row[0]].append(row)
+    return {
+        'overall': summarize(samples),
+        'endpoints': {endpoint: summarize(rows) for endpoint, rows in sorted(by_endpoint.items())}
+    }
+
+def run(concurrency: int = 16, duration: float = 20.0, warmup: float = 3.0, mix: Dict[str, float] = None,
+        latency: float = 0.15, jitter: float = 0.05, error_rate: float = 0.0, throttle_rps: float = 0,
+        target: str = None, server_pid: int = None, server_cmd: str = None,
+        env: Dict[str, str] = None) -> Dict[str, Any]:
+    """
+    Run one load test
+    Returns:
+        Settings, client-side results, server CPU/RSS and fake upstream counters
+    """
+    mix = mix or {'search': 6, 'detail': 3, 'multi': 1}
+    upstream, backend = None, None
+    try:
+        if target is None:
+            upstream = FakeUpstream(0, latency, jitter, error_rate, throttle_rps).start()
+            backend = BackendProcess(upstream.url, server_cmd, env).start()
+            target, server_pid = backend.url, backend.process.pid
+        before = server_usage(server_pid)
+        results = drive(target, Workload(mix), concurrency, duration, warmup)
+        after = server_usage(server_pid)
+    finally:
+        if backend is not None:
+            backend.stop()
+        if upstream is not None:
+            upstream.stop()
+
+    cpu = None
+    if before['cpu_seconds'] is not None and after['cpu_seconds'] is not None:
+        cpu = round(after['cpu_seconds'] - before['cpu_seconds'], 3)
+    return {
+        'settings': {
+            'concurrency': concurrency, 'duration': duration, 'warmup': warmup, 'mix': mix,
+            'upstream_latency': latency, 'upstream_jitter': jitter, 'upstream_error_rate': error_rate,
+            'upstream_throttle_rps': throttle_rps, 'env': env or {}
+        },
+        'results': results,
+        'server': {
+            # Includes the warm-up, which also ran in the server
+            'cpu_seconds': cpu,
+            'cpu_per_request_ms': round(cpu * 1000 / results['overall']['requests'], 3)
+                if cpu is not None and results['overall']['requests'] else None,
+            'peak_rss_mib': after['peak_rss_mib']
+        },
+        'upstream': dict(upstream.counts) if upstream is not None else None
+    }
+
+def _pairs(text: str, cast=str) -> Dict[str, Any]:
+    return {key.strip(): cast(value) for key, value in (item.split('=', 1) for item in text.split(',') if item)}
+
+def print_report(report: Dict[str, Any]):
+    results = report['results']
+    print(f"{'endpoint':>9} {'requests':>9} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  statuses")
+    for name, row in list(results['endpoints'].items()) + [('overall', results['overall'])]:
+        print(f"{name:>9} {row['requests']:>9} {row['throughput_rps']:>8} {row['p50_ms'] or '-':>9} "
+              f"{row['p95_ms'] or '-':>9} {row['p99_ms'] or '-':>9}  {row['statuses']}")
+    server = report['server']
+    print(f"server: {server['cpu_seconds']} CPU s ({server['cpu_per_request_ms']} ms/request), "
+          f"peak RSS {server['peak_rss_mib']} MiB")
+    if report['upstream']:
+        print(f"upstream: {report['upstream']}")
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument('--concurrency', type=int, default=16)
+    arg_parser.add_argument('--duration', type=float, default=20.0, help='Measured seconds')
+    arg_parser.add_argument('--warmup', type=float, default=3.0, help='Unmeasured seconds first')
+    arg_parser.add_argument('--mix', default='search=6,detail=3,multi=1', help='Endpoint weights (also download, resume)')
+    arg_parser.add_argument('--latency', type=float, default=0.15, help='Fake upstream latency in seconds')
+    arg_parser.add_argument('--jitter', type=float, default=0.05)
+    arg_parser.add_argument('--error-rate', type=float, default=0.0, help='Share of upstream 500s')
+    arg_parser.add_argument('--throttle-rps', type=float, default=0, help='Upstream answers 429 beyond this rate')
+    arg_parser.add_argument('--target', help='Test a running backend instead of starting one')
+    arg_parser.add_argument('--server-pid', type=int, help='PID of the --target server, for CPU and RSS')
+    arg_parser.add_argument('--server-cmd', help="Backend command, '{port}' is replaced (default: python app.py)")
+    arg_parser.add_argument('--env', action='append', default=[], help='KEY=VALUE for the backend (repeatable)')
+    arg_parser.add_argument('--json', help='Write the report to this file')
+    args = arg_parser.parse_args()
+
+    report = run(args.concurrency, args.duration, args.warmup, _pairs(args.mix, float), args.latency,
+                 args.jitter, args.error_rate, args.throttle_rps, args.target, args.server_pid,
+                 args.server_cmd, dict(item.split('=', 1) for item in args.env))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0 if report['results']['overall']['requests'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Parser parity check and benchmark.
+
+Usage (from backend/):
+    python -m benchmarks.parse_bench [--rounds N] [--json out.json]
+
+Every backend must return exactly what the reference 'soup' parser returns on
+every corpus page; the script exits non-zero if any page differs.
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict
+from platforms.parsers import get_parser
+from benchmarks.corpus import load_corpus, generate_search_page
+
+BACKENDS = ('soup', 'strained', 'fast')
+
+def check_parity(pages: Dict[str, bytes]) -> int:
+    reference = get_parser('soup')
+    failures = 0
+    for name, content in pages.items():
+        expected = list(reference.iter_cards(content))
+        for backend in BACKENDS[1:]:
+            actual = list(get_parser(backend).iter_cards(content))
+            if actual != expected:
+                failures += 1
+                print(f"MISMATCH {backend} on {name}")
+                for want, got in zip(expected, actual):
+                    if want != got:
+                        print(f"  expected: {want}\n  actual:   {got}")
+                        break
+                else:
+                    print(f"  expected {len(expected)} cards, got {len(actual)}")
+    return failures
+
+def measure(backend: str, content: bytes, rounds: int) -> Dict[str, Any]:
+    parser = get_parser(backend)
+    list(parser.iter_cards(content))  # warm up
+    started = time.perf_counter()
+    for _ in range(rounds):
+        list(parser.iter_cards(content))
+    elapsed = (time.perf_counter() - started) / rounds
+
+    tracemalloc.start()
+    list(parser.iter_cards(content))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'parse_ms': round(elapsed * 1000, 3), 'peak_kib': round(peak / 1024, 1)}
+
+def run(rounds: int = 20, cards: int = 50) -> Dict[str, Any]:
+    """
+    Check parity on the corpus, then time every parser on a generated page
+    Returns:
+        Page size, card count, parity mismatches and per-parser results
+    """
+    failures = check_parity(load_corpus())
+    content = generate_search_page(cards, seed=42)
+    results = {backend: measure(backend, content, rounds) for backend in BACKENDS}
+    baseline = results['soup']['parse_ms']
+    for result in results.values():
+        result['speedup'] = round(baseline / result['parse_ms'], 1) if result['parse_ms'] else None
+    return {'page_bytes': len(content), 'cards': cards, 'parity_failures': failures, 'parsers': results}
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument('--rounds', type=int, default=20)
+    arg_parser.add_argument('--cards', type=int, default=50)
+    arg_parser.add_argument('--json', help='Write results to this file')
+    args = arg_parser.parse_args()
+
+    report = run(args.rounds, args.cards)
+    failures = report['parity_failures']
+    print(f"Parity: {'OK' if failures == 0 else f'{failures} mismatches'}")
+    for backend, result in report['parsers'].items():
+        print(f"{backend:>9}: {result['parse_ms']:8.3f} ms/page  peak {result['peak_kib']:8.1f} KiB  x{result['speedup']}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
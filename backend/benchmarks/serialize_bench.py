@@ -0,0 +1,84 @@
+"""
+Search response serialization benchmark.
+
+Usage (from backend/):
+    python -m benchmarks.serialize_bench [--rounds N] [--cards N] [--json out.json]
+
+Compares the previous path (book dicts through flask.jsonify) with Book
+records through utils.serialization, in both the object and the columnar
+shape, on a generated search page. Exits non-zero if the fast path does not
+decode to the same books.
+"""
+import argparse
+import json
+import pickle
+import sys
+import time
+from typing import Any, Callable, Dict
+from flask import Flask, jsonify
+from platforms.zlibrary import ZLibrary
+from utils.serialization import columnar, dumps
+from benchmarks.corpus import generate_search_page
+
+def measure(encode: Callable[[], bytes], rounds: int) -> Dict[str, Any]:
+    body = encode()  # warm up
+    started = time.perf_counter()
+    for _ in range(rounds):
+        encode()
+    elapsed = (time.perf_counter() - started) / rounds
+    return {'serialize_ms': round(elapsed * 1000, 3), 'bytes': len(body)}
+
+def run(rounds: int = 500, cards: int = 50) -> Dict[str, Any]:
+    """
+    Time every serialization path on the books of a generated page
+    Returns:
+        Card count, parity, per-serializer results and pickled sizes
+    """
+    platform = ZLibrary()
+    books = platform._parse_books(generate_search_page(cards, seed=42))
+    records = platform._search_result(books)['content']
+    dicts = dict(records, books=[book.to_dict() for book in books])
+
+    app = Flask(__name__)
+    with app.app_context():
+        results = {
+            'jsonify_dicts': measure(lambda: jsonify(dicts).get_data(), rounds),
+            'fast_records': measure(lambda: dumps(records), rounds),
+            'fast_columns': measure(lambda: dumps(columnar(records)), rounds)
+        }
+
+    baseline = results['jsonify_dicts']
+    for result in results.values():
+        result['speedup'] = round(baseline['serialize_ms'] / result['serialize_ms'], 1) if result['serialize_ms'] else None
+        result['size_ratio'] = round(result['bytes'] / baseline['bytes'], 2)
+    pickled = {'dicts': len(pickle.dumps(dicts['books'], pickle.HIGHEST_PROTOCOL)),
+               'records': len(pickle.dumps(books, pickle.HIGHEST_PROTOCOL))}
+    return {
+        'cards': len(books),
+        'parity': json.loads(dumps(records))['books'] == dicts['books'],
+        'serializers': results,
+        'pickle_bytes': pickled
+    }
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument('--rounds', type=int, default=500)
+    arg_parser.add_argument('--cards', type=int, default=50)
+    arg_parser.add_argument('--json', help='Write results to this file')
+    args = arg_parser.parse_args()
+
+    report = run(args.rounds, args.cards)
+    print(f"Parity: {'OK' if report['parity'] else 'MISMATCH'}")
+    for name, result in report['serializers'].items():
+        print(f"{name:>13}: {result['serialize_ms']:8.3f} ms  {result['bytes']:7d} bytes  "
+              f"x{result['speedup']}  size {result['size_ratio']}")
+    pickled = report['pickle_bytes']
+    print(f"   pickle: {pickled['dicts']} bytes as dicts, {pickled['records']} bytes as records")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0 if report['parity'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
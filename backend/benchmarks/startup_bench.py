@@ -0,0 +1,167 @@
+"""
+Cold start benchmark: app import time and the first requests of a fresh worker.
+
+Usage (from backend/):
+    python -m benchmarks.startup_bench [--rounds 5] [--top 15] [--backend-dir DIR] [--json out.json]
+
+Each round starts a new interpreter that imports app.py, then sends a
+search and a book request through Flask's test client to a fake Z-Library
+with no added latency, so the first requests show what importing the
+platform on first use costs. Rounds are run with lazy loading (the default)
+and with Config.PLATFORM_WARMUP, as a preloading master would start; medians
+are reported. It also lists the slowest modules of one `python -X importtime`
+run and exits non-zero if importing the app loads a platform, parser or
+HTTP client module (see EAGER_MODULES). --backend-dir measures another
+checkout the same way, to compare against an earlier commit.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+from benchmarks.fake_upstream import FakeUpstream
+from benchmarks.load_test import BACKEND_DIR, SERVER_ENV
+
+# Modules that should only load with the first request that needs them
+EAGER_MODULES = ('platforms.zlibrary', 'platforms.base', 'platforms.async_base', 'platforms.parsers',
+                 'requests', 'urllib3', 'aiohttp', 'bs4', 'lxml')
+
+# Run in the fresh interpreter: argv[1] is the JSON list of modules to look for
+CHILD = r'''
+import importlib.util, json, os, sys, time
+started = time.perf_counter()
+# app/ (the frontend API package) shadows app.py, so load the file directly
+spec = importlib.util.spec_from_file_location('app_under_test', 'app.py')
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+result = {'import_ms': (time.perf_counter() - started) * 1000,
+          'modules': len(sys.modules),
+          'eager': [name for name in json.loads(sys.argv[1]) if name in sys.modules]}
+client = module.app.test_client()
+for name, path in (('search', '/zlibrary/s/startup'), ('search_again', '/zlibrary/s/second'),
+                   ('detail', '/zlibrary/book/1000001')):
+    started = time.perf_counter()
+    status = client.get(path).status_code
+    result[name + '_ms'] = (time.perf_counter() - started) * 1000
+    result[name + '_status'] = status
+print(json.dumps(result), flush=True)
+os._exit(0)  # skip interpreter teardown; it is not part of a start
+'''
+
+def _child_env(upstream_url: str, state_dir: str, extra: Dict[str, str] = None) -> Dict[str, str]:
+    return dict(os.environ, **SERVER_ENV, ZLIBRARY_BASE_URL=upstream_url, STATE_DIR=state_dir,
+                **(extra or {}))
+
+def start_once(backend_dir: str, env: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Start one fresh interpreter, import the app and send the first requests
+    Returns:
+        Import and request times in ms, the process wall time, loaded module
+        count and the EAGER_MODULES present right after the import
+    """
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', CHILD, json.dumps(EAGER_MODULES)], cwd=backend_dir,
+                               env=env, capture_output=True, text=True, timeout=120)
+    wall = (time.perf_counter() - started) * 1000
+    if completed.returncode != 0 or not completed.stdout.strip():
+        raise RuntimeError(f"Startup run failed: {completed.stderr[-2000:]}")
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    result['process_ms'] = wall
+    return result
+
+def _median_report(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    report = {}
+    for field, value in samples[0].items():
+        if field.endswith('_ms'):
+            report[field] = round(statistics.median(sample[field] for sample in samples), 1)
+        elif field.endswith('_status') or field == 'modules':
+            report[field] = value
+    report['eager'] = sorted({name for sample in samples for name in sample['eager']})
+    return report
+
+def interpreter_ms(rounds: int) -> float:
+    """Median wall time of starting and stopping a bare interpreter"""
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        times.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(times), 1)
+
+def slowest_imports(backend_dir: str, env: Dict[str, str], top: int = 15) -> List[Dict[str, Any]]:
+    """
+    Profile one app import with -X importtime
+    Returns:
+        The `top` modules by cumulative import time, in ms
+    """
+    code = ("import importlib.util; spec = importlib.util.spec_from_file_location('app_under_test', 'app.py'); "
+            "spec.loader.exec_module(importlib.util.module_from_spec(spec))")
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=backend_dir, env=env,
+                               capture_output=True, text=True, timeout=120)
+    modules = []
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '|', 1).split('|')]
+        modules.append({'module': name, 'self_ms': round(int(self_us) / 1000, 1),
+                        'cumulative_ms': round(int(cumulative_us) / 1000, 1)})
+    return sorted(modules, key=lambda module: -module['cumulative_ms'])[:top]
+
+def run(rounds: int = 5, top: int = 15, backend_dir: str = BACKEND_DIR) -> Dict[str, Any]:
+    """
+    Measure cold starts with lazy platform loading and with warm-up
+    Returns:
+        Interpreter baseline, median results per mode and the slowest imports
+    """
+    upstream = FakeUpstream(latency=0.0, jitter=0.0).start()
+    state_dir = tempfile.mkdtemp(prefix='booksearch-startup-')
+    try:
+        modes = {'lazy': {}, 'warmup': {'PLATFORM_WARMUP': 'True'}}
+        report: Dict[str, Any] = {'rounds': rounds, 'interpreter_ms': interpreter_ms(rounds)}
+        for mode, extra in modes.items():
+            env = _child_env(upstream.url, state_dir, extra)
+            # Interleaving would share the OS page cache either way; one
+            # untimed start keeps the first measured round from paying for it
+            start_once(backend_dir, env)
+            report[mode] = _median_report([start_once(backend_dir, env) for _ in range(rounds)])
+        report['slowest_imports'] = slowest_imports(backend_dir, _child_env(upstream.url, state_dir), top)
+        report['eager_imports'] = report['lazy']['eager']
+        return report
+    finally:
+        upstream.stop()
+
+def print_report(report: Dict[str, Any]):
+    print(f"interpreter alone: {report['interpreter_ms']:8.1f} ms")
+    for mode in ('lazy', 'warmup'):
+        result = report[mode]
+        print(f"{mode:>8}: import {result['import_ms']:7.1f} ms  first search {result['search_ms']:7.1f} ms  "
+              f"next search {result['search_again_ms']:6.1f} ms  first detail {result['detail_ms']:6.1f} ms  "
+              f"process {result['process_ms']:7.1f} ms  {result['modules']} modules")
+    print('slowest imports (cumulative ms):')
+    for module in report['slowest_imports']:
+        print(f"  {module['cumulative_ms']:8.1f}  {module['module']}")
+    if report['eager_imports']:
+        print(f"Loaded at import time: {', '.join(report['eager_imports'])}")
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument('--rounds', type=int, default=5)
+    arg_parser.add_argument('--top', type=int, default=15, help='Slowest imports to list')
+    arg_parser.add_argument('--backend-dir', default=BACKEND_DIR, help='Checkout to measure')
+    arg_parser.add_argument('--json', help='Write results to this file')
+    args = arg_parser.parse_args()
+
+    report = run(args.rounds, args.top, os.path.abspath(args.backend_dir))
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 1 if report['eager_imports'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Benchmark suite: parser and serializer micro-benchmarks, cold start and a load test.
+
+Usage (from backend/):
+    python -m benchmarks.suite [--quick] [--skip-load] [--out DIR]
+                               [--compare benchmarks/results/<earlier>.json] [--tolerance 0.15]
+
+Results are written to benchmarks/results/<UTC time>-<git commit>.json with
+the environment they were measured in. With --compare, the headline numbers
+are checked against an earlier file and the script exits non-zero when any
+got worse by more than the tolerance (15% by default), or when importing the
+app loads a module that should load lazily. Compare runs from the same
+machine only.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from benchmarks import load_test, parse_bench, serialize_bench, startup_bench
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# (name, path into the results, True if higher is better)
+HEADLINES: List[Tuple[str, Tuple[str, ...], bool]] = [
+    ('parse fast ms/page', ('parse', 'parsers', 'fast', 'parse_ms'), False),
+    ('serialize records ms', ('serialize', 'serializers', 'fast_records', 'serialize_ms'), False),
+    ('startup import ms', ('startup', 'lazy', 'import_ms'), False),
+    ('startup first search ms', ('startup', 'lazy', 'search_ms'), False),
+    ('load throughput rps', ('load', 'results', 'overall', 'throughput_rps'), True),
+    ('load p50 ms', ('load', 'results', 'overall', 'p50_ms'), False),
+    ('load p95 ms', ('load', 'results', 'overall', 'p95_ms'), False),
+    ('load p99 ms', ('load', 'results', 'overall', 'p99_ms'), False),
+    ('server CPU ms/request', ('load', 'server', 'cpu_per_request_ms'), False),
+    ('server peak RSS MiB', ('load', 'server', 'peak_rss_mib'), False)
+]
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(RESULTS_DIR), timeout=10).stdout.strip() or 'unknown'
+    except (OSError, subprocess.SubprocessError):
+        return 'unknown'
+
+def _lookup(report: Dict[str, Any], path: Tuple[str, ...]) -> Optional[float]:
+    value: Any = report
+    for part in path:
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value if isinstance(value, (int, float)) else None
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Print the headline numbers next to a baseline run
+    Returns:
+        Names of the numbers that regressed by more than `tolerance`
+    """
+    regressions = []
+    print(f"\n{'metric':>24} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, path, higher_is_better in HEADLINES:
+        before, after = _lookup(baseline, path), _lookup(current, path)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before if before else 0.0
+        worse = -change if higher_is_better else change
+        flag = '  REGRESSION' if worse > tolerance else ''
+        print(f"{name:>24} {before:>10} {after:>10} {change:>+8.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main() -> int:
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    arg_parser.add_argument('--quick', action='store_true', help='Fewer rounds and a 5s load test')
+    arg_parser.add_argument('--skip-load', action='store_true', help='Micro-benchmarks only')
+    arg_parser.add_argument('--concurrency', type=int, default=16)
+    arg_parser.add_argument('--out', default=RESULTS_DIR, help='Directory for the results file')
+    arg_parser.add_argument('--compare', help='Earlier results file to check against')
+    arg_parser.add_argument('--tolerance', type=float, default=0.15, help='Allowed relative regression')
+    args = arg_parser.parse_args()
+
+    report: Dict[str, Any] = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'commit': _git_commit(),
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'system': platform.system(),
+            'cpus': os.cpu_count()
+        }
+    }
+
+    print('== parse')
+    report['parse'] = parse_bench.run(rounds=5 if args.quick else 20)
+    for backend, result in report['parse']['parsers'].items():
+        print(f"{backend:>9}: {result['parse_ms']:8.3f} ms/page  x{result['speedup']}")
+    print('== serialize')
+    report['serialize'] = serialize_bench.run(rounds=100 if args.quick else 500)
+    for name, result in report['serialize']['serializers'].items():
+        print(f"{name:>13}: {result['serialize_ms']:8.3f} ms  x{result['speedup']}")
+    print('== startup')
+    report['startup'] = startup_bench.run(rounds=3 if args.quick else 7, top=10)
+    startup_bench.print_report(report['startup'])
+    if not args.skip_load:
+        print('== load')
+        report['load'] = load_test.run(concurrency=args.concurrency, duration=5.0 if args.quick else 20.0,
+                                       warmup=1.0 if args.quick else 3.0)
+        load_test.print_report(report['load'])
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{report['commit']}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {path}")
+
+    failed = (report['parse']['parity_failures'] > 0 or not report['serialize']['parity']
+              or bool(report['startup']['eager_imports']))
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+            failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,15 +12,111 @@ class Config:
     PLATFORMS: Dict[str, Dict[str, Any]] = {
         'zlibrary': {
             'base_url': os.getenv('ZLIBRARY_BASE_URL', 'https://z-library.sk'),
+            # Comma separated mirror base URLs; requests go to the fastest healthy one
+            'mirrors': [url.strip() for url in os.getenv('ZLIBRARY_MIRRORS', '').split(',') if url.strip()]
+                or [os.getenv('ZLIBRARY_BASE_URL', 'https://z-library.sk')],
+            'hedge': os.getenv('ZLIBRARY_HEDGE', 'True').lower() == 'true',  # second copy past the p95
+            'probe_interval': float(os.getenv('ZLIBRARY_PROBE_INTERVAL', '30')),
             'timeout': int(os.getenv('ZLIBRARY_TIMEOUT', '10')),
-            'max_retries': int(os.getenv('ZLIBRARY_MAX_RETRIES', '3'))
+            'max_retries': int(os.getenv('ZLIBRARY_MAX_RETRIES', '3')),
+            # Result page parser: 'fast' (regex scanner), 'strained' (SoupStrainer/lxml)
+            # or 'soup' (full BeautifulSoup tree, also the fallback)
+            'parser': os.getenv('ZLIBRARY_PARSER', 'fast'),
+            # Retries: jittered exponential backoff, capped at a fraction of traffic
+            'retry_base_delay': float(os.getenv('ZLIBRARY_RETRY_BASE_DELAY', '0.2')),
+            'retry_max_delay': float(os.getenv('ZLIBRARY_RETRY_MAX_DELAY', '2.0')),
+            'retry_budget_ratio': float(os.getenv('ZLIBRARY_RETRY_BUDGET_RATIO', '0.2')),
+            # Circuit breaker: open after N consecutive failures, probe again after the timeout
+            'breaker_failure_threshold': int(os.getenv('ZLIBRARY_BREAKER_FAILURE_THRESHOLD', '5')),
+            'breaker_recovery_timeout': float(os.getenv('ZLIBRARY_BREAKER_RECOVERY_TIMEOUT', '30')),
+            # Seconds this platform may take inside a multi-platform search
+            'deadline': float(os.getenv('ZLIBRARY_DEADLINE', '8')),
+            # Outbound rate limits in requests/second, shared by every worker on the
+            # host: the platform as a whole and each mirror. Off (0) by default: one
+            # page of a batch lookup alone fans out to BATCH_CONCURRENCY requests plus
+            # prefetch and hedges, so size them for that (and enable the cache, which
+            # serves retained results instead of a 503 past rate_max_wait)
+            'rate_limit': float(os.getenv('ZLIBRARY_RATE_LIMIT', '0')),
+            'rate_burst': float(os.getenv('ZLIBRARY_RATE_BURST', '10')),
+            'mirror_rate_limit': float(os.getenv('ZLIBRARY_MIRROR_RATE_LIMIT', '0')),
+            'mirror_rate_burst': float(os.getenv('ZLIBRARY_MIRROR_RATE_BURST', '6')),
+            'rate_max_wait': float(os.getenv('ZLIBRARY_RATE_MAX_WAIT', '2')),  # then cached results or 503
+            # Tokens a worker takes per state transaction while the buckets hold them,
+            # spent by its next requests within rate_lease_ttl seconds
+            'rate_lease_size': int(os.getenv('ZLIBRARY_RATE_LEASE_SIZE', '3')),
+            'rate_lease_ttl': float(os.getenv('ZLIBRARY_RATE_LEASE_TTL', '1')),
+            'throttle_pause': float(os.getenv('ZLIBRARY_THROTTLE_PAUSE', '10')),  # after a 429 without Retry-After
+            # Hosts besides the mirrors that the download proxy may fetch files from
+            'download_hosts': [host.strip() for host in os.getenv('ZLIBRARY_DOWNLOAD_HOSTS', '').split(',') if host.strip()],
+            # Admission control: concurrent requests per worker, then a short wait queue
+            'admission_limit': int(os.getenv('ZLIBRARY_ADMISSION_LIMIT', '16')),
+            'admission_queue_size': int(os.getenv('ZLIBRARY_ADMISSION_QUEUE_SIZE', '32')),
+            'admission_queue_timeout': float(os.getenv('ZLIBRARY_ADMISSION_QUEUE_TIMEOUT', '2')),
+            # Connection pool settings (one pool per host, shared by all threads)
+            'pool_connections': int(os.getenv('ZLIBRARY_POOL_CONNECTIONS', '4')),
+            'pool_maxsize': int(os.getenv('ZLIBRARY_POOL_MAXSIZE', '32')),
+            'pool_block': os.getenv('ZLIBRARY_POOL_BLOCK', 'False').lower() == 'true'
         }
     }
-    
+
+    # Platform plugins, imported on first use like the built-in platforms:
+    # comma separated name=package.module:Class entries (a name may list a
+    # sync and a native async class). Packages can also declare them under the
+    # booksearch.platforms entry point group
+    PLATFORM_PLUGINS = [entry.strip() for entry in os.getenv('PLATFORM_PLUGINS', '').split(',') if entry.strip()]
+    PLATFORM_ENTRY_POINTS = os.getenv('PLATFORM_ENTRY_POINTS', 'True').lower() == 'true'
+    # Import every platform with its parsers and HTTP clients when the app
+    # loads, so workers forked from a preloading master (gunicorn --preload)
+    # share them instead of importing them on their first request
+    PLATFORM_WARMUP = os.getenv('PLATFORM_WARMUP', 'False').lower() == 'true'
+
     # Global settings
     DEBUG = os.getenv('DEBUG', 'False').lower() == 'true'
     HOST = os.getenv('HOST', '0.0.0.0')
     PORT = int(os.getenv('PORT', '5000'))
+    # Enables admin-only hooks (per-request profiling, ...) when set
+    ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+    PROFILE_TOP = int(os.getenv('PROFILE_TOP', '40'))  # functions listed in a profile
+    
+    # Logging: records are queued and written by a background thread; the
+    # file gets one JSON object per line (see utils.logs)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG' if DEBUG else 'INFO').upper()
+    LOG_FILE = os.getenv('LOG_FILE', os.path.join('logs', 'app.log'))  # empty logs to the console only
+    LOG_JSON = os.getenv('LOG_JSON', 'True').lower() == 'true'
+    LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(1024 * 1024)))
+    LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '10'))
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # records beyond this are dropped
+    LOG_CARD_SAMPLE = int(os.getenv('LOG_CARD_SAMPLE', '100'))  # log 1 in N per-card debug events
+    
+    # Admission control for search and detail requests (limits per platform
+    # above): requests beyond the wait queue get 429, those that wait too
+    # long get 503, both with Retry-After. When every slot is busy, a cached
+    # result (even stale) is served instead of queuing
+    ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'True').lower() == 'true'
+    ADMISSION_SERVE_STALE = os.getenv('ADMISSION_SERVE_STALE', 'True').lower() == 'true'
+    
+    # Multi-platform search settings
+    SEARCH_DEADLINE = float(os.getenv('SEARCH_DEADLINE', '10'))  # global deadline in seconds
+    FANOUT_MAX_WORKERS = int(os.getenv('FANOUT_MAX_WORKERS', '32'))
+    HEDGE_MAX_WORKERS = int(os.getenv('HEDGE_MAX_WORKERS', '32'))
+    
+    # Paginated search: parsed upstream pages are kept per query while it is paged
+    SEARCH_PER_PAGE = int(os.getenv('SEARCH_PER_PAGE', '20'))
+    SEARCH_MAX_PER_PAGE = int(os.getenv('SEARCH_MAX_PER_PAGE', '100'))
+    CURSOR_MAX_QUERIES = int(os.getenv('CURSOR_MAX_QUERIES', '256'))
+    CURSOR_TTL = float(os.getenv('CURSOR_TTL', '600'))  # idle seconds before a query's pages are dropped
+    PREFETCH_MAX_WORKERS = int(os.getenv('PREFETCH_MAX_WORKERS', '8'))
+    
+    # Batch book details: IDs per request and upstream fetches in flight per request
+    BATCH_MAX_IDS = int(os.getenv('BATCH_MAX_IDS', '50'))
+    BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '8'))
+    BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', '32'))
+    
+    # Async serving: one long-lived event loop and client session per worker
+    ASYNC_SERVING = os.getenv('ASYNC_SERVING', 'False').lower() == 'true'
+    ASYNC_CONNECTION_LIMIT = int(os.getenv('ASYNC_CONNECTION_LIMIT', '1000'))
+    ASYNC_CONNECTION_LIMIT_PER_HOST = int(os.getenv('ASYNC_CONNECTION_LIMIT_PER_HOST', '100'))
+    ASYNC_EXECUTOR_WORKERS = int(os.getenv('ASYNC_EXECUTOR_WORKERS', '16'))  # sync platforms and parsing
     
     # Request settings
     DEFAULT_HEADERS = {
@@ -31,4 +127,74 @@ class Config:
     
     # Cache settings
     ENABLE_CACHE = os.getenv('ENABLE_CACHE', 'False').lower() == 'true'
-    CACHE_TIMEOUT = int(os.getenv('CACHE_TIMEOUT', '3600'))  # 1 hour 
\ No newline at end of file
+    CACHE_TIMEOUT = int(os.getenv('CACHE_TIMEOUT', '3600'))  # 1 hour
+    CACHE_STALE_TIMEOUT = int(os.getenv('CACHE_STALE_TIMEOUT', '600'))  # served stale while refreshing
+    CACHE_NEGATIVE_TIMEOUT = int(os.getenv('CACHE_NEGATIVE_TIMEOUT', '120'))  # empty results
+    CACHE_STALE_IF_ERROR = int(os.getenv('CACHE_STALE_IF_ERROR', '86400'))  # kept for upstream outages
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', '2048'))
+    CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+    CACHE_MAX_ENTRY_BYTES = int(os.getenv('CACHE_MAX_ENTRY_BYTES', str(4 * 1024 * 1024)))
+    # Shared on-disk tier (SQLite), disabled when empty
+    CACHE_DISK_PATH = os.getenv('CACHE_DISK_PATH', '')
+    CACHE_DISK_MAX_BYTES = int(os.getenv('CACHE_DISK_MAX_BYTES', str(256 * 1024 * 1024))) 
+    
+    # HTTP caching: search and detail responses carry ETags and Cache-Control
+    # matching the cache TTL, and are compressed per Accept-Encoding (brotli
+    # when the package is installed)
+    HTTP_COMPRESS_MIN_BYTES = int(os.getenv('HTTP_COMPRESS_MIN_BYTES', '1024'))
+    HTTP_GZIP_LEVEL = int(os.getenv('HTTP_GZIP_LEVEL', '6'))
+    HTTP_BROTLI_QUALITY = int(os.getenv('HTTP_BROTLI_QUALITY', '5'))
+    
+    # Cache warmer: refreshes the response cache entries of the most popular
+    # queries shortly before they expire (only when ENABLE_CACHE is on). Each
+    # worker runs one from its first request. With CACHE_DISK_PATH set, a refresh
+    # warms every worker, so they share one WARMER_BUDGET through
+    # RATE_LIMIT_STATE_PATH. Otherwise a refresh only warms the worker's memory
+    # tier, and each worker gets the full budget: N workers may send up to
+    # N x WARMER_BUDGET refreshes per minute
+    WARMER_ENABLED = os.getenv('WARMER_ENABLED', 'True').lower() == 'true'
+    WARMER_TOP_N = int(os.getenv('WARMER_TOP_N', '200'))
+    WARMER_MIN_SCORE = float(os.getenv('WARMER_MIN_SCORE', '2.0'))  # decayed hits; skips one-off queries
+    WARMER_HALF_LIFE = float(os.getenv('WARMER_HALF_LIFE', '3600'))  # seconds for a query's score to halve
+    WARMER_MAX_KEYS = int(os.getenv('WARMER_MAX_KEYS', '5000'))
+    WARMER_INTERVAL = float(os.getenv('WARMER_INTERVAL', '30'))  # seconds between passes
+    WARMER_LEAD = float(os.getenv('WARMER_LEAD', '120'))  # refresh entries expiring within this many seconds
+    WARMER_BUDGET = float(os.getenv('WARMER_BUDGET', '30'))  # upstream refreshes per minute
+    # Search log replayed at startup to seed popularity; empty disables
+    WARMER_SEED_LOG = os.getenv('WARMER_SEED_LOG', LOG_FILE)
+    
+    # Download proxy: files are relayed in chunks of this size, so memory per
+    # download stays constant
+    DOWNLOAD_CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE', str(64 * 1024)))
+    # Content-addressed file cache shared by the workers; disabled when empty
+    DOWNLOAD_CACHE_DIR = os.getenv('DOWNLOAD_CACHE_DIR', '')
+    DOWNLOAD_CACHE_MAX_BYTES = int(os.getenv('DOWNLOAD_CACHE_MAX_BYTES', str(10 * 1024 * 1024 * 1024)))
+    DOWNLOAD_CACHE_MAX_FILE_BYTES = int(os.getenv('DOWNLOAD_CACHE_MAX_FILE_BYTES', str(512 * 1024 * 1024)))
+    # Internal nginx location aliased to DOWNLOAD_CACHE_DIR/blobs; cached files
+    # are then sent by nginx via X-Accel-Redirect instead of by a worker
+    DOWNLOAD_ACCEL_PREFIX = os.getenv('DOWNLOAD_ACCEL_PREFIX', '')
+    
+    # Local state shared by worker processes (circuit breakers, ...)
+    STATE_DIR = os.getenv('STATE_DIR', 'state')
+    # Empty keeps breaker state per process
+    BREAKER_STATE_PATH = os.getenv('BREAKER_STATE_PATH', os.path.join(STATE_DIR, 'breakers.sqlite3'))
+    # Seconds a worker reuses the breaker state it last read; a breaker opened
+    # by another worker is seen at most this late
+    BREAKER_STATE_TTL = float(os.getenv('BREAKER_STATE_TTL', '1.0'))
+    # Outbound rate limiter token buckets; empty keeps them per process
+    RATE_LIMIT_STATE_PATH = os.getenv('RATE_LIMIT_STATE_PATH', os.path.join(STATE_DIR, 'ratelimit.sqlite3'))
+    
+    # Local full-text index (SQLite FTS5) of every book seen in search results,
+    # serving ?mode=local searches and /suggest. Opt-in, e.g. state/books.sqlite3;
+    # disabled when empty. Its exact ISBN table is also what lets ISBN queries
+    # skip the upstream search: without it they search upstream for the
+    # ISBN-13, which only gains the shared canonical cache key
+    LOCAL_INDEX_PATH = os.getenv('LOCAL_INDEX_PATH', '')
+    LOCAL_INDEX_MAX_BOOKS = int(os.getenv('LOCAL_INDEX_MAX_BOOKS', '200000'))
+    LOCAL_INDEX_QUEUE_SIZE = int(os.getenv('LOCAL_INDEX_QUEUE_SIZE', '1000'))  # pending batches
+    
+    # Request coalescing settings
+    ENABLE_COALESCING = os.getenv('ENABLE_COALESCING', 'True').lower() == 'true'
+    # Per-key lock files that serialize identical fetches across workers;
+    # pair with CACHE_DISK_PATH so the waiting worker finds the result. Disabled when empty
+    COALESCE_LOCK_DIR = os.getenv('COALESCE_LOCK_DIR', '')
@@ -1,36 +1,272 @@
-from typing import Dict, Type
-from .base import BookPlatform
-from .zlibrary import ZLibrary
+import importlib
+import logging
+import sys
+import threading
+from typing import TYPE_CHECKING, Dict, List, Type, Union
+from config import Config
+
+if TYPE_CHECKING:
+    from .base import BookPlatform
+    from .async_base import AsyncBookPlatform
+
+logger = logging.getLogger(__name__)
+
+# Installed packages declare extra platforms under this entry point group,
+# as  <platform name> = "package.module:Class"
+ENTRY_POINT_GROUP = 'booksearch.platforms'
+
+def load_class(path: str) -> type:
+    """
+    Import a class from its 'package.module:Class' path
+    Args:
+        path: Module and attribute, separated by a colon
+    Returns:
+        The class
+    Raises:
+        ValueError: If the path is malformed
+        ImportError: If the module cannot be imported
+        AttributeError: If the module has no such class
+    """
+    module_name, _, attribute = path.partition(':')
+    if not module_name or not attribute:
+        raise ValueError(f"Invalid platform path {path!r}, expected 'package.module:Class'")
+    target = importlib.import_module(module_name.strip())
+    for part in attribute.strip().split('.'):
+        target = getattr(target, part)
+    return target
+
+def _parse_plugins(entries: List[str]) -> Dict[str, List[str]]:
+    """Group 'name=package.module:Class' entries by platform name, skipping malformed ones"""
+    declared: Dict[str, List[str]] = {}
+    for entry in entries:
+        name, _, path = entry.partition('=')
+        if not name.strip() or ':' not in path:
+            logger.warning(f"Ignoring platform plugin {entry!r}, expected name=package.module:Class")
+            continue
+        declared.setdefault(name.strip().lower(), []).append(path.strip())
+    return declared
+
+def _entry_point_plugins() -> Dict[str, List[str]]:
+    """Platforms declared by installed packages"""
+    from importlib.metadata import entry_points
+    declared: Dict[str, List[str]] = {}
+    try:
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            declared.setdefault(entry_point.name.lower(), []).append(entry_point.value)
+    except Exception as e:
+        logger.warning(f"Cannot read {ENTRY_POINT_GROUP} entry points: {str(e)}")
+    return declared
 
 class PlatformFactory:
-    """Factory for creating book platform instances"""
-    
-    _platforms: Dict[str, Type[BookPlatform]] = {
-        'zlibrary': ZLibrary
+    """
+    Factory for creating book platform instances.
+
+    Platforms are declared by name with the paths of their classes and only
+    imported when first used, so starting a worker does not load platform
+    modules, their HTML parsers or HTTP clients. Besides the built-in table,
+    declarations come from the booksearch.platforms entry point group and
+    Config.PLATFORM_PLUGINS, which replace the built-in ones of the same name.
+    """
+
+    # Built-in platforms: a sync class and/or a native coroutine class each
+    _declared: Dict[str, List[str]] = {
+        'zlibrary': ['platforms.zlibrary:ZLibrary', 'platforms.zlibrary:AsyncZLibrary']
     }
-    
+    _discovered = False
+
+    # Imported platform classes, filled from the declarations on first use
+    _platforms: Dict[str, Type['BookPlatform']] = {}
+
+    # Native coroutine implementations; platforms missing here are served
+    # through SyncPlatformAdapter in async mode
+    _async_platforms: Dict[str, Type['AsyncBookPlatform']] = {}
+
+    # Process-wide platform instances, each owning its own connection pool
+    _instances: Dict[str, 'BookPlatform'] = {}
+    _async_instances: Dict[str, 'AsyncBookPlatform'] = {}
+    _lock = threading.RLock()
+
+    @classmethod
+    def _discover(cls):
+        """Merge plugin declarations into the built-in ones, once"""
+        if cls._discovered:
+            return
+        with cls._lock:
+            if cls._discovered:
+                return
+            plugins = _entry_point_plugins() if Config.PLATFORM_ENTRY_POINTS else {}
+            plugins.update(_parse_plugins(Config.PLATFORM_PLUGINS))
+            for name, paths in plugins.items():
+                logger.info(f"Platform plugin {name}: {', '.join(paths)}")
+            cls._declared.update(plugins)
+            cls._discovered = True
+
     @classmethod
-    def get_platform(cls, platform_name: str) -> BookPlatform:
+    def _load(cls, name: str):
         """
-        Get platform instance by name
+        Import the declared classes of a platform, if not done yet
+        Raises:
+            ValueError: If a declared path is malformed
+            ImportError: If a declared class cannot be imported
+        """
+        cls._discover()
+        if name not in cls._declared:
+            return
+        with cls._lock:
+            paths = cls._declared.get(name)
+            if not paths:
+                return
+            try:
+                classes = [load_class(path) for path in paths]
+            except (ImportError, AttributeError, ValueError) as e:
+                logger.error(f"Cannot load platform {name}: {str(e)}")
+                raise ImportError(f"Cannot load platform {name}: {str(e)}") from e
+            for platform_class in classes:
+                cls._add(name, platform_class)
+            del cls._declared[name]
+            logger.info(f"Loaded platform {name}: {', '.join(paths)}")
+
+    @classmethod
+    def _add(cls, name: str, platform_class: Union[Type['BookPlatform'], Type['AsyncBookPlatform']]):
+        """Store an imported class and drop instances of the one it replaces; call with the lock held"""
+        # An async class has imported async_base; looking it up instead of
+        # importing it keeps sync-only platforms from loading it
+        async_base = sys.modules.get(__name__ + '.async_base')
+        if async_base is not None and issubclass(platform_class, async_base.AsyncBookPlatform):
+            cls._async_platforms[name] = platform_class
+        else:
+            cls._platforms[name] = platform_class
+            cls._instances.pop(name, None)
+        cls._async_instances.pop(name, None)
+
+    @classmethod
+    def get_platform(cls, platform_name: str) -> 'BookPlatform':
+        """
+        Get platform instance by name, importing it on first use
         Args:
             platform_name: Name of the platform
         Returns:
-            Platform instance
+            Shared platform instance
         Raises:
             ValueError: If platform is not supported
+            ImportError: If the platform's module cannot be loaded
         """
-        platform_class = cls._platforms.get(platform_name.lower())
+        name = platform_name.lower()
+        instance = cls._instances.get(name)
+        if instance is not None:
+            return instance
+
+        cls._load(name)
+        platform_class = cls._platforms.get(name)
         if not platform_class:
             raise ValueError(f"Platform {platform_name} is not supported")
-        return platform_class()
-    
+
+        with cls._lock:
+            instance = cls._instances.get(name)
+            if instance is None:
+                instance = platform_class()
+                cls._instances[name] = instance
+        return instance
+
     @classmethod
-    def register_platform(cls, name: str, platform_class: Type[BookPlatform]):
+    def get_async_platform(cls, platform_name: str) -> 'AsyncBookPlatform':
+        """
+        Get the async flavour of a platform by name, importing it on first use
+        Args:
+            platform_name: Name of the platform
+        Returns:
+            Shared native async instance, or the sync instance behind an adapter
+        Raises:
+            ValueError: If platform is not supported
+            ImportError: If the platform's module cannot be loaded
+        """
+        name = platform_name.lower()
+        instance = cls._async_instances.get(name)
+        if instance is not None:
+            return instance
+
+        cls._load(name)
+        platform_class = cls._async_platforms.get(name)
+        if platform_class is None:
+            # Raises ValueError for unknown platforms
+            sync_instance = cls.get_platform(name)
+
+        with cls._lock:
+            instance = cls._async_instances.get(name)
+            if instance is None:
+                if platform_class is not None:
+                    instance = platform_class()
+                else:
+                    from .async_base import SyncPlatformAdapter
+                    instance = SyncPlatformAdapter(sync_instance)
+                cls._async_instances[name] = instance
+        return instance
+
+    @classmethod
+    def register_platform(cls, name: str,
+                          platform_class: Union[str, Type['BookPlatform'], Type['AsyncBookPlatform']]):
         """
         Register a new platform
         Args:
             name: Platform name
-            platform_class: Platform class
+            platform_class: Platform class, sync or async, or its
+                'package.module:Class' path to import on first use
+        """
+        name = name.lower()
+        if isinstance(platform_class, str):
+            with cls._lock:
+                cls._declared.setdefault(name, []).append(platform_class)
+            return
+        # Pending declarations of the name are loaded first, so this class wins
+        cls._load(name)
+        with cls._lock:
+            cls._add(name, platform_class)
+
+    @classmethod
+    def available_platforms(cls) -> List[str]:
+        """
+        Get the names of all registered platforms, loaded or not
+        Returns:
+            Registered platform names
+        """
+        cls._discover()
+        return list(dict.fromkeys(list(cls._platforms) + list(cls._async_platforms) + list(cls._declared)))
+
+    @classmethod
+    def loaded_platforms(cls) -> List[str]:
+        """
+        Get the names of the platforms whose classes are imported
+        Returns:
+            Loaded platform names
+        """
+        return list(dict.fromkeys(list(cls._platforms) + list(cls._async_platforms)))
+
+    @classmethod
+    def warm_up(cls) -> List[str]:
+        """
+        Import every declared platform, and the parser and HTTP modules they
+        load lazily, without creating instances. Meant for a prefork server's
+        master process (Config.PLATFORM_WARMUP with gunicorn --preload):
+        workers inherit the loaded modules instead of importing them on their
+        first request, while connection pools and threads stay per worker.
+        Returns:
+            Names of the platforms that loaded; failures are logged
+        """
+        cls._discover()
+        for name in list(cls._declared):
+            try:
+                cls._load(name)
+            except ImportError:
+                continue
+        for platform_class in list(cls._platforms.values()) + list(cls._async_platforms.values()):
+            platform_class.warm_up()
+        return cls.loaded_platforms()
+
+    @classmethod
+    def pool_stats(cls) -> Dict[str, Dict[str, int]]:
+        """
+        Get connection pool statistics of every instantiated platform
+        Returns:
+            Pool statistics keyed by platform name
         """
-        cls._platforms[name.lower()] = platform_class 
\ No newline at end of file
+        return {name: instance.pool_stats() for name, instance in list(cls._instances.items())}
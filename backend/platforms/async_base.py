@@ -0,0 +1,243 @@
+import asyncio
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Dict, Any, NamedTuple
+from config import Config
+from utils.decorators import canonicalize_keyword, platform_pipeline
+from utils.event_loop import get_loop, run_sync
+from utils.metrics import UPSTREAM_IN_FLIGHT, UPSTREAM_REQUESTS, observe_stage
+from utils.ratelimit import get_rate_limiter, retry_after_seconds
+from utils.book_index import get_book_index
+from .base import BookPlatform, local_isbn_result
+from .mirrors import Mirror, get_mirror_pool
+
+if TYPE_CHECKING:
+    import aiohttp
+
+class FetchedPage(NamedTuple):
+    """A fully read upstream response"""
+    status: int
+    headers: Dict[str, str]
+    content: bytes
+    base_url: str
+
+class AsyncBookPlatform(ABC):
+    """Base class for book search platforms with coroutine methods"""
+
+    # Same request pipeline as BookPlatform, in its coroutine flavour
+    _pipeline_methods = ('search', 'search_page', 'get_book_detail')
+    _query_methods = ('search', 'search_page')
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name in cls._pipeline_methods:
+            method = cls.__dict__.get(name)
+            if method is None or getattr(method, '__isabstractmethod__', False):
+                continue
+            setattr(cls, name, platform_pipeline(method))
+        for name in cls._query_methods:
+            method = cls.__dict__.get(name)
+            if method is None or getattr(method, '__isabstractmethod__', False):
+                continue
+            setattr(cls, name, canonicalize_keyword(method))
+
+    def __init__(self, platform_name: str):
+        self.platform_name = platform_name
+        self.platform_id = platform_name
+        self.config = Config.PLATFORMS.get(platform_name, {})
+        self.headers = Config.DEFAULT_HEADERS
+        self.base_url = self.config.get('base_url', '')
+        self.timeout = self.config.get('timeout', 10)
+        self.max_retries = self.config.get('max_retries', 3)
+        self.mirrors = get_mirror_pool(self.platform_id, self.config)
+        self.rate_limiter = get_rate_limiter(self.platform_id, self.config)
+
+    @classmethod
+    def warm_up(cls):
+        """Import the modules this platform otherwise loads on first use (see PlatformFactory.warm_up)"""
+        if Config.ASYNC_SERVING:
+            import aiohttp  # noqa: F401
+
+    async def session(self) -> 'aiohttp.ClientSession':
+        """
+        Get the worker-wide client session.
+        Must be awaited on the background loop (see utils.event_loop).
+        """
+        return await get_loop().session()
+
+    async def _fetch(self, path: str, **kwargs) -> FetchedPage:
+        """
+        GET a path from the best mirror, hedging to a second mirror when the
+        first one is slower than the recent p95
+        Args:
+            path: Path relative to the mirror base URL
+            kwargs: Extra arguments for session.get
+        Returns:
+            The first non-5xx page (or the last 5xx one if nothing better arrived)
+        Raises:
+            aiohttp.ClientError, asyncio.TimeoutError: If every attempted mirror failed
+        """
+        pool = self.mirrors
+        primary = pool.choose()
+        tasks = {asyncio.ensure_future(self._fetch_from(primary, path, kwargs)): primary}
+        try:
+            delay = pool.hedge_delay() if self.config.get('hedge', True) else None
+            if delay is not None:
+                done, _ = await asyncio.wait(list(tasks), timeout=delay)
+                secondary = pool.choose(exclude=[primary]) if not done else None
+                if secondary is not None:
+                    pool.record_hedge()
+                    tasks[asyncio.ensure_future(self._fetch_from(secondary, path, kwargs))] = secondary
+
+            pending = set(tasks)
+            fallback, error = None, None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    page = task.result()
+                    if page.status >= 500:
+                        fallback = page
+                        continue
+                    if tasks[task] is not primary:
+                        pool.record_hedge(won=True)
+                    return page
+            if fallback is not None:
+                return fallback
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _fetch_from(self, mirror: Mirror, path: str, kwargs: Dict[str, Any]) -> FetchedPage:
+        """GET a path from one mirror, update its scores and record the connect/TTFB/download stages"""
+        await self.rate_limiter.acquire_async(mirror.url)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        session = await self.session()
+        # Imported here, once the session has loaded it: workers serving
+        # synchronously import this module but never aiohttp
+        import aiohttp
+        timings: Dict[str, float] = {}
+        try:
+            with UPSTREAM_IN_FLIGHT.track(self.platform_id):
+                async with session.get(mirror.url + path, timeout=aiohttp.ClientTimeout(total=self.timeout),
+                                       trace_request_ctx=timings, **kwargs) as response:
+                    headers_at = loop.time()
+                    page = FetchedPage(response.status, dict(response.headers), await response.read(), mirror.url)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.mirrors.record_failure(mirror)
+            UPSTREAM_REQUESTS.inc(self.platform_id, 'error')
+            raise
+        connect = timings.get('connect', 0.0)
+        if connect:
+            observe_stage(self.platform_id, 'connect', connect)
+        observe_stage(self.platform_id, 'ttfb', max(headers_at - started - connect, 0.0))
+        observe_stage(self.platform_id, 'download', loop.time() - headers_at)
+        UPSTREAM_REQUESTS.inc(self.platform_id, f"{page.status // 100}xx")
+        if page.status == 429:
+            await run_sync(self.rate_limiter.penalize, mirror.url, retry_after_seconds(
+                page.headers.get('Retry-After'), self.config.get('throttle_pause', 10)),
+                blocking=self.rate_limiter.blocking)
+        if page.status >= 500:
+            self.mirrors.record_failure(mirror)
+        else:
+            self.mirrors.record_success(mirror, loop.time() - started)
+        return page
+
+    @abstractmethod
+    async def search(self, keyword: str) -> Dict[str, Any]:
+        """
+        Search books with the given keyword
+        Args:
+            keyword: Search keyword
+        Returns:
+            Response data from the platform
+        Raises:
+            SearchError: If search operation fails
+        """
+        pass
+
+    async def search_page(self, keyword: str, page: int) -> Dict[str, Any]:
+        """
+        Search one upstream result page (see BookPlatform.search_page)
+        Args:
+            keyword: Search keyword
+            page: 1-based upstream page number
+        Returns:
+            Response data from the platform; an empty book list past the last page
+        Raises:
+            SearchError: If search operation fails
+        """
+        if page == 1:
+            return await self.search(keyword)
+        return {
+            'content': {'books': [], 'total': 0},
+            'status': 200,
+            'headers': {'content-type': 'application/json'}
+        }
+
+    async def search_isbn(self, isbn: str) -> Dict[str, Any]:
+        """
+        Look up books by ISBN (see BookPlatform.search_isbn)
+        Args:
+            isbn: ISBN-13 digits (see utils.query.parse_isbn)
+        Returns:
+            Response data with the matching books
+        Raises:
+            SearchError: If the upstream search fails
+        """
+        index = get_book_index()
+        books = await run_sync(index.isbn_lookup, isbn, [self.platform_id]) if index is not None else []
+        if books:
+            return local_isbn_result(isbn, books)
+        return await self.search(isbn)
+
+    @abstractmethod
+    async def get_book_detail(self, book_id: str) -> Dict[str, Any]:
+        """
+        Get detailed information for a specific book
+        Args:
+            book_id: Book identifier
+        Returns:
+            Book details
+        Raises:
+            BookNotFoundError: If book is not found
+            SearchError: If operation fails
+        """
+        pass
+
+class SyncPlatformAdapter(AsyncBookPlatform):
+    """Expose a synchronous BookPlatform through the async interface"""
+
+    # The wrapped platform already runs its own pipeline and canonicalization
+    _pipeline_methods = ()
+    _query_methods = ()
+
+    def __init__(self, platform: BookPlatform):
+        self.platform = platform
+        self.platform_name = platform.platform_name
+        self.platform_id = platform.platform_id
+        self.config = platform.config
+        self.headers = platform.headers
+        self.base_url = platform.base_url
+        self.timeout = platform.timeout
+        self.max_retries = platform.max_retries
+        self.mirrors = platform.mirrors
+
+    async def search(self, keyword: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.platform.search, keyword)
+
+    async def search_page(self, keyword: str, page: int) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.platform.search_page, keyword, page)
+
+    async def search_isbn(self, isbn: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.platform.search_isbn, isbn)
+
+    async def get_book_detail(self, book_id: str) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.platform.get_book_detail, book_id)
@@ -1,23 +1,74 @@
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Iterator, List, Tuple
+from urllib.parse import urlsplit
+import requests
 from config import Config
+from utils.book_index import get_book_index
 from utils.errors import SearchError, BookNotFoundError
-from utils.decorators import retry_on_failure, cache_response
+from utils.decorators import canonicalize_keyword, platform_pipeline
+from utils.http import create_session, take_connect_time
+from utils.metrics import UPSTREAM_IN_FLIGHT, UPSTREAM_REQUESTS, observe_stage
+from utils.ratelimit import get_rate_limiter, retry_after_seconds
+from .mirrors import Mirror, get_mirror_pool
+
+# Runs the primary and hedge copies of a request when hedging is possible
+_hedge_executor = ThreadPoolExecutor(max_workers=Config.HEDGE_MAX_WORKERS, thread_name_prefix='hedge')
+
+def local_isbn_result(isbn: str, books: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Wrap books found in the local index's ISBN table in the platform response format"""
+    return {
+        'content': {'books': books, 'total': len(books), 'isbn': isbn, 'source': 'local'},
+        'status': 200,
+        'headers': {'content-type': 'application/json'}
+    }
 
 class BookPlatform(ABC):
     """Base class for book search platforms"""
     
+    # Methods that every concrete platform gets wrapped with the shared
+    # request pipeline (see utils.decorators.platform_pipeline), whether or
+    # not the override is decorated
+    _pipeline_methods = ('search', 'search_page', 'get_book_detail')
+    
+    # Methods whose keyword argument is canonicalized first (see utils.query),
+    # so the pipeline's cache and coalescing keys are canonical
+    _query_methods = ('search', 'search_page', 'iter_search')
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name in cls._pipeline_methods:
+            method = cls.__dict__.get(name)
+            if method is None or getattr(method, '__isabstractmethod__', False):
+                continue
+            setattr(cls, name, platform_pipeline(method))
+        for name in cls._query_methods:
+            method = cls.__dict__.get(name)
+            if method is None or getattr(method, '__isabstractmethod__', False):
+                continue
+            setattr(cls, name, canonicalize_keyword(method))
+    
     def __init__(self, platform_name: str):
         self.platform_name = platform_name
+        self.platform_id = platform_name
         self.config = Config.PLATFORMS.get(platform_name, {})
         self.headers = Config.DEFAULT_HEADERS
         self.base_url = self.config.get('base_url', '')
         self.timeout = self.config.get('timeout', 10)
         self.max_retries = self.config.get('max_retries', 3)
+        # Long-lived keep-alive session; platform instances are process-wide
+        # singletons (see PlatformFactory), so the pool is shared by all requests
+        self.session = create_session(self.config, self.headers)
+        self.mirrors = get_mirror_pool(self.platform_id, self.config)
+        self.rate_limiter = get_rate_limiter(self.platform_id, self.config)
+    
+    @classmethod
+    def warm_up(cls):
+        """Import the modules this platform otherwise loads on first use (see PlatformFactory.warm_up)"""
+        pass
     
     @abstractmethod
-    @retry_on_failure()
-    @cache_response()
     def search(self, keyword: str) -> Dict[str, Any]:
         """
         Search books with the given keyword
@@ -30,9 +81,60 @@ class BookPlatform(ABC):
         """
         pass
     
+    def search_page(self, keyword: str, page: int) -> Dict[str, Any]:
+        """
+        Search one upstream result page
+        Platforms without upstream paging return everything as page 1.
+        Args:
+            keyword: Search keyword
+            page: 1-based upstream page number
+        Returns:
+            Response data from the platform; an empty book list past the last page
+        Raises:
+            SearchError: If search operation fails
+        """
+        if page == 1:
+            return self.search(keyword)
+        return {
+            'content': {'books': [], 'total': 0},
+            'status': 200,
+            'headers': {'content-type': 'application/json'}
+        }
+    
+    def search_isbn(self, isbn: str) -> Dict[str, Any]:
+        """
+        Look up books by ISBN, skipping the full keyword search when the
+        local index's exact ISBN table already has them. Without the index
+        (Config.LOCAL_INDEX_PATH is opt-in), or when it has not seen the
+        ISBN, this is an upstream search for the ISBN-13.
+        Args:
+            isbn: ISBN-13 digits (see utils.query.parse_isbn)
+        Returns:
+            Response data with the matching books
+        Raises:
+            SearchError: If the upstream search fails
+        """
+        index = get_book_index()
+        books = index.isbn_lookup(isbn, [self.platform_id]) if index is not None else []
+        if books:
+            return local_isbn_result(isbn, books)
+        return self.search(isbn)
+    
+    def iter_search(self, keyword: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the books of a search
+        Platforms that cannot parse incrementally yield the books of search().
+        Args:
+            keyword: Search keyword
+        Returns:
+            Iterator of book records
+        Raises:
+            SearchError: If search operation fails
+        """
+        content = self.search(keyword).get('content')
+        return iter(content.get('books', []) if isinstance(content, dict) else [])
+    
     @abstractmethod
-    @retry_on_failure()
-    @cache_response()
     def get_book_detail(self, book_id: str) -> Dict[str, Any]:
         """
         Get detailed information for a specific book
@@ -46,6 +148,115 @@ class BookPlatform(ABC):
         """
         pass
     
+    def _fetch(self, path: str, **kwargs) -> Tuple[requests.Response, str]:
+        """
+        GET a path from the best mirror, hedging to a second mirror when the
+        first one is slower than the recent p95
+        Args:
+            path: Path relative to the mirror base URL
+            kwargs: Extra arguments for session.get
+        Returns:
+            (response, base URL of the mirror that answered)
+        Raises:
+            requests.RequestException: If every attempted mirror failed
+        """
+        pool = self.mirrors
+        primary = pool.choose()
+        delay = pool.hedge_delay() if self.config.get('hedge', True) else None
+        if delay is None:
+            return self._fetch_from(primary, path, kwargs)
+        
+        futures = {_hedge_executor.submit(self._fetch_from, primary, path, kwargs): primary}
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            secondary = pool.choose(exclude=[primary])
+            if secondary is not None:
+                pool.record_hedge()
+                futures[_hedge_executor.submit(self._fetch_from, secondary, path, kwargs)] = secondary
+        
+        # The first non-5xx answer wins; the slower copy finishes in the background
+        pending = set(futures)
+        fallback, error = None, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response, base_url = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if response.status_code >= 500:
+                    fallback = (response, base_url)
+                    continue
+                if futures[future] is not primary:
+                    pool.record_hedge(won=True)
+                return response, base_url
+        if fallback is not None:
+            return fallback
+        raise error
+    
+    def _fetch_from(self, mirror: Mirror, path: str, kwargs: Dict[str, Any]) -> Tuple[requests.Response, str]:
+        """GET a path from one mirror, update its scores and record the connect/TTFB/download stages"""
+        self.rate_limiter.acquire(mirror.url)
+        started = time.monotonic()
+        take_connect_time()
+        try:
+            with UPSTREAM_IN_FLIGHT.track(self.platform_id):
+                response = self.session.get(mirror.url + path, timeout=self.timeout, **kwargs)
+        except requests.RequestException:
+            self.mirrors.record_failure(mirror)
+            UPSTREAM_REQUESTS.inc(self.platform_id, 'error')
+            raise
+        # elapsed stops when the headers are parsed; the body is read after that
+        connect = take_connect_time()
+        headers_at = response.elapsed.total_seconds()
+        if connect:
+            observe_stage(self.platform_id, 'connect', connect)
+        observe_stage(self.platform_id, 'ttfb', max(headers_at - connect, 0.0))
+        if not kwargs.get('stream'):
+            observe_stage(self.platform_id, 'download', max(time.monotonic() - started - headers_at, 0.0))
+        UPSTREAM_REQUESTS.inc(self.platform_id, f"{response.status_code // 100}xx")
+        if response.status_code == 429:
+            self.rate_limiter.penalize(mirror.url, retry_after_seconds(
+                response.headers.get('Retry-After'), self.config.get('throttle_pause', 10)))
+        if response.status_code >= 500:
+            self.mirrors.record_failure(mirror)
+        else:
+            self.mirrors.record_success(mirror, time.monotonic() - started)
+        return response, mirror.url
+    
+    def open_download(self, url: str, headers: Dict[str, str] = None) -> requests.Response:
+        """
+        Start a streamed GET of a file linked from this platform (e.g. a book
+        detail's download_url); the body is left unread for the caller
+        Args:
+            url: Absolute file URL on one of the platform's mirrors or download_hosts
+            headers: Extra request headers (Range, If-Range)
+        Returns:
+            Response with an unread body; the caller must close it
+        Raises:
+            SearchError: If the URL points anywhere else
+            requests.RequestException: If the request fails
+        """
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        mirror_urls = [mirror.rstrip('/') for mirror in self.config.get('mirrors', [self.base_url])]
+        if origin not in mirror_urls and parts.netloc not in self.config.get('download_hosts', []):
+            # Never let a parsed link turn the proxy into an open relay
+            raise SearchError(f"Refusing to proxy a download from {parts.netloc}", self.platform_name)
+        self.rate_limiter.acquire(origin)
+        response = self.session.get(url, headers=headers, stream=True, timeout=self.timeout)
+        UPSTREAM_REQUESTS.inc(self.platform_id, f"{response.status_code // 100}xx")
+        return response
+    
+    def pool_stats(self) -> Dict[str, int]:
+        """
+        Get connection pool statistics for this platform
+        Returns:
+            Requests sent, connections opened and connections reused
+        """
+        return self.session.pool_stats.snapshot()
+    
     def _handle_response(self, response: Any, error_msg: str) -> Dict[str, Any]:
         """
         Handle response and check for errors
@@ -58,7 +269,8 @@ class BookPlatform(ABC):
             SearchError: If request fails
         """
         if not hasattr(response, 'status_code') or response.status_code != 200:
-            raise SearchError(error_msg, self.platform_name)
+            status = getattr(response, 'status_code', 0)
+            raise SearchError(error_msg, self.platform_name, retryable=status >= 500 or status == 429)
             
         return {
             'content': response.content,
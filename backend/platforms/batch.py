@@ -0,0 +1,132 @@
+import asyncio
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Tuple
+from config import Config
+from utils.cache import get_cache
+from utils.decorators import cache_key
+from utils.event_loop import get_loop, run_sync
+from . import PlatformFactory
+
+logger = logging.getLogger(__name__)
+
+# Shared by all batch requests; each batch keeps at most
+# Config.BATCH_CONCURRENCY of its own fetches in flight
+_executor = ThreadPoolExecutor(max_workers=Config.BATCH_MAX_WORKERS, thread_name_prefix='batch')
+
+def _peek_cached(platform_id: str, book_ids: List[str]) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Split IDs into fresh cache hits and the ones that need the platform.
+    Only hits are counted in the cache stats: the others are looked up again
+    by get_book_detail's pipeline, which counts them once
+    """
+    if not Config.ENABLE_CACHE:
+        return {}, list(book_ids)
+    cache = get_cache()
+    cached, missing = {}, []
+    for book_id in book_ids:
+        value = cache.get_fresh(cache_key(platform_id, 'get_book_detail', book_id))
+        if value is not None:
+            cached[book_id] = value['content']
+        else:
+            missing.append(book_id)
+    return cached, missing
+
+def get_book_details(platform_name: str, book_ids: List[str], deadline: float = None) -> Dict[str, Any]:
+    """
+    Get the details of several books in one call
+    Args:
+        platform_name: Platform name
+        book_ids: Book identifiers (duplicates are fetched once)
+        deadline: Seconds to wait for upstream fetches (defaults to Config.SEARCH_DEADLINE)
+    Returns:
+        Book records keyed by ID, per-ID errors, and how many came from cache
+    Raises:
+        ValueError: If the platform is unknown
+    """
+    if Config.ASYNC_SERVING:
+        return get_loop().run(get_book_details_async(platform_name, book_ids, deadline))
+    started = time.monotonic()
+    platform = PlatformFactory.get_platform(platform_name)
+    book_ids = list(dict.fromkeys(book_ids))
+    books, missing = _peek_cached(platform.platform_id, book_ids)
+    cached = len(books)
+    errors: Dict[str, str] = {}
+    stop_at = started + (deadline if deadline is not None else Config.SEARCH_DEADLINE)
+
+    queue = list(reversed(missing))
+    in_flight: Dict[Any, str] = {}
+    while queue or in_flight:
+        while queue and len(in_flight) < Config.BATCH_CONCURRENCY:
+            book_id = queue.pop()
+            in_flight[_executor.submit(platform.get_book_detail, book_id)] = book_id
+        done, _ = wait(list(in_flight), timeout=max(stop_at - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            book_id = in_flight.pop(future)
+            try:
+                books[book_id] = future.result()['content']
+            except Exception as e:
+                logger.error(f"Batch detail for {book_id} on {platform.platform_id} failed: {str(e)}")
+                errors[book_id] = str(e)
+
+    # Whatever is left missed the deadline; running fetches still fill the cache
+    for future, book_id in in_flight.items():
+        future.cancel()
+        errors[book_id] = 'Deadline exceeded'
+    for book_id in queue:
+        errors[book_id] = 'Deadline exceeded'
+
+    return _batch_result(book_ids, books, errors, cached, started)
+
+async def get_book_details_async(platform_name: str, book_ids: List[str], deadline: float = None) -> Dict[str, Any]:
+    """
+    Coroutine flavour of get_book_details, run on the worker's event loop
+    Args:
+        platform_name: Platform name
+        book_ids: Book identifiers (duplicates are fetched once)
+        deadline: Seconds to wait for upstream fetches (defaults to Config.SEARCH_DEADLINE)
+    Returns:
+        Book records keyed by ID, per-ID errors, and how many came from cache
+    Raises:
+        ValueError: If the platform is unknown
+    """
+    started = time.monotonic()
+    platform = PlatformFactory.get_async_platform(platform_name)
+    book_ids = list(dict.fromkeys(book_ids))
+    books, missing = await run_sync(_peek_cached, platform.platform_id, book_ids, blocking=get_cache().blocking)
+    cached = len(books)
+    errors: Dict[str, str] = {}
+    limit = asyncio.Semaphore(Config.BATCH_CONCURRENCY)
+
+    async def fetch(book_id: str):
+        async with limit:
+            try:
+                books[book_id] = (await platform.get_book_detail(book_id))['content']
+            except Exception as e:
+                logger.error(f"Batch detail for {book_id} on {platform.platform_id} failed: {str(e)}")
+                errors[book_id] = str(e)
+
+    tasks = [asyncio.ensure_future(fetch(book_id)) for book_id in missing]
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=deadline if deadline is not None else Config.SEARCH_DEADLINE)
+        for task in pending:
+            task.cancel()
+    for book_id in missing:
+        if book_id not in books and book_id not in errors:
+            errors[book_id] = 'Deadline exceeded'
+
+    return _batch_result(book_ids, books, errors, cached, started)
+
+def _batch_result(book_ids: List[str], books: Dict[str, Any], errors: Dict[str, str],
+                  cached: int, started: float) -> Dict[str, Any]:
+    return {
+        'books': {book_id: books[book_id] for book_id in book_ids if book_id in books},
+        'errors': errors,
+        'total': len(books),
+        'cached': cached,
+        'fetched': len(books) - cached,
+        'latency_ms': round((time.monotonic() - started) * 1000, 1)
+    }
@@ -0,0 +1,125 @@
+import logging
+from typing import TYPE_CHECKING, Iterator, Optional
+from flask import Response, request, send_file
+from config import Config
+from utils.blob_cache import Blob, BlobWriter, get_blob_cache
+from utils.errors import BookSearchError, SearchError
+from utils.metrics import DOWNLOAD_BYTES
+from . import PlatformFactory
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+# Upstream response headers relayed to the client
+RELAYED_HEADERS = ('Content-Type', 'Content-Length', 'Content-Range', 'Content-Disposition',
+                   'Content-Encoding', 'Accept-Ranges', 'ETag', 'Last-Modified')
+
+# Client request headers forwarded upstream, so resumed downloads work end to end
+FORWARDED_HEADERS = ('Range', 'If-Range')
+
+def download_key(platform_id: str, book_id: str) -> str:
+    """Key of a book's file in the download cache"""
+    return f"{platform_id}:{book_id}"
+
+def _blob_response(blob: Blob) -> Response:
+    """Serve a cached file, through nginx when it is configured to serve the blob directory"""
+    if Config.DOWNLOAD_ACCEL_PREFIX:
+        response = Response(status=200, content_type=blob.content_type)
+        response.headers['X-Accel-Redirect'] = f"{Config.DOWNLOAD_ACCEL_PREFIX.rstrip('/')}/{blob.relative_path}"
+    else:
+        # Werkzeug answers Range and conditional requests; the WSGI server's
+        # file wrapper (sendfile under gunicorn) sends the bytes
+        response = send_file(blob.path, mimetype=blob.content_type, conditional=True, etag=blob.digest)
+    if blob.disposition:
+        response.headers['Content-Disposition'] = blob.disposition
+    response.headers['X-Download-Cache'] = 'hit'
+    return response
+
+def _relay(platform_id: str, upstream: 'requests.Response', writer: Optional[BlobWriter]) -> Iterator[bytes]:
+    """
+    Pass the upstream body through in fixed-size chunks, copying it into the
+    download cache on the way; only one chunk is held in memory at a time
+    """
+    complete = False
+    try:
+        # Undecoded, so Content-Length and Content-Range still describe the bytes sent
+        for chunk in upstream.raw.stream(Config.DOWNLOAD_CHUNK_SIZE, decode_content=False):
+            if writer is not None:
+                writer.write(chunk)
+            DOWNLOAD_BYTES.inc(platform_id, amount=len(chunk))
+            yield chunk
+        complete = True
+    except Exception as e:
+        # Headers are already sent; the client sees a short body and can resume with Range
+        logger.error(f"Download from {upstream.url} broke off: {str(e)}")
+    finally:
+        upstream.close()
+        if writer is not None:
+            expected = upstream.headers.get('Content-Length')
+            if complete and (not expected or not expected.isdigit() or int(expected) == writer.size):
+                writer.commit()
+            else:
+                writer.abort()
+
+def download_response(platform_name: str, book_id: str) -> Response:
+    """
+    Proxy a book's file: from the download cache when it is there, otherwise
+    streamed from upstream (and cached when it is downloaded in full)
+    Args:
+        platform_name: Platform name
+        book_id: Book identifier
+    Returns:
+        Streaming Flask response; Range requests get 206
+    Raises:
+        ValueError: If the platform is unknown
+        BookSearchError: If the book has no download link or upstream refuses it
+        SearchError: If the upstream request fails
+    """
+    platform = PlatformFactory.get_platform(platform_name)
+    key = download_key(platform.platform_id, book_id)
+    cache = get_blob_cache()
+    blob = cache.lookup(key) if cache is not None else None
+    if blob is not None:
+        return _blob_response(blob)
+
+    url = platform.get_book_detail(book_id)['content'].get('download_url')
+    if not url:
+        raise BookSearchError(f"No download link for book {book_id} on {platform.platform_name}", 404)
+    import requests
+    forwarded = {name: request.headers[name] for name in FORWARDED_HEADERS if name in request.headers}
+    try:
+        upstream = platform.open_download(url, forwarded)
+    except requests.RequestException as e:
+        raise SearchError(f"Download failed: {str(e)}", platform.platform_name, retryable=True)
+    if upstream.status_code not in (200, 206):
+        upstream.close()
+        if upstream.status_code == 416:
+            raise BookSearchError("Requested range not satisfiable", 416)
+        raise BookSearchError(f"Download of book {book_id} failed with upstream status {upstream.status_code}", 502)
+
+    writer = None
+    # Only whole, unencoded files are cached; partial downloads are just relayed
+    if cache is not None and upstream.status_code == 200 and not upstream.headers.get('Content-Encoding'):
+        length = upstream.headers.get('Content-Length', '')
+        writer = cache.writer(key, upstream.headers.get('Content-Type', 'application/octet-stream'),
+                              upstream.headers.get('Content-Disposition', ''),
+                              int(length) if length.isdigit() else None)
+    response = Response(_relay(platform.platform_id, upstream, writer), status=upstream.status_code,
+                        direct_passthrough=True)
+    for name in RELAYED_HEADERS:
+        if name in upstream.headers:
+            response.headers[name] = upstream.headers[name]
+    response.headers['X-Download-Cache'] = 'miss'
+    response.headers['X-Accel-Buffering'] = 'no'  # keep reverse proxies from buffering
+    return response
+
+def download_stats() -> dict:
+    """
+    Get download cache counters
+    Returns:
+        Cache statistics, or {'enabled': False}
+    """
+    cache = get_blob_cache()
+    return dict(cache.stats(), enabled=True) if cache is not None else {'enabled': False}
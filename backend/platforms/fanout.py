@@ -0,0 +1,179 @@
+import asyncio
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Iterator, List, Tuple
+from config import Config
+from utils.event_loop import get_loop
+from utils.query import parse_isbn
+from . import PlatformFactory
+
+logger = logging.getLogger(__name__)
+
+# Shared by all fan-out requests; a platform that overruns its deadline keeps
+# its thread until the upstream timeout fires, so size this above the
+# expected concurrency times the number of platforms
+_executor = ThreadPoolExecutor(max_workers=Config.FANOUT_MAX_WORKERS, thread_name_prefix='fanout')
+
+def _timed_search(platform, keyword: str, started: float) -> Dict[str, Any]:
+    """Run one platform search and record when it finished"""
+    isbn = parse_isbn(keyword)
+    result = platform.search_isbn(isbn) if isbn else platform.search(keyword)
+    return {'result': result, 'latency': time.monotonic() - started}
+
+def platform_status(platform_id: str, name: str, latency: float = None, total: int = 0,
+                    timed_out: bool = False, error: str = None) -> Dict[str, Any]:
+    """Status of one platform in a search response"""
+    return {
+        'id': platform_id,
+        'name': name,
+        'available': error is None and not timed_out and total > 0,
+        'total': total,
+        'latency_ms': round(latency * 1000, 1) if latency is not None else None,
+        'timed_out': timed_out,
+        'error': error
+    }
+
+def search_platforms(keyword: str, platform_names: List[str], deadline: float = None) -> Dict[str, Any]:
+    """
+    Search several platforms concurrently and merge whatever finishes in time
+    Args:
+        keyword: Search keyword
+        platform_names: Names of the platforms to query
+        deadline: Global deadline in seconds (defaults to Config.SEARCH_DEADLINE)
+    Returns:
+        Merged books plus a per-platform status with latency, timeout and error
+    """
+    if Config.ASYNC_SERVING:
+        return get_loop().run(search_platforms_async(keyword, platform_names, deadline))
+    started = time.monotonic()
+    books: List[Dict[str, Any]] = []
+    statuses: Dict[str, Dict[str, Any]] = {}
+    for platform_books, status in iter_platform_results(keyword, platform_names, deadline):
+        books.extend(platform_books)
+        statuses[status['id']] = status
+
+    return {
+        'books': books,
+        'total': len(books),
+        'platform_status': statuses,
+        'latency_ms': round((time.monotonic() - started) * 1000, 1)
+    }
+
+def iter_platform_results(keyword: str, platform_names: List[str],
+                          deadline: float = None) -> Iterator[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+    """
+    Search several platforms concurrently, yielding each one as it finishes
+    Args:
+        keyword: Search keyword
+        platform_names: Names of the platforms to query
+        deadline: Global deadline in seconds (defaults to Config.SEARCH_DEADLINE)
+    Returns:
+        Iterator of (books, status) per platform, in completion order; platforms
+        that fail or miss their deadline come with no books
+    """
+    started = time.monotonic()
+    global_deadline = started + (deadline if deadline is not None else Config.SEARCH_DEADLINE)
+    pending: Dict[Any, Any] = {}
+    deadlines: Dict[Any, float] = {}
+
+    for name in platform_names:
+        try:
+            platform = PlatformFactory.get_platform(name)
+        except (ValueError, ImportError) as e:
+            # Unknown platform, or a plugin that fails to import
+            yield [], platform_status(name, name, error=str(e))
+            continue
+        future = _executor.submit(_timed_search, platform, keyword, started)
+        pending[future] = platform
+        platform_deadline = platform.config.get('deadline', Config.SEARCH_DEADLINE)
+        deadlines[future] = min(started + platform_deadline, global_deadline)
+
+    while pending:
+        now = time.monotonic()
+        for future in [f for f in pending if deadlines[f] <= now and not f.done()]:
+            platform = pending.pop(future)
+            future.cancel()
+            logger.warning(f"Platform {platform.platform_id} missed its deadline for keyword: {keyword}")
+            yield [], platform_status(platform.platform_id, platform.platform_name, latency=now - started, timed_out=True)
+        if not pending:
+            break
+
+        timeout = max(min(deadlines[f] for f in pending) - now, 0)
+        done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            platform = pending.pop(future)
+            try:
+                outcome = future.result()
+            except Exception as e:
+                logger.error(f"Platform {platform.platform_id} failed: {str(e)}")
+                yield [], platform_status(
+                    platform.platform_id, platform.platform_name,
+                    latency=time.monotonic() - started, error=str(e)
+                )
+                continue
+            content = outcome['result']['content']
+            platform_books = content.get('books', []) if isinstance(content, dict) else []
+            yield platform_books, platform_status(
+                platform.platform_id, platform.platform_name,
+                latency=outcome['latency'], total=len(platform_books)
+            )
+
+async def search_platforms_async(keyword: str, platform_names: List[str], deadline: float = None) -> Dict[str, Any]:
+    """
+    Coroutine flavour of search_platforms, run on the worker's event loop
+    Args:
+        keyword: Search keyword
+        platform_names: Names of the platforms to query
+        deadline: Global deadline in seconds (defaults to Config.SEARCH_DEADLINE)
+    Returns:
+        Merged books plus a per-platform status with latency, timeout and error
+    """
+    started = time.monotonic()
+    global_deadline = deadline if deadline is not None else Config.SEARCH_DEADLINE
+    statuses: Dict[str, Dict[str, Any]] = {}
+    platforms = []
+
+    for name in platform_names:
+        try:
+            platforms.append(PlatformFactory.get_async_platform(name))
+        except (ValueError, ImportError) as e:
+            statuses[name] = platform_status(name, name, error=str(e))
+
+    isbn = parse_isbn(keyword)
+
+    async def run(platform) -> Dict[str, Any]:
+        timeout = min(platform.config.get('deadline', Config.SEARCH_DEADLINE), global_deadline)
+        try:
+            search = platform.search_isbn(isbn) if isbn else platform.search(keyword)
+            result = await asyncio.wait_for(search, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Platform {platform.platform_id} missed its deadline for keyword: {keyword}")
+            return {'books': [], 'status': platform_status(
+                platform.platform_id, platform.platform_name,
+                latency=time.monotonic() - started, timed_out=True
+            )}
+        except Exception as e:
+            logger.error(f"Platform {platform.platform_id} failed: {str(e)}")
+            return {'books': [], 'status': platform_status(
+                platform.platform_id, platform.platform_name,
+                latency=time.monotonic() - started, error=str(e)
+            )}
+        content = result['content']
+        platform_books = content.get('books', []) if isinstance(content, dict) else []
+        return {'books': platform_books, 'status': platform_status(
+            platform.platform_id, platform.platform_name,
+            latency=time.monotonic() - started, total=len(platform_books)
+        )}
+
+    books: List[Dict[str, Any]] = []
+    for outcome in await asyncio.gather(*(run(platform) for platform in platforms)):
+        books.extend(outcome['books'])
+        statuses[outcome['status']['id']] = outcome['status']
+
+    return {
+        'books': books,
+        'total': len(books),
+        'platform_status': statuses,
+        'latency_ms': round((time.monotonic() - started) * 1000, 1)
+    }
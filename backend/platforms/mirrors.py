@@ -0,0 +1,223 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Iterable, List, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class Mirror:
+    """One base URL of a platform with its latency and error scores"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.ewma_latency: Optional[float] = None
+        # Latency of the last health probe, which fetches '/' rather than real pages
+        self.probe_latency: Optional[float] = None
+        self.error_score = 0.0
+        self.consecutive_failures = 0
+        self.healthy = True
+        self.requests = 0
+
+    def score(self) -> float:
+        """Lower is better; unmeasured mirrors score 0 so they get tried"""
+        latency = self.ewma_latency if self.ewma_latency is not None else 0.0
+        return latency * (1.0 + 10.0 * self.error_score)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'url': self.url,
+            'healthy': self.healthy,
+            'ewma_latency_ms': round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            'probe_latency_ms': round(self.probe_latency * 1000, 1) if self.probe_latency is not None else None,
+            'error_score': round(self.error_score, 3),
+            'requests': self.requests
+        }
+
+class MirrorPool:
+    """
+    Routes requests to the fastest healthy mirror of a platform.
+
+    Each mirror keeps an EWMA of its latency and error rate. Mirrors that fail
+    `unhealthy_after` times in a row leave the rotation until the background
+    prober sees them answer again. The pool also tracks recent request
+    latencies so callers can hedge a request that runs past the p95; probes
+    only decide health and are kept out of both.
+    """
+
+    def __init__(self, urls: Iterable[str], alpha: float = 0.3, unhealthy_after: int = 3,
+                 probe_interval: float = 30.0, probe_timeout: float = 5.0, min_hedge_samples: int = 20):
+        self.mirrors: List[Mirror] = [Mirror(url) for url in dict.fromkeys(urls) if url]
+        self.alpha = alpha
+        self.unhealthy_after = unhealthy_after
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.min_hedge_samples = min_hedge_samples
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._latencies = deque(maxlen=500)
+        self._lock = threading.Lock()
+        self._prober: Optional[threading.Thread] = None
+        self._probe_headers: Optional[Dict[str, str]] = None
+
+    def choose(self, exclude: Iterable[Mirror] = ()) -> Optional[Mirror]:
+        """
+        Pick the best mirror
+        Args:
+            exclude: Mirrors already in use for this request
+        Returns:
+            Fastest healthy mirror; the best unhealthy one if none is healthy;
+            None if every mirror is excluded
+        """
+        excluded = set(id(mirror) for mirror in exclude)
+        with self._lock:
+            candidates = [m for m in self.mirrors if id(m) not in excluded]
+            if not candidates:
+                return None
+            healthy = [m for m in candidates if m.healthy]
+            return min(healthy or candidates, key=Mirror.score)
+
+    def healthy_count(self) -> int:
+        return sum(1 for mirror in self.mirrors if mirror.healthy)
+
+    def record_success(self, mirror: Mirror, latency: float):
+        with self._lock:
+            mirror.requests += 1
+            mirror.ewma_latency = latency if mirror.ewma_latency is None else (
+                self.alpha * latency + (1 - self.alpha) * mirror.ewma_latency
+            )
+            mirror.error_score = (1 - self.alpha) * mirror.error_score
+            mirror.consecutive_failures = 0
+            if not mirror.healthy:
+                logger.info(f"Mirror {mirror.url} is back in rotation")
+            mirror.healthy = True
+            self._latencies.append(latency)
+
+    def record_failure(self, mirror: Mirror):
+        with self._lock:
+            mirror.requests += 1
+            mirror.error_score = self.alpha + (1 - self.alpha) * mirror.error_score
+            mirror.consecutive_failures += 1
+            if mirror.healthy and mirror.consecutive_failures >= self.unhealthy_after:
+                mirror.healthy = False
+                logger.warning(f"Mirror {mirror.url} taken out of rotation")
+
+    def record_probe(self, mirror: Mirror, latency: Optional[float]):
+        """
+        Record a health probe
+        Args:
+            mirror: Probed mirror
+            latency: Seconds the probe took, None if it failed
+        """
+        if latency is None:
+            self.record_failure(mirror)
+            return
+        with self._lock:
+            mirror.probe_latency = latency
+            mirror.error_score = (1 - self.alpha) * mirror.error_score
+            mirror.consecutive_failures = 0
+            if not mirror.healthy:
+                logger.info(f"Mirror {mirror.url} is back in rotation")
+            mirror.healthy = True
+
+    def record_hedge(self, won: bool = False):
+        """Count a hedged request, or a win of its second copy"""
+        with self._lock:
+            if won:
+                self.hedge_wins += 1
+            else:
+                self.hedged += 1
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Seconds to wait before hedging a request
+        Returns:
+            p95 of recent latencies, or None while there are too few samples
+            or no second healthy mirror to hedge to
+        """
+        with self._lock:
+            if len(self._latencies) < self.min_hedge_samples:
+                return None
+            ordered = sorted(self._latencies)
+        if self.healthy_count() < 2:
+            return None
+        return ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+    def start_prober(self, headers: Dict[str, str] = None):
+        """Start the background health prober once per process (no-op for a single mirror)"""
+        if len(self.mirrors) < 2 or self.probe_interval <= 0:
+            return
+        with self._lock:
+            if self._prober is not None:
+                return
+            first_start = self._probe_headers is None
+            self._probe_headers = headers or {}
+            self._prober = threading.Thread(target=self._probe_forever, args=(headers,), name='mirror-prober', daemon=True)
+        if first_start and hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self.restart_after_fork)
+        self._prober.start()
+
+    def restart_after_fork(self):
+        # The prober thread does not survive fork() (e.g. gunicorn --preload);
+        # the lock may have been held by another thread at that moment
+        self._lock = threading.Lock()
+        self._prober = None
+        self.start_prober(self._probe_headers)
+
+    def _probe_forever(self, headers: Dict[str, str] = None):
+        import requests
+        session = requests.Session()
+        if headers:
+            session.headers.update(headers)
+        while True:
+            time.sleep(self.probe_interval)
+            for mirror in list(self.mirrors):
+                started = time.monotonic()
+                try:
+                    response = session.get(mirror.url + '/', timeout=self.probe_timeout, verify=False)
+                    ok = response.status_code < 500
+                except requests.RequestException:
+                    ok = False
+                self.record_probe(mirror, time.monotonic() - started if ok else None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'mirrors': [mirror.to_dict() for mirror in self.mirrors],
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'hedge_delay_ms': round(self.hedge_delay() * 1000, 1) if self.hedge_delay() is not None else None
+        }
+
+_pools: Dict[str, MirrorPool] = {}
+_pools_lock = threading.Lock()
+
+def get_mirror_pool(platform_id: str, config: Dict[str, Any]) -> MirrorPool:
+    """
+    Get the mirror pool of a platform, shared by its sync and async flavours
+    Args:
+        platform_id: Platform identifier
+        config: Platform configuration (see Config.PLATFORMS)
+    Returns:
+        Shared MirrorPool instance, with its prober started
+    """
+    pool = _pools.get(platform_id)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(platform_id)
+            if pool is None:
+                pool = _pools[platform_id] = MirrorPool(
+                    config.get('mirrors') or [config.get('base_url', '')],
+                    probe_interval=config.get('probe_interval', 30.0)
+                )
+                pool.start_prober(Config.DEFAULT_HEADERS)
+    return pool
+
+def mirror_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Get mirror health and hedging counters per platform
+    Returns:
+        Statistics keyed by platform id
+    """
+    return {platform_id: pool.stats() for platform_id, pool in list(_pools.items())}
@@ -0,0 +1,236 @@
+import base64
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import Config
+from utils.query import Query
+from . import PlatformFactory
+
+logger = logging.getLogger(__name__)
+
+# Fetches one upstream result page (1-based) and returns its books
+PageFetcher = Callable[[int], List[Dict[str, Any]]]
+
+_prefetch_executor = ThreadPoolExecutor(max_workers=Config.PREFETCH_MAX_WORKERS, thread_name_prefix='prefetch')
+
+class QueryPages:
+    """
+    Upstream result pages of one query, fetched lazily and kept parsed.
+
+    Concurrent readers of the same page (including a background prefetch)
+    share one fetch through a per-page Future.
+    """
+
+    def __init__(self, fetch_page: PageFetcher):
+        self.fetch_page = fetch_page
+        self.pages: Dict[int, List[Dict[str, Any]]] = {}
+        self.last_page: Optional[int] = None  # set once an empty page is seen
+        self.last_access = time.monotonic()
+        self._pending: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+
+    def slice(self, offset: int, limit: int, prefetch: bool = True) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Get books [offset, offset + limit) across upstream pages
+        Args:
+            offset: Index of the first book
+            limit: Maximum number of books
+            prefetch: Fetch the following upstream page in the background
+        Returns:
+            (books, whether more books may follow)
+        """
+        self.last_access = time.monotonic()
+        books: List[Dict[str, Any]] = []
+        position = 0
+        number = 1
+        while len(books) < limit:
+            if self.last_page is not None and number > self.last_page:
+                break
+            page = self._load(number)
+            if not page:
+                break
+            if position + len(page) > offset:
+                start = max(offset - position, 0)
+                books.extend(page[start:start + limit - len(books)])
+            position += len(page)
+            number += 1
+
+        # `number` is now the first upstream page we have not read
+        has_more = position > offset + len(books) or self.last_page is None or number <= self.last_page
+        if prefetch:
+            self._prefetch(number)
+        return books, has_more
+
+    def loaded_count(self) -> int:
+        """Number of books in the upstream pages fetched so far"""
+        with self._lock:
+            return sum(len(books) for books in self.pages.values())
+
+    def _future(self, number: int) -> Tuple[Future, bool]:
+        with self._lock:
+            if number in self.pages:
+                future = Future()
+                future.set_result(self.pages[number])
+                return future, False
+            future = self._pending.get(number)
+            if future is not None:
+                return future, False
+            future = self._pending[number] = Future()
+            return future, True
+
+    def _run(self, number: int, future: Future):
+        try:
+            books = self.fetch_page(number)
+        except BaseException as e:
+            with self._lock:
+                self._pending.pop(number, None)
+            future.set_exception(e)
+            return
+        with self._lock:
+            self.pages[number] = books
+            if not books and (self.last_page is None or number - 1 < self.last_page):
+                self.last_page = number - 1
+            self._pending.pop(number, None)
+        future.set_result(books)
+
+    def _load(self, number: int) -> List[Dict[str, Any]]:
+        future, owner = self._future(number)
+        if owner:
+            self._run(number, future)
+        return future.result()
+
+    def _prefetch(self, number: int):
+        if self.last_page is not None and number > self.last_page:
+            return
+        future, owner = self._future(number)
+        if owner:
+            # Errors surface to whoever reads the page next
+            logger.debug("Prefetching upstream page %s", number)
+            _prefetch_executor.submit(self._run, number, future)
+
+class CursorStore:
+    """LRU of QueryPages keyed by (platform, query), with idle expiry"""
+
+    def __init__(self, max_queries: int, ttl: float):
+        self.max_queries = max_queries
+        self.ttl = ttl
+        self._queries: 'OrderedDict[Tuple[str, str], QueryPages]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, platform_id: str, keyword: str, fetch_page: PageFetcher) -> QueryPages:
+        """
+        Get the page cache of a query, creating it if needed
+        Args:
+            platform_id: Platform identifier
+            keyword: Search keyword
+            fetch_page: Loader for upstream pages of this query
+        Returns:
+            Shared QueryPages instance
+        """
+        key = (platform_id, keyword)
+        now = time.monotonic()
+        with self._lock:
+            pages = self._queries.get(key)
+            if pages is not None and now - pages.last_access > self.ttl:
+                pages = None
+            if pages is None:
+                pages = self._queries[key] = QueryPages(fetch_page)
+            self._queries.move_to_end(key)
+            while len(self._queries) > self.max_queries:
+                self._queries.popitem(last=False)
+        return pages
+
+    def __len__(self) -> int:
+        return len(self._queries)
+
+def encode_cursor(platform_id: str, keyword: str, offset: int, per_page: int) -> str:
+    """
+    Build an opaque cursor for the next slice of a query
+    Returns:
+        URL-safe cursor string
+    """
+    payload = json.dumps({'p': platform_id, 'q': keyword, 'o': offset, 'n': per_page}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Decode a cursor made by encode_cursor
+    Returns:
+        Dict with platform_id, keyword, offset and per_page
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return {
+            'platform_id': str(payload['p']),
+            'keyword': str(payload['q']),
+            'offset': max(int(payload['o']), 0),
+            'per_page': max(int(payload['n']), 1)
+        }
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+
+_store: Optional[CursorStore] = None
+_store_lock = threading.Lock()
+
+def get_cursor_store() -> CursorStore:
+    """
+    Get the process-wide cursor store, creating it from Config on first use
+    Returns:
+        Shared CursorStore instance
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = CursorStore(Config.CURSOR_MAX_QUERIES, Config.CURSOR_TTL)
+    return _store
+
+def search_paginated(platform_name: str, keyword: str = None, per_page: int = None,
+                     cursor: str = None) -> Dict[str, Any]:
+    """
+    One slice of a platform search, fetching upstream pages only as needed
+    Args:
+        platform_name: Platform name (ignored when a cursor is given)
+        keyword: Search keyword (ignored when a cursor is given)
+        per_page: Books per slice (defaults to Config.SEARCH_PER_PAGE)
+        cursor: Cursor from a previous slice's next_cursor
+    Returns:
+        Books of the slice, whether more follow and the cursor of the next slice
+    Raises:
+        ValueError: If the platform is unknown or the cursor is malformed
+        SearchError: If an upstream page fails
+    """
+    offset = 0
+    if cursor:
+        state = decode_cursor(cursor)
+        platform_name, keyword, offset = state['platform_id'], state['keyword'], state['offset']
+        per_page = per_page or state['per_page']
+    per_page = min(max(per_page or Config.SEARCH_PER_PAGE, 1), Config.SEARCH_MAX_PER_PAGE)
+    platform = PlatformFactory.get_platform(platform_name)
+    query = Query(keyword)
+
+    def fetch_page(number: int) -> List[Dict[str, Any]]:
+        # Page 1 shares the cache entry of a plain search
+        result = platform.search(query) if number == 1 else platform.search_page(query, number)
+        content = result.get('content')
+        return content.get('books', []) if isinstance(content, dict) else []
+
+    # Spellings of the same query share one cursor store entry
+    pages = get_cursor_store().get(platform.platform_id, query.canonical, fetch_page)
+    books, has_more = pages.slice(offset, per_page)
+    next_offset = offset + len(books)
+    return {
+        'books': books,
+        'total': len(books),
+        'offset': offset,
+        'per_page': per_page,
+        'has_more': has_more,
+        'next_cursor': encode_cursor(platform.platform_id, query, next_offset, per_page) if has_more else None
+    }
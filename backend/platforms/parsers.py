@@ -0,0 +1,296 @@
+import html
+import html.entities
+import re
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Any, Dict, Iterator, Optional, Tuple
+
+if TYPE_CHECKING:
+    from bs4 import SoupStrainer
+
+# A parsed <z-bookcard>: its attributes, and the text of its title/author slots
+# (None when the slot element is missing)
+Card = Tuple[Dict[str, str], Optional[str], Optional[str]]
+
+class BookCardParser(ABC):
+    """Extracts z-bookcard elements from a Z-Library result page"""
+
+    name = ''
+
+    @abstractmethod
+    def iter_cards(self, content: bytes) -> Iterator[Card]:
+        """
+        Yield the cards of a result page in document order
+        Args:
+            content: Raw HTML of the result page
+        Returns:
+            Iterator of (attributes, title, author)
+        """
+        pass
+
+class SoupParser(BookCardParser):
+    """
+    Reference parser: builds the full BeautifulSoup tree of the page. Cards
+    inside <template> are inert markup the page never shows and are skipped.
+    """
+
+    name = 'soup'
+
+    def __init__(self, features: str = 'html.parser', parse_only: 'SoupStrainer' = None):
+        self.features = features
+        self.parse_only = parse_only
+
+    def iter_cards(self, content: bytes) -> Iterator[Card]:
+        # bs4 is loaded on first use; the default fast parser never needs it
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(content, self.features, parse_only=self.parse_only)
+        for book in soup.find_all('z-bookcard'):
+            if book.find_parent('template') is not None:
+                continue
+            title = book.find('div', attrs={'slot': 'title'})
+            author = book.find('div', attrs={'slot': 'author'})
+            yield (
+                dict(book.attrs),
+                title.get_text(strip=True) if title else None,
+                author.get_text(strip=True) if author else None
+            )
+
+class StrainedSoupParser(SoupParser):
+    """BeautifulSoup restricted to z-bookcard subtrees, on lxml when installed"""
+
+    name = 'strained'
+
+    def __init__(self):
+        try:
+            import lxml  # noqa: F401
+            features = 'lxml'
+        except ImportError:
+            features = 'html.parser'
+        from bs4 import SoupStrainer
+        # Templates are kept so the cards inside them can be told apart
+        super().__init__(features, SoupStrainer(['z-bookcard', 'template']))
+
+class FastParser(BookCardParser):
+    """
+    Regex scanner that only visits z-bookcard elements and never builds a tree.
+
+    Mirrors what SoupParser returns for html.parser: attribute names are
+    lowercased, values entity-decoded, the last duplicate attribute wins, and
+    slot text is the concatenation of each stripped text node, with entities
+    decoded the way html.parser does (unknown names and names running into
+    letters stay literal). Comments and <script>, <style> and <template>
+    content are skipped, so cards quoted there are not picked up; a
+    self-closing <z-bookcard/> is an empty card.
+
+    Known divergences, none seen on real pages: malformed character
+    references (&# with no digits, digits followed by hex letters), unquoted
+    attribute values ending in a slash on a self-closing card, and markup
+    html.parser itself recovers from in unusual ways (stray '<' in text,
+    unterminated tags).
+    """
+
+    name = 'fast'
+
+    # Regions html.parser does not read as elements; unterminated ones run to the end
+    _SKIPPED = r'''<!--.*?(?:-->|\Z)|<(script|style|template)\b(?:[^>"']|"[^"]*"|'[^']*')*>.*?(?:</\1\s*>|\Z)'''
+    _CARD_OPEN = re.compile(_SKIPPED + r'''|<z-bookcard((?:\s(?:[^>"']|"[^"]*"|'[^']*')*)?)>''', re.I | re.S)
+    _CARD_CLOSE = re.compile(_SKIPPED + r'|(</z-bookcard\s*>)', re.I | re.S)
+    _SKIP = re.compile(_SKIPPED, re.I | re.S)
+    _ENTITY = re.compile(r'&(?:#([xX][0-9a-fA-F]+|[0-9]+)|([a-zA-Z][-.a-zA-Z0-9]*));?')
+    _DIV_TAG = re.compile(r'''<(/?)div((?:\s(?:[^>"']|"[^"]*"|'[^']*')*)?)>''', re.I)
+    _ATTR = re.compile(r'''([^\s/>"'=]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]*))?''')
+    _MARKUP = re.compile(r'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<[^>]*>', re.S)
+
+    def iter_cards(self, content: bytes) -> Iterator[Card]:
+        text = content.decode('utf-8', errors='replace') if isinstance(content, bytes) else content
+        position = 0
+        while True:
+            opening = self._CARD_OPEN.search(text, position)
+            if opening is None:
+                return
+            position = opening.end()
+            if opening.group(2) is None:
+                continue  # comment, script, style or template
+            attrs = self._parse_attrs(opening.group(2))
+            if opening.group(2).rstrip().endswith('/'):
+                yield attrs, None, None
+                continue
+
+            closing = self._CARD_CLOSE.search(text, position)
+            while closing is not None and closing.group(2) is None:
+                closing = self._CARD_CLOSE.search(text, closing.end())
+            end = closing.start() if closing else len(text)
+            body = text[position:end]
+            position = closing.end() if closing else len(text)
+            # An empty tag keeps the text on either side as separate nodes
+            body = self._SKIP.sub('<>', body)
+            yield attrs, self._slot_text(body, 'title'), self._slot_text(body, 'author')
+
+    def _parse_attrs(self, source: str) -> Dict[str, str]:
+        attrs = {}
+        for match in self._ATTR.finditer(source or ''):
+            value = match.group(2)
+            if value is None:
+                value = ''
+            elif value[:1] in ('"', "'") and value[-1:] == value[:1] and len(value) > 1:
+                value = value[1:-1]
+            attrs[match.group(1).lower()] = html.unescape(value)
+        return attrs
+
+    def _slot_text(self, body: str, slot: str) -> Optional[str]:
+        # Locate the first <div slot="..."> and its matching </div>
+        start = None
+        depth = 0
+        for tag in self._DIV_TAG.finditer(body):
+            closing, attrs = tag.groups()
+            self_closing = attrs.rstrip().endswith('/')
+            if start is None:
+                if not closing and self._parse_attrs(attrs).get('slot') == slot:
+                    if self_closing:
+                        return ''
+                    start = tag.end()
+                    depth = 1
+                continue
+            if closing:
+                depth -= 1
+                if depth == 0:
+                    return self._text(body[start:tag.start()])
+            elif not self_closing:
+                depth += 1
+        if start is None:
+            return None
+        return self._text(body[start:])
+
+    def _text(self, fragment: str) -> str:
+        parts = (self._unescape(part).strip() for part in self._MARKUP.split(fragment))
+        return ''.join(part for part in parts if part)
+
+    def _unescape(self, text: str) -> str:
+        return self._ENTITY.sub(self._entity, text) if '&' in text else text
+
+    @staticmethod
+    def _entity(match) -> str:
+        number, name = match.groups()
+        if name is not None:
+            # html.parser takes the whole name; html.unescape would decode the
+            # longest known prefix, e.g. &notit as ¬it
+            character = html.entities.html5.get(name + ';')
+            return character if character is not None else f"&{name}"
+        code = int(number[1:], 16) if number[0] in 'xX' else int(number)
+        if 128 <= code < 256:
+            # Like BeautifulSoup, read &#128;-&#255; as Windows-1252
+            try:
+                return bytes([code]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        try:
+            return chr(code)
+        except (ValueError, OverflowError):
+            return '\N{REPLACEMENT CHARACTER}'
+
+_PARSERS = {
+    SoupParser.name: SoupParser,
+    StrainedSoupParser.name: StrainedSoupParser,
+    FastParser.name: FastParser
+}
+_instances: Dict[str, BookCardParser] = {}
+
+def get_parser(name: str) -> BookCardParser:
+    """
+    Get a parser backend by name
+    Args:
+        name: One of 'fast', 'strained' or 'soup'
+    Returns:
+        Shared parser instance
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    parser = _instances.get(name)
+    if parser is None:
+        parser_class = _PARSERS.get(name)
+        if parser_class is None:
+            raise ValueError(f"Parser {name} is not supported")
+        parser = _instances[name] = parser_class()
+    return parser
+
+class BookDetailParser:
+    """
+    Extracts a compact record from a Z-Library book page.
+
+    Detail pages are parsed once per cache lifetime, so this uses the
+    reference BeautifulSoup tree (on lxml when installed) rather than a scanner.
+    """
+
+    # Descriptions can run to several pages of HTML; keep the record small
+    MAX_DESCRIPTION = 4000
+
+    def __init__(self):
+        try:
+            import lxml  # noqa: F401
+            self.features = 'lxml'
+        except ImportError:
+            self.features = 'html.parser'
+
+    def parse(self, content: bytes) -> Dict[str, Any]:
+        """
+        Parse a book page
+        Args:
+            content: Raw HTML of the book page
+        Returns:
+            title, authors, description, cover/download paths and the
+            bookProperty table (year, publisher, language, pages, isbn, file, ...)
+        """
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(content, self.features)
+        title = soup.find('h1', class_='book-title') or soup.find('h1', attrs={'itemprop': 'name'}) or soup.find('h1')
+
+        authors = []
+        for link in soup.select('.authors a') or soup.select('a[href^="/author/"]'):
+            name = link.get_text(strip=True)
+            if name and name not in authors:
+                authors.append(name)
+
+        description = soup.find(id='bookDescriptionBox')
+        description = description.get_text(' ', strip=True) if description else None
+        if description and len(description) > self.MAX_DESCRIPTION:
+            description = description[:self.MAX_DESCRIPTION].rstrip() + '…'
+
+        properties = {}
+        for prop in soup.select('div.bookProperty'):
+            # Class names look like property_year or property__file
+            key = next((cls[len('property_'):].strip('_') for cls in prop.get('class', [])
+                        if cls.startswith('property_') and cls not in ('property_label', 'property_value')), None)
+            value = prop.find(class_='property_value')
+            if key and value is not None:
+                properties[key] = value.get_text(' ', strip=True)
+
+        cover = soup.select_one('z-cover img') or soup.select_one('img[itemprop="image"]') or soup.select_one('img.cover')
+        download = soup.select_one('a.addDownloadedBook') or soup.select_one('a[href^="/dl/"]')
+        return {
+            'title': title.get_text(strip=True) if title else None,
+            'authors': authors,
+            'description': description,
+            'cover': (cover.get('data-src') or cover.get('src')) if cover else None,
+            'download': download.get('href') if download else None,
+            'properties': properties
+        }
+
+_detail_parser: Optional[BookDetailParser] = None
+
+def preload():
+    """Import the HTML libraries that the parsers otherwise load on first use"""
+    import bs4  # noqa: F401
+    try:
+        import lxml.etree  # noqa: F401
+    except ImportError:
+        pass
+
+def get_detail_parser() -> BookDetailParser:
+    """
+    Get the shared book page parser
+    Returns:
+        Shared BookDetailParser instance
+    """
+    global _detail_parser
+    if _detail_parser is None:
+        _detail_parser = BookDetailParser()
+    return _detail_parser
@@ -0,0 +1,104 @@
+import logging
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+from utils.admission import admit
+from utils.decorators import cache_key
+from utils.query import canonicalize, parse_isbn
+from utils.serialization import dumps
+from . import PlatformFactory
+from .fanout import iter_platform_results, platform_status
+
+logger = logging.getLogger(__name__)
+
+# (event name, payload); 'book' events carry one book record, the closing
+# 'summary' event carries total, platform_status and latency_ms
+Event = Tuple[str, Dict[str, Any]]
+
+# Content types of the supported stream formats
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream'
+}
+
+def stream_search(platform_name: str, keyword: str) -> Iterator[Event]:
+    """
+    Search one platform, emitting each book as soon as it is parsed
+    Args:
+        platform_name: Platform name
+        keyword: Search keyword
+    Returns:
+        Iterator of book events followed by a summary event
+    Raises:
+        ValueError: If the platform is unknown
+        SearchError: If the upstream fetch fails (raised before any event)
+        OverloadedError: If admission control sheds the request
+    """
+    started = time.monotonic()
+    platform = PlatformFactory.get_platform(platform_name)
+    isbn = parse_isbn(keyword)
+    # The admission slot is held while the page is fetched, not while it
+    # streams; a busy platform may answer with the cached search instead
+    key = cache_key(platform.platform_id, 'search', canonicalize(keyword))
+    result = admit(platform.platform_id, platform.config, key,
+                   lambda: platform.search_isbn(isbn) if isbn else platform.iter_search(keyword))
+    books = iter(result['content']['books']) if isinstance(result, dict) else result
+
+    def events() -> Iterator[Event]:
+        total, error = 0, None
+        try:
+            for book in books:
+                total += 1
+                yield 'book', book
+        except Exception as e:
+            logger.error(f"Streaming search on {platform.platform_id} failed: {str(e)}")
+            error = str(e)
+        status = platform_status(
+            platform.platform_id, platform.platform_name,
+            latency=time.monotonic() - started, total=total, error=error
+        )
+        yield 'summary', _summary(total, {platform.platform_id: status}, started)
+
+    return events()
+
+def stream_platforms(keyword: str, platform_names: List[str], deadline: float = None) -> Iterator[Event]:
+    """
+    Search several platforms concurrently, emitting each platform's books as it finishes
+    Args:
+        keyword: Search keyword
+        platform_names: Names of the platforms to query
+        deadline: Global deadline in seconds (defaults to Config.SEARCH_DEADLINE)
+    Returns:
+        Iterator of book events followed by a summary event
+    """
+    started = time.monotonic()
+    total = 0
+    statuses: Dict[str, Dict[str, Any]] = {}
+    for books, status in iter_platform_results(keyword, platform_names, deadline):
+        statuses[status['id']] = status
+        for book in books:
+            total += 1
+            yield 'book', book
+    yield 'summary', _summary(total, statuses, started)
+
+def _summary(total: int, statuses: Dict[str, Dict[str, Any]], started: float) -> Dict[str, Any]:
+    return {
+        'total': total,
+        'platform_status': statuses,
+        'latency_ms': round((time.monotonic() - started) * 1000, 1)
+    }
+
+def encode_events(events: Iterator[Event], stream_format: str) -> Iterator[bytes]:
+    """
+    Serialize events for the wire
+    Args:
+        events: Events from stream_search or stream_platforms
+        stream_format: 'ndjson' (one {"event", "data"} object per line) or 'sse'
+    Returns:
+        Iterator of encoded chunks, one per event
+    """
+    for event, data in events:
+        payload = dumps(data)
+        if stream_format == 'sse':
+            yield b'event: ' + event.encode('ascii') + b'\ndata: ' + payload + b'\n\n'
+        else:
+            yield b'{"event":"' + event.encode('ascii') + b'","data":' + payload + b'}\n'
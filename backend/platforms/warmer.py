@@ -0,0 +1,187 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from config import Config
+from utils.cache import get_cache
+from utils.decorators import cache_key, revalidating
+from utils.popularity import QueryPopularity, get_popularity
+from utils.ratelimit import Bucket, MemoryRateStore, get_rate_store
+from utils.resilience import get_breaker, CLOSED
+from . import PlatformFactory
+
+logger = logging.getLogger(__name__)
+
+class CacheWarmer:
+    """
+    Background scheduler that keeps the cached results of popular queries
+    fresh. Every `interval` seconds it walks the `top_n` most popular
+    queries (see utils.popularity) and re-fetches those whose cache entry
+    is missing or expires within `lead` seconds, so their users never wait
+    on a cold upstream fetch. Refreshes draw from a token bucket of `budget`
+    upstream requests per minute and pause while a platform's breaker is not
+    closed. The bucket lives in `store` (see utils.ratelimit), so with the
+    shared store the budget holds for the whole host, however many workers
+    run a warmer.
+    """
+
+    def __init__(self, popularity: QueryPopularity, top_n: int = 200, min_score: float = 2.0,
+                 interval: float = 30, lead: float = 120, budget: float = 30, store=None):
+        self.popularity = popularity
+        self.top_n = top_n
+        self.min_score = min_score
+        self.interval = interval
+        self.lead = lead
+        self.budget = budget
+        self.store = store if store is not None else MemoryRateStore()
+        self._bucket = Bucket('cache-warmer', budget / 60, max(budget, 1))
+        self._counts = dict.fromkeys(('passes', 'refreshed', 'failed', 'fresh', 'over_budget', 'breaker_open'), 0)
+        self._last_pass: Optional[Dict[str, Any]] = None
+        self._worker: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the background thread (once per process)"""
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._stop.clear()
+            self._worker = threading.Thread(target=self._run_forever, name='cache-warmer', daemon=True)
+            self._worker.start()
+        logger.info(f"Cache warmer started: top {self.top_n} queries every {self.interval}s, "
+                    f"budget {self.budget} refreshes/min")
+
+    def stop(self):
+        self._stop.set()
+
+    def _run_forever(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Cache warmer pass failed: {str(e)}")
+
+    def _take_token(self) -> bool:
+        if self.budget <= 0:
+            return False
+        try:
+            # No waiting: a refresh either has a token now or waits for the next pass
+            delay, _ = self.store.reserve([self._bucket], time.time(), 0.0)
+            return delay is not None
+        except sqlite3.Error as e:
+            logger.warning(f"Cache warmer budget unavailable: {str(e)}")
+            return False
+
+    def run_once(self) -> Dict[str, Any]:
+        """
+        Refresh the popular entries that are about to expire
+        Returns:
+            Counters of this pass
+        """
+        started = time.monotonic()
+        deadline = time.time() + self.lead
+        cache = get_cache()
+        counts = dict.fromkeys(('candidates', 'refreshed', 'failed', 'fresh', 'over_budget', 'breaker_open'), 0)
+        for platform_id, query, _ in self.popularity.top(self.top_n, self.min_score):
+            counts['candidates'] += 1
+            expires_at = cache.expires_at(cache_key(platform_id, 'search', query))
+            if expires_at is not None and expires_at > deadline:
+                counts['fresh'] += 1
+                continue
+            try:
+                platform = PlatformFactory.get_platform(platform_id)
+            except (ValueError, ImportError):
+                continue
+            if get_breaker(platform.platform_id, platform.config).state() != CLOSED:
+                counts['breaker_open'] += 1
+                continue
+            if not self._take_token():
+                # Most popular first, so what is left waits for the next pass
+                counts['over_budget'] += 1
+                break
+            try:
+                with revalidating():
+                    platform.search(self.popularity.text(platform_id, query))
+                counts['refreshed'] += 1
+            except Exception as e:
+                counts['failed'] += 1
+                logger.warning(f"Cache warmer could not refresh {platform_id}:{query}: {str(e)}")
+
+        with self._lock:
+            self._counts['passes'] += 1
+            for name in ('refreshed', 'failed', 'fresh', 'over_budget', 'breaker_open'):
+                self._counts[name] += counts[name]
+            self._last_pass = dict(counts, duration_ms=round((time.monotonic() - started) * 1000, 1), at=time.time())
+        if counts['refreshed'] or counts['failed']:
+            logger.info(f"Cache warmer refreshed {counts['refreshed']} entries "
+                        f"({counts['failed']} failed, {counts['over_budget']} over budget)")
+        return counts
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get warmer counters
+        Returns:
+            Totals across passes, the last pass, and the current popularity ranking
+        """
+        with self._lock:
+            stats = dict(self._counts)
+            stats['last_pass'] = self._last_pass
+        stats['running'] = self._worker is not None and self._worker.is_alive()
+        stats['budget_per_minute'] = self.budget
+        stats['popularity'] = self.popularity.snapshot()
+        return stats
+
+_warmer: Optional[CacheWarmer] = None
+_warmer_lock = threading.Lock()
+
+def get_warmer() -> CacheWarmer:
+    """
+    Get the process-wide cache warmer, creating it from Config on first use
+    Returns:
+        Shared CacheWarmer instance (not started)
+    """
+    global _warmer
+    if _warmer is None:
+        with _warmer_lock:
+            if _warmer is None:
+                _warmer = CacheWarmer(
+                    get_popularity(),
+                    top_n=Config.WARMER_TOP_N,
+                    min_score=Config.WARMER_MIN_SCORE,
+                    interval=Config.WARMER_INTERVAL,
+                    lead=Config.WARMER_LEAD,
+                    budget=Config.WARMER_BUDGET,
+                    # Refreshes only warm other workers through the disk tier;
+                    # without it each worker's own entries need the full budget
+                    store=get_rate_store() if Config.CACHE_DISK_PATH else MemoryRateStore()
+                )
+    return _warmer
+
+# Process that started the warmer; threads do not survive fork()
+_started_in: Optional[int] = None
+
+def start_cache_warmer() -> bool:
+    """
+    Seed popularity from the search log and start the warmer, if enabled.
+    Meant to be called from the worker that serves requests, not at import:
+    a preloading master would otherwise run the only warmer, in a process
+    its forked workers do not share. Cheap once started in this process.
+    Returns:
+        Whether the warmer is running
+    """
+    global _started_in
+    if not (Config.ENABLE_CACHE and Config.WARMER_ENABLED):
+        return False
+    if _started_in == os.getpid():
+        return True
+    with _warmer_lock:
+        if _started_in == os.getpid():
+            return True
+        _started_in = os.getpid()
+    warmer = get_warmer()
+    warmer.popularity.seed_from_log(Config.WARMER_SEED_LOG)
+    warmer.start()
+    return True
@@ -1,14 +1,202 @@
+import asyncio
+import itertools
+import urllib.parse
 import requests
 import urllib3.exceptions
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Iterator, List, Tuple
 import logging
-from bs4 import BeautifulSoup
 from .base import BookPlatform
-from utils.errors import BookNotFoundError, SearchError
+from .async_base import AsyncBookPlatform
+from .parsers import Card, SoupParser, get_parser, get_detail_parser, preload as preload_parsers
+from config import Config
+from utils.book_index import get_book_index
+from utils.records import Book
+from utils.cache import get_cache, FRESH
+from utils.decorators import cache_key, cache_result, guarded_call
+from utils.logs import Sampler, lazy
+from utils.metrics import stage
+from utils.resilience import get_breaker, CLOSED
+from utils.errors import BookNotFoundError, CircuitOpenError, RateLimitedError, SearchError
 
 logger = logging.getLogger(__name__)
 
-class ZLibrary(BookPlatform):
+# One in Config.LOG_CARD_SAMPLE per-card debug events is logged
+_card_sample = Sampler(Config.LOG_CARD_SAMPLE)
+
+class ZLibraryParser:
+    """Z-Library page parsing shared by the sync and async platforms"""
+    
+    @classmethod
+    def warm_up(cls):
+        # Book pages and the soup parsers need bs4, imported lazily otherwise
+        preload_parsers()
+    
+    def _parse_books(self, content: bytes, base_url: str = None) -> List[Book]:
+        """
+        Parse book cards from a search result page
+        Args:
+            content: Raw HTML of the result page
+            base_url: Mirror that served the page, used for book links
+        Returns:
+            Parsed book records
+        """
+        with stage(self.platform_id, 'parse'):
+            books = list(self._iter_parsed_books(content, base_url))
+        logger.info(f"Successfully parsed {len(books)} books")
+        self._index_books(books)
+        return books
+    
+    def _index_books(self, books: List[Book]):
+        """Hand parsed books to the local full-text index, if enabled"""
+        index = get_book_index()
+        if index is not None:
+            index.ingest(books)
+    
+    def _iter_parsed_books(self, content: bytes, base_url: str = None) -> Iterator[Book]:
+        """
+        Yield book records from a search result page as each card is parsed
+        Args:
+            content: Raw HTML of the result page
+            base_url: Mirror that served the page, used for book links
+        Returns:
+            Iterator of book records
+        """
+        parser_name = self.config.get('parser', 'fast')
+        emitted = 0
+        try:
+            for book in self._iter_books(get_parser(parser_name).iter_cards(content), base_url):
+                emitted += 1
+                yield book
+        except Exception as e:
+            if parser_name == SoupParser.name:
+                raise
+            # The reference parser tolerates markup the fast path may not;
+            # skip the books already emitted before the failure
+            logger.warning(f"Parser {parser_name} failed, falling back to soup: {str(e)}")
+            cards = get_parser(SoupParser.name).iter_cards(content)
+            yield from itertools.islice(self._iter_books(cards, base_url), emitted, None)
+    
+    def _iter_books(self, cards: Iterable[Card], base_url: str = None) -> Iterator[Book]:
+        """
+        Map parsed z-bookcards to book records
+        Args:
+            cards: (attributes, title, author) tuples from a parser backend
+            base_url: Prefix for book links (defaults to the configured base_url)
+        Returns:
+            Iterator of book records that have both a title and a link
+        """
+        base_url = base_url or self.base_url
+        card_count = 0
+        # Per-card debug events are sampled, and skipped outright unless DEBUG is on
+        debug = logger.isEnabledFor(logging.DEBUG)
+        for attrs, title, author in cards:
+            card_count += 1
+            try:
+                # 记录原始HTML以便调试
+                if debug and _card_sample():
+                    logger.debug("Processing book card: %s", attrs)
+                
+                # 从z-bookcard的属性中获取信息
+                book_info = Book(
+                    # 基本信息
+                    title=title,
+                    author=author if author is not None else 'Unknown',
+                    year=attrs.get('year'),
+                    isbn=attrs.get('isbn'),
+                    publisher=attrs.get('publisher', 'Unknown'),
+                    
+                    # 文件信息
+                    extension=attrs.get('extension'),
+                    filesize=attrs.get('filesize'),
+                    language=attrs.get('language', 'Unknown'),
+                    
+                    # 来源信息
+                    source=self.platform_name,
+                    platform_id=self.platform_id,
+                    book_url=f"{base_url}{attrs.get('href')}" if attrs.get('href') else None,
+                    
+                    # 额外信息
+                    pages=attrs.get('pages', 'Unknown'),
+                    quality=attrs.get('quality', '0.0'),
+                    rating=attrs.get('rating', '0.0')
+                )
+                
+            except Exception as e:
+                logger.error(f"Error parsing book card: {str(e)}")
+                continue
+            
+            # 只添加有标题和链接的书籍
+            if book_info.title and book_info.book_url:
+                if debug and _card_sample():
+                    logger.debug("Parsed book: %s", book_info)
+                yield book_info
+        logger.info(f"Found {card_count} book cards")
+    
+    def _detail_result(self, book_id: str, content: bytes, base_url: str = None) -> Dict[str, Any]:
+        """
+        Parse a book page into the platform response format
+        Args:
+            book_id: Book identifier
+            content: Raw HTML of the book page
+            base_url: Mirror that served the page, used for links
+        Returns:
+            Book detail response with a compact record instead of the page HTML
+        """
+        base_url = base_url or self.base_url
+        with stage(self.platform_id, 'parse'):
+            detail = get_detail_parser().parse(content)
+        
+        def absolute(path: str) -> str:
+            return f"{base_url}{path}" if path and path.startswith('/') else path
+        
+        return {
+            'content': {
+                'id': book_id,
+                'title': detail['title'],
+                'authors': detail['authors'],
+                'author': ', '.join(detail['authors']) or 'Unknown',
+                'description': detail['description'],
+                'cover_url': absolute(detail['cover']),
+                'download_url': absolute(detail['download']),
+                'properties': detail['properties'],
+                'book_url': f"{base_url}/book/{book_id}",
+                'source': self.platform_name,
+                'platform_id': self.platform_id
+            },
+            'status': 200,
+            'headers': {'content-type': 'application/json'}
+        }
+    
+    def _search_path(self, keyword: str, page: int = 1) -> str:
+        """Path of a search result page; page 1 keeps the original URL"""
+        # Quoted whole: '#', '?' and '/' are common in queries (C#, TCP/IP)
+        path = f"/s/{urllib.parse.quote(keyword, safe='')}"
+        return path if page <= 1 else f"{path}?page={page}"
+    
+    def _search_result(self, books: List[Book]) -> Dict[str, Any]:
+        """
+        Wrap parsed books in the platform response format
+        Args:
+            books: Parsed book records
+        Returns:
+            Search response
+        """
+        return {
+            'content': {
+                'books': books,
+                'total': len(books),
+                'platform_status': {
+                    'id': self.platform_id,
+                    'name': self.platform_name,
+                    'available': len(books) > 0,
+                    'total': len(books)
+                }
+            },
+            'status': 200,
+            'headers': {'content-type': 'application/json'}
+        }
+
+class ZLibrary(ZLibraryParser, BookPlatform):
     """Z-Library platform implementation"""
     
     def __init__(self):
@@ -27,96 +215,106 @@ class ZLibrary(BookPlatform):
         Raises:
             SearchError: If search fails
         """
-        url = f"{self.base_url}/s/{keyword}"
-        logger.info(f"Searching Z-Library with URL: {url}")
+        return self._search(keyword)
+    
+    def search_page(self, keyword: str, page: int) -> Dict[str, Any]:
+        """
+        Search one result page on Z-Library
+        Args:
+            keyword: Search keyword
+            page: 1-based result page number
+        Returns:
+            Z-Library response with parsed book data; no books past the last page
+        Raises:
+            SearchError: If search fails
+        """
+        return self._search(keyword, page)
+    
+    def iter_search(self, keyword: str) -> Iterator[Book]:
+        """
+        Stream books on Z-Library as each result card is parsed.
+        A fresh cached result is replayed as is; a streamed page is cached once
+        fully consumed. The page is fetched before this returns, in a single
+        attempt behind the circuit breaker, and failures fall back to search
+        (retries, stale cache), so errors raise here rather than mid-stream.
+        Args:
+            keyword: Search keyword
+        Returns:
+            Iterator of book records
+        Raises:
+            SearchError: If search fails
+        """
+        key = cache_key(self.platform_id, 'search', keyword)
+        if Config.ENABLE_CACHE:
+            value, state = get_cache().get(key)
+            if state == FRESH:
+                return iter(value['content']['books'])
+        
+        if get_breaker(self.platform_id, self.config).state() == CLOSED:
+            try:
+                content, base_url = guarded_call(self, self._fetch_search_page, keyword)
+            except CircuitOpenError:
+                pass
+            except SearchError as e:
+                if not e.retryable:
+                    raise
+                logger.warning(f"Streaming fetch failed, falling back to search: {str(e)}")
+            else:
+                return self._stream_books(key, content, base_url)
+        return iter(self.search(keyword)['content']['books'])
+    
+    def _stream_books(self, key: str, content: bytes, base_url: str) -> Iterator[Book]:
+        books = []
+        for book in self._iter_parsed_books(content, base_url):
+            books.append(book)
+            yield book
+        self._index_books(books)
+        if Config.ENABLE_CACHE:
+            cache_result(key, self._search_result(books))
+    
+    def _search(self, keyword: str, page: int = 1) -> Dict[str, Any]:
+        content, base_url = self._fetch_search_page(keyword, page)
+        books = self._parse_books(content, base_url)
+        return self._search_result(books)
+    
+    def _fetch_search_page(self, keyword: str, page: int = 1) -> Tuple[bytes, str]:
+        """
+        Fetch the raw HTML of a search result page
+        Returns:
+            (page content, base URL of the mirror that served it)
+        Raises:
+            SearchError: If the request fails or the status is not 200
+        """
+        path = self._search_path(keyword, page)
+        logger.info(f"Searching Z-Library with path: {path}")
         
         try:
-            response = requests.get(
-                url,
-                headers=self.headers,
-                timeout=self.timeout,
-                verify=False
-            )
+            response, base_url = self._fetch(path, verify=False)
             logger.info(f"Got response with status code: {response.status_code}")
-            logger.debug(f"Response content preview: {response.text[:500]}")
+            # Decode only the preview, and only if the record is written
+            logger.debug("Response content preview: %s",
+                         lazy(lambda: response.content[:500].decode(response.encoding or 'utf-8', errors='replace')))
             
             if response.status_code != 200:
                 logger.error(f"Search failed with status {response.status_code}")
-                raise SearchError(f"Search failed with status {response.status_code}", self.platform_name)
-            
-            # Parse the response content
-            soup = BeautifulSoup(response.content, 'html.parser')
-            books = []
-            
-            # Find all book cards
-            book_cards = soup.find_all('z-bookcard')
-            logger.info(f"Found {len(book_cards)} book cards")
-            
-            for book in book_cards:
-                try:
-                    # 记录原始HTML以便调试
-                    logger.debug(f"Processing book card: {book}")
-                    
-                    # 从z-bookcard的属性中获取信息
-                    book_info = {
-                        # 基本信息
-                        'title': book.find('div', attrs={'slot': 'title'}).get_text(strip=True) if book.find('div', attrs={'slot': 'title'}) else None,
-                        'author': book.find('div', attrs={'slot': 'author'}).get_text(strip=True) if book.find('div', attrs={'slot': 'author'}) else 'Unknown',
-                        'year': book.get('year'),
-                        'isbn': book.get('isbn'),
-                        'publisher': book.get('publisher', 'Unknown'),
-                        
-                        # 文件信息
-                        'extension': book.get('extension'),
-                        'filesize': book.get('filesize'),
-                        'language': book.get('language', 'Unknown'),
-                        
-                        # 来源信息
-                        'source': self.platform_name,
-                        'platform_id': self.platform_id,
-                        'book_url': f"{self.base_url}{book.get('href')}" if book.get('href') else None,
-                        
-                        # 额外信息
-                        'pages': book.get('pages', 'Unknown'),
-                        'quality': book.get('quality', '0.0'),
-                        'rating': book.get('rating', '0.0'),
-                    }
-                    
-                    # 只添加有标题和链接的书籍
-                    if book_info['title'] and book_info['book_url']:
-                        books.append(book_info)
-                        logger.debug(f"Parsed book: {book_info}")
-                    
-                except Exception as e:
-                    logger.error(f"Error parsing book card: {str(e)}")
-                    continue
-            
-            logger.info(f"Successfully parsed {len(books)} books")
+                raise SearchError(
+                    f"Search failed with status {response.status_code}", self.platform_name,
+                    retryable=response.status_code >= 500 or response.status_code == 429
+                )
             
-            return {
-                'content': {
-                    'books': books,
-                    'total': len(books),
-                    'platform_status': {
-                        'id': self.platform_id,
-                        'name': self.platform_name,
-                        'available': len(books) > 0,
-                        'total': len(books)
-                    }
-                },
-                'status': 200,
-                'headers': {'content-type': 'application/json'}
-            }
+            return response.content, base_url
             
+        except (SearchError, RateLimitedError):
+            raise
         except requests.Timeout:
             logger.error("Request timed out")
-            raise SearchError("Request timed out", self.platform_name)
+            raise SearchError("Request timed out", self.platform_name, retryable=True)
         except urllib3.exceptions.SSLError as e:
             logger.error(f"SSL error: {str(e)}")
             raise SearchError(f"SSL error: {str(e)}", self.platform_name)
         except requests.RequestException as e:
             logger.error(f"Request failed: {str(e)}")
-            raise SearchError(f"Request failed: {str(e)}", self.platform_name)
+            raise SearchError(f"Request failed: {str(e)}", self.platform_name, retryable=True)
         except Exception as e:
             logger.error(f"Unexpected error: {str(e)}")
             raise SearchError(f"Unexpected error: {str(e)}", self.platform_name)
@@ -132,25 +330,117 @@ class ZLibrary(BookPlatform):
             BookNotFoundError: If book is not found
             SearchError: If request fails
         """
-        url = f"{self.base_url}/book/{book_id}"
-        logger.info(f"Getting book details from URL: {url}")
+        path = f"/book/{book_id}"
+        logger.info(f"Getting book details from path: {path}")
         
         try:
-            response = requests.get(
-                url,
-                headers=self.headers,
-                timeout=self.timeout
-            )
+            response, base_url = self._fetch(path)
             logger.info(f"Got response with status code: {response.status_code}")
             
             if response.status_code == 404:
                 logger.error(f"Book {book_id} not found")
                 raise BookNotFoundError(book_id, self.platform_name)
-                
-            return self._handle_response(
-                response,
-                f"Failed to get details for book '{book_id}'"
-            )
+            if response.status_code != 200:
+                raise SearchError(
+                    f"Failed to get details for book '{book_id}'", self.platform_name,
+                    retryable=response.status_code >= 500 or response.status_code == 429
+                )
+            
+            return self._detail_result(book_id, response.content, base_url)
         except Exception as e:
             logger.error(f"Error getting book details: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+
+class AsyncZLibrary(ZLibraryParser, AsyncBookPlatform):
+    """Z-Library platform on the worker's shared event loop and client session"""
+    
+    def __init__(self):
+        super().__init__('zlibrary')
+        self.platform_name = 'Z-Library'
+        self.platform_id = 'zlibrary'
+        logger.info(f"Initialized AsyncZLibrary platform with base_url: {self.base_url}")
+    
+    async def search(self, keyword: str) -> Dict[str, Any]:
+        """
+        Search books on Z-Library
+        Args:
+            keyword: Search keyword
+        Returns:
+            Z-Library response with parsed book data
+        Raises:
+            SearchError: If search fails
+        """
+        return await self._search(keyword)
+    
+    async def search_page(self, keyword: str, page: int) -> Dict[str, Any]:
+        """
+        Search one result page on Z-Library
+        Args:
+            keyword: Search keyword
+            page: 1-based result page number
+        Returns:
+            Z-Library response with parsed book data; no books past the last page
+        Raises:
+            SearchError: If search fails
+        """
+        return await self._search(keyword, page)
+    
+    async def _search(self, keyword: str, page: int = 1) -> Dict[str, Any]:
+        import aiohttp  # loaded by the session; sync workers never import it
+        path = self._search_path(keyword, page)
+        logger.info(f"Searching Z-Library with path: {path}")
+        
+        try:
+            page = await self._fetch(path, ssl=False)
+        except asyncio.TimeoutError:
+            logger.error("Request timed out")
+            raise SearchError("Request timed out", self.platform_name, retryable=True)
+        except aiohttp.ClientError as e:
+            logger.error(f"Request failed: {str(e)}")
+            raise SearchError(f"Request failed: {str(e)}", self.platform_name, retryable=True)
+        
+        logger.info(f"Got response with status code: {page.status}")
+        if page.status != 200:
+            logger.error(f"Search failed with status {page.status}")
+            raise SearchError(
+                f"Search failed with status {page.status}", self.platform_name,
+                retryable=page.status >= 500 or page.status == 429
+            )
+        
+        # Parsing is CPU bound; keep it off the loop so other requests progress
+        loop = asyncio.get_running_loop()
+        books = await loop.run_in_executor(None, self._parse_books, page.content, page.base_url)
+        return self._search_result(books)
+    
+    async def get_book_detail(self, book_id: str) -> Dict[str, Any]:
+        """
+        Get book details from Z-Library
+        Args:
+            book_id: Book identifier
+        Returns:
+            Book details
+        Raises:
+            BookNotFoundError: If book is not found
+            SearchError: If request fails
+        """
+        import aiohttp  # loaded by the session; sync workers never import it
+        path = f"/book/{book_id}"
+        logger.info(f"Getting book details from path: {path}")
+        
+        try:
+            page = await self._fetch(path)
+        except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+            logger.error(f"Error getting book details: {str(e)}")
+            raise SearchError(f"Request failed: {str(e)}", self.platform_name, retryable=True)
+        
+        logger.info(f"Got response with status code: {page.status}")
+        if page.status == 404:
+            logger.error(f"Book {book_id} not found")
+            raise BookNotFoundError(book_id, self.platform_name)
+        if page.status != 200:
+            raise SearchError(
+                f"Failed to get details for book '{book_id}'", self.platform_name,
+                retryable=page.status >= 500 or page.status == 429
+            )
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._detail_result, book_id, page.content, page.base_url)
@@ -0,0 +1,184 @@
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+from config import Config
+from utils.cache import get_cache
+from utils.errors import OverloadedError
+
+QUEUE_FULL = 'queue_full'
+QUEUE_TIMEOUT = 'queue_timeout'
+
+class AdmissionGate:
+    """
+    Bounded concurrency for one platform's requests in this worker.
+
+    At most `limit` requests run at once. Up to `queue_size` more wait, in
+    arrival order, for at most `queue_timeout` seconds; beyond that requests
+    are shed at once (429), and requests whose wait runs out are shed too
+    (503). Both carry a Retry-After estimated from recent service times, so
+    a slow upstream turns into fast rejections instead of a pile-up.
+    """
+
+    def __init__(self, name: str, limit: int = 16, queue_size: int = 32, queue_timeout: float = 2.0):
+        self.name = name
+        self.limit = max(limit, 1)
+        self.queue_size = max(queue_size, 0)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.served_stale = 0
+        self.shed = {QUEUE_FULL: 0, QUEUE_TIMEOUT: 0}
+        # Moving average of how long an admitted request holds its slot
+        self.service_time = 1.0
+        self._cond = threading.Condition()
+
+    def try_acquire(self) -> bool:
+        """
+        Take a slot without waiting
+        Returns:
+            False when every slot is busy or others are already queued
+        """
+        with self._cond:
+            if self.active < self.limit and not self.waiting:
+                self.active += 1
+                self.admitted += 1
+                return True
+            return False
+
+    def acquire(self, timeout: float = None):
+        """
+        Take a slot, waiting in the queue if needed
+        Args:
+            timeout: Longest wait in seconds (defaults to queue_timeout)
+        Raises:
+            OverloadedError: 429 if the queue is full, 503 if the wait ran out
+        """
+        deadline = time.monotonic() + (self.queue_timeout if timeout is None else timeout)
+        with self._cond:
+            if self.active < self.limit and not self.waiting:
+                self.active += 1
+                self.admitted += 1
+                return
+            if self.waiting >= self.queue_size:
+                self.shed[QUEUE_FULL] += 1
+                raise OverloadedError(self.name, 429, self.retry_after())
+            self.waiting += 1
+            self.queued += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed[QUEUE_TIMEOUT] += 1
+                        raise OverloadedError(self.name, 503, self.retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+
+    def release(self, elapsed: float):
+        """
+        Give a slot back
+        Args:
+            elapsed: Seconds the request held the slot
+        """
+        with self._cond:
+            self.active -= 1
+            self.service_time += 0.1 * (elapsed - self.service_time)
+            self._cond.notify()
+
+    def record_stale(self):
+        """Count a request answered from the cache instead of queuing"""
+        with self._cond:
+            self.served_stale += 1
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue should have drained (caller holds the lock)"""
+        drain = self.service_time * (self.waiting + 1) / self.limit
+        return min(max(int(math.ceil(drain)), 1), 60)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'queue_size': self.queue_size,
+                'queue_timeout': self.queue_timeout,
+                'active': self.active,
+                'waiting': self.waiting,
+                'max_waiting': self.max_waiting,
+                'admitted': self.admitted,
+                'queued': self.queued,
+                'served_stale': self.served_stale,
+                'shed': dict(self.shed),
+                'service_time_ms': round(self.service_time * 1000, 1)
+            }
+
+_gates: Dict[str, AdmissionGate] = {}
+_gates_lock = threading.Lock()
+
+def get_gate(platform_id: str, config: Optional[Dict] = None) -> AdmissionGate:
+    """
+    Get the admission gate of a platform
+    Args:
+        platform_id: Platform identifier
+        config: Platform configuration (see Config.PLATFORMS)
+    Returns:
+        Shared AdmissionGate instance
+    """
+    gate = _gates.get(platform_id)
+    if gate is None:
+        config = config or {}
+        with _gates_lock:
+            gate = _gates.get(platform_id)
+            if gate is None:
+                gate = _gates[platform_id] = AdmissionGate(
+                    platform_id,
+                    limit=config.get('admission_limit', 16),
+                    queue_size=config.get('admission_queue_size', 32),
+                    queue_timeout=config.get('admission_queue_timeout', 2.0)
+                )
+    return gate
+
+def admit(platform_id: str, config: Optional[Dict], key: Optional[str], call: Callable[[], Any]) -> Any:
+    """
+    Run a platform call under the platform's admission gate. When every slot
+    is busy, a cached result for `key` (fresh, stale or kept for errors) is
+    served instead of queuing.
+    Args:
+        platform_id: Platform identifier
+        config: Platform configuration (see Config.PLATFORMS)
+        key: Cache key of the call's result (see cache_key), or None
+        call: Performs the platform call
+    Returns:
+        The call's result, or the cached one
+    Raises:
+        OverloadedError: If the request was shed
+    """
+    if not Config.ADMISSION_ENABLED:
+        return call()
+    gate = get_gate(platform_id, config)
+    if not gate.try_acquire():
+        if key and Config.ENABLE_CACHE and Config.ADMISSION_SERVE_STALE:
+            value = get_cache().get_stale(key, 'stale_if_overload_hits')
+            if value is not None:
+                gate.record_stale()
+                return value
+        gate.acquire()
+    started = time.monotonic()
+    try:
+        return call()
+    finally:
+        gate.release(time.monotonic() - started)
+
+def admission_stats() -> Dict[str, Dict]:
+    """
+    Get queue depth and shed counters per platform
+    Returns:
+        Statistics keyed by platform id
+    """
+    return {platform_id: gate.stats() for platform_id, gate in list(_gates.items())}
@@ -0,0 +1,247 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+class Blob(NamedTuple):
+    """A cached file and the headers it was downloaded with"""
+    digest: str
+    size: int
+    path: str
+    relative_path: str  # under the blob directory, for X-Accel-Redirect
+    content_type: str
+    disposition: str
+
+class BlobWriter:
+    """
+    Receives a download chunk by chunk while it is proxied. The bytes go to a
+    temporary file and are hashed on the way; commit() files them under their
+    SHA-256, abort() throws them away. Memory use does not depend on the file size.
+    """
+
+    def __init__(self, cache: 'BlobCache', key: str, content_type: str, disposition: str, max_bytes: int):
+        self.cache = cache
+        self.key = key
+        self.content_type = content_type
+        self.disposition = disposition
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._file = tempfile.NamedTemporaryFile(dir=cache.tmp_dir, prefix='part-', delete=False)
+
+    @property
+    def active(self) -> bool:
+        return self._file is not None
+
+    def write(self, chunk: bytes):
+        if self._file is None:
+            return
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            # Too large to keep; the download itself carries on
+            self.abort()
+            return
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self) -> Optional[Blob]:
+        """
+        File the download in the cache
+        Returns:
+            The stored blob, or None if the writer was aborted or the store failed
+        """
+        if self._file is None:
+            return None
+        self._file.close()
+        temp_path, self._file = self._file.name, None
+        try:
+            return self.cache.store(self.key, temp_path, self._hash.hexdigest(), self.size,
+                                    self.content_type, self.disposition)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Cannot cache download {self.key}: {str(e)}")
+            return None
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def abort(self):
+        if self._file is None:
+            return
+        self._file.close()
+        try:
+            os.unlink(self._file.name)
+        except OSError:
+            pass
+        self._file = None
+
+class BlobCache:
+    """
+    Size-bounded, content-addressed file cache for proxied downloads, shared
+    by every worker on the host. Files live under blobs/<2 hex>/<sha256>, so
+    identical files downloaded under different keys are stored once; a SQLite
+    index maps each download key to its blob. The least recently used keys
+    are dropped when the total size goes over `max_bytes`.
+    """
+
+    def __init__(self, root: str, max_bytes: int, max_file_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.blob_dir = os.path.join(root, 'blobs')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evictions = 0
+        for directory in (self.blob_dir, self.tmp_dir):
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS downloads ('
+            'key TEXT PRIMARY KEY, digest TEXT NOT NULL, size INTEGER NOT NULL, '
+            'content_type TEXT NOT NULL, disposition TEXT NOT NULL, accessed REAL NOT NULL)'
+        )
+        self._connection().execute('CREATE INDEX IF NOT EXISTS downloads_digest ON downloads (digest)')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.root, 'index.sqlite3'), timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _relative_path(self, digest: str) -> str:
+        return f"{digest[:2]}/{digest}"
+
+    def _count(self, field: str, amount: int = 1):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+
+    def lookup(self, key: str) -> Optional[Blob]:
+        """
+        Find the cached file of a download
+        Args:
+            key: Download key (platform and book id)
+        Returns:
+            The blob, or None
+        """
+        conn = self._connection()
+        row = conn.execute(
+            'SELECT digest, size, content_type, disposition FROM downloads WHERE key = ?', (key,)
+        ).fetchone()
+        if row is not None:
+            relative_path = self._relative_path(row[0])
+            path = os.path.join(self.blob_dir, relative_path)
+            if os.path.exists(path):
+                conn.execute('UPDATE downloads SET accessed = ? WHERE key = ?', (time.time(), key))
+                self._count('hits')
+                return Blob(row[0], row[1], path, relative_path, row[2], row[3])
+            # Removed behind our back (another worker evicted it, or by hand)
+            conn.execute('DELETE FROM downloads WHERE key = ?', (key,))
+        self._count('misses')
+        return None
+
+    def writer(self, key: str, content_type: str, disposition: str, expected_size: int = None) -> Optional[BlobWriter]:
+        """
+        Start caching a download that is about to be streamed
+        Args:
+            key: Download key
+            content_type: Upstream Content-Type
+            disposition: Upstream Content-Disposition
+            expected_size: Upstream Content-Length, if known
+        Returns:
+            A writer, or None when the file would be too large to keep
+        """
+        if expected_size is not None and expected_size > self.max_file_bytes:
+            return None
+        try:
+            return BlobWriter(self, key, content_type, disposition, self.max_file_bytes)
+        except OSError as e:
+            logger.warning(f"Cannot cache download {key}: {str(e)}")
+            return None
+
+    def store(self, key: str, temp_path: str, digest: str, size: int,
+              content_type: str, disposition: str) -> Blob:
+        """Move a fully written temporary file into place and index it"""
+        relative_path = self._relative_path(digest)
+        path = os.path.join(self.blob_dir, relative_path)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Atomic on the same filesystem; concurrent writers of the same content are harmless
+            os.replace(temp_path, path)
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO downloads (key, digest, size, content_type, disposition, accessed) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (key, digest, size, content_type, disposition, time.time())
+        )
+        self._count('stored')
+        self._evict(conn)
+        return Blob(digest, size, path, relative_path, content_type, disposition)
+
+    def _total_bytes(self, conn: sqlite3.Connection) -> int:
+        return conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM downloads)'
+        ).fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection):
+        excess = self._total_bytes(conn) - self.max_bytes
+        if excess <= 0:
+            return
+        rows = conn.execute('SELECT key, digest, size FROM downloads ORDER BY accessed').fetchall()
+        for key, digest, size in rows:
+            if excess <= 0:
+                break
+            conn.execute('DELETE FROM downloads WHERE key = ?', (key,))
+            self._count('evictions')
+            if conn.execute('SELECT 1 FROM downloads WHERE digest = ? LIMIT 1', (digest,)).fetchone() is None:
+                # A reader with the file open keeps its copy until it is closed
+                try:
+                    os.unlink(os.path.join(self.blob_dir, self._relative_path(digest)))
+                except OSError:
+                    pass
+                excess -= size
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get counters and sizes for monitoring
+        Returns:
+            Hits, misses, stored files, evictions, indexed keys and total bytes
+        """
+        conn = self._connection()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stored': self.stored,
+            'evictions': self.evictions,
+            'keys': conn.execute('SELECT COUNT(*) FROM downloads').fetchone()[0],
+            'bytes': self._total_bytes(conn),
+            'max_bytes': self.max_bytes
+        }
+
+_blob_cache: Optional[BlobCache] = None
+_blob_cache_lock = threading.Lock()
+
+def get_blob_cache() -> Optional[BlobCache]:
+    """
+    Get the process-wide download cache
+    Returns:
+        Shared BlobCache instance, or None when Config.DOWNLOAD_CACHE_DIR is empty
+    """
+    global _blob_cache
+    if _blob_cache is None and Config.DOWNLOAD_CACHE_DIR:
+        with _blob_cache_lock:
+            if _blob_cache is None:
+                _blob_cache = BlobCache(Config.DOWNLOAD_CACHE_DIR, Config.DOWNLOAD_CACHE_MAX_BYTES,
+                                        Config.DOWNLOAD_CACHE_MAX_FILE_BYTES)
+    return _blob_cache
@@ -0,0 +1,307 @@
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+from config import Config
+from utils.query import parse_isbn
+from utils.records import Book
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+_ISBN_SEPARATORS = re.compile(r'[\s,;]+')
+
+class BookIndex:
+    """
+    Persistent full-text index (SQLite FTS5) of every book record seen in
+    search results, shared by the worker processes on the host.
+
+    Records are ingested off the request path by a background thread. ISBNs
+    go to a separate exact-match table. When the index outgrows `max_books`
+    the least recently seen records are evicted and the FTS index compacted.
+    """
+
+    # Check the size limit every N ingested batches rather than on each one
+    EVICTION_INTERVAL = 32
+
+    def __init__(self, path: str, max_books: int = 200000, queue_size: int = 1000):
+        self.path = path
+        self.max_books = max_books
+        self.ingested = 0
+        self.dropped = 0
+        self.evicted = 0
+        self._queue: 'queue.Queue[List[Dict[str, Any]]]' = queue.Queue(maxsize=queue_size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._batches = 0
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.executescript('''
+            CREATE TABLE IF NOT EXISTS books (
+                key TEXT PRIMARY KEY, platform_id TEXT NOT NULL,
+                title TEXT, author TEXT, publisher TEXT, isbn TEXT,
+                year TEXT, extension TEXT, language TEXT,
+                record TEXT NOT NULL, last_seen REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS books_last_seen ON books (last_seen);
+            CREATE TABLE IF NOT EXISTS isbns (
+                isbn TEXT NOT NULL, book_id INTEGER NOT NULL, PRIMARY KEY (isbn, book_id));
+            CREATE INDEX IF NOT EXISTS isbns_book_id ON isbns (book_id);
+            CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+                title, author, publisher, isbn,
+                content='books', content_rowid='rowid',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3');
+            CREATE TRIGGER IF NOT EXISTS books_ai AFTER INSERT ON books BEGIN
+                INSERT INTO books_fts (rowid, title, author, publisher, isbn)
+                VALUES (new.rowid, new.title, new.author, new.publisher, new.isbn);
+            END;
+            CREATE TRIGGER IF NOT EXISTS books_ad AFTER DELETE ON books BEGIN
+                INSERT INTO books_fts (books_fts, rowid, title, author, publisher, isbn)
+                VALUES ('delete', old.rowid, old.title, old.author, old.publisher, old.isbn);
+                DELETE FROM isbns WHERE book_id = old.rowid;
+            END;
+            CREATE TRIGGER IF NOT EXISTS books_au AFTER UPDATE OF title, author, publisher, isbn ON books BEGIN
+                INSERT INTO books_fts (books_fts, rowid, title, author, publisher, isbn)
+                VALUES ('delete', old.rowid, old.title, old.author, old.publisher, old.isbn);
+                INSERT INTO books_fts (rowid, title, author, publisher, isbn)
+                VALUES (new.rowid, new.title, new.author, new.publisher, new.isbn);
+            END;
+        ''')
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections must not cross a fork, so they are kept per process and thread
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def ingest(self, books: Iterable[Dict[str, Any]]):
+        """
+        Queue book records for indexing; never blocks the caller
+        Args:
+            books: Parsed book records (see ZLibraryParser._iter_books)
+        """
+        batch = [book for book in books if book.get('title') and book.get('book_url')]
+        if not batch:
+            return
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(batch)
+        except queue.Full:
+            self.dropped += len(batch)
+
+    def _ensure_worker(self):
+        worker = self._worker
+        if worker is not None and worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._ingest_forever, name='book-index', daemon=True)
+                self._worker.start()
+
+    def _ingest_forever(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                self._write(batch)
+            except sqlite3.Error as e:
+                logger.warning(f"Book index write failed: {str(e)}")
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for book in batch:
+                platform_id = book.get('platform_id') or ''
+                key = f"{platform_id}:{urlsplit(book['book_url']).path}"
+                fields = (book.get('title'), book.get('author'), book.get('publisher'), book.get('isbn'))
+                if not isinstance(book, Book):
+                    book = Book.from_dict(book)
+                record = book.to_json()
+                inserted = conn.execute(
+                    'INSERT OR IGNORE INTO books (key, platform_id, title, author, publisher, isbn, '
+                    'year, extension, language, record, last_seen) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, platform_id) + fields +
+                    (book.get('year'), book.get('extension'), book.get('language'), record, now)
+                ).rowcount
+                if not inserted:
+                    conn.execute('UPDATE books SET record = ?, last_seen = ?, year = ?, extension = ?, language = ? '
+                                 'WHERE key = ?',
+                                 (record, now, book.get('year'), book.get('extension'), book.get('language'), key))
+                    # Only touch the FTS columns when they changed, so re-seen books cost no FTS churn
+                    conn.execute('UPDATE books SET title = ?, author = ?, publisher = ?, isbn = ? '
+                                 'WHERE key = ? AND (title IS NOT ? OR author IS NOT ? OR publisher IS NOT ? '
+                                 'OR isbn IS NOT ?)', fields + (key,) + fields)
+                rowid = conn.execute('SELECT rowid FROM books WHERE key = ?', (key,)).fetchone()[0]
+                for isbn in set(filter(None, (parse_isbn(part) for part in _ISBN_SEPARATORS.split(book.get('isbn') or '')))):
+                    conn.execute('INSERT OR IGNORE INTO isbns (isbn, book_id) VALUES (?, ?)', (isbn, rowid))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self.ingested += len(batch)
+        self._batches += 1
+        if self._batches % self.EVICTION_INTERVAL == 0:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Drop the least recently seen records beyond max_books, then compact
+        Returns:
+            Number of evicted records
+        """
+        conn = self._connection()
+        excess = conn.execute('SELECT COUNT(*) FROM books').fetchone()[0] - self.max_books
+        if excess <= 0:
+            return 0
+        # Evict a little extra so we do not come back on the next check
+        excess += self.max_books // 20
+        deleted = conn.execute(
+            'DELETE FROM books WHERE rowid IN (SELECT rowid FROM books ORDER BY last_seen LIMIT ?)', (excess,)
+        ).rowcount
+        self.evicted += deleted
+        logger.info(f"Evicted {deleted} books from the local index")
+        self.compact()
+        return deleted
+
+    def compact(self):
+        """Merge FTS segments and return freed pages to the filesystem"""
+        conn = self._connection()
+        conn.execute("INSERT INTO books_fts (books_fts) VALUES ('optimize')")
+        conn.execute('PRAGMA incremental_vacuum')
+
+    def _match(self, query: str, prefix: bool = False) -> Optional[str]:
+        """FTS5 expression requiring every word; the last one as a prefix if asked"""
+        words = _WORD.findall(query or '')
+        if not words:
+            return None
+        terms = ['"' + word + '"' for word in words]
+        if prefix:
+            terms[-1] += '*'
+        return ' '.join(terms)
+
+    def _filter(self, platform_ids: Optional[List[str]]) -> tuple:
+        if not platform_ids:
+            return '', ()
+        return f" AND b.platform_id IN ({','.join('?' * len(platform_ids))})", tuple(platform_ids)
+
+    def search(self, query: str, platform_ids: List[str] = None, limit: int = 50) -> List[Book]:
+        """
+        Search indexed books; ISBN queries use the exact-match table
+        Args:
+            query: Keywords or an ISBN-10/13
+            platform_ids: Restrict to these platforms
+            limit: Maximum number of books
+        Returns:
+            Book records, best match first
+        """
+        isbn = parse_isbn(query)
+        if isbn is not None:
+            books = self.isbn_lookup(isbn, platform_ids, limit)
+            if books:
+                return books
+        where, params = self._filter(platform_ids)
+        expression = self._match(query)
+        if expression is None:
+            return []
+        rows = self._connection().execute(
+            'SELECT b.record FROM books_fts f JOIN books b ON b.rowid = f.rowid '
+            f'WHERE books_fts MATCH ?{where} ORDER BY f.rank LIMIT ?',
+            (expression,) + params + (limit,)
+        ).fetchall()
+        return [Book.from_dict(json.loads(row[0])) for row in rows]
+
+    def isbn_lookup(self, isbn: str, platform_ids: List[str] = None, limit: int = 50) -> List[Book]:
+        """
+        Exact ISBN match, without touching the full-text index
+        Args:
+            isbn: ISBN-13 digits (see utils.query.parse_isbn)
+            platform_ids: Restrict to these platforms
+            limit: Maximum number of books
+        Returns:
+            Book records, most recently seen first
+        """
+        where, params = self._filter(platform_ids)
+        rows = self._connection().execute(
+            'SELECT b.record FROM isbns i JOIN books b ON b.rowid = i.book_id '
+            f'WHERE i.isbn = ?{where} ORDER BY b.last_seen DESC LIMIT ?',
+            (isbn,) + params + (limit,)
+        ).fetchall()
+        return [Book.from_dict(json.loads(row[0])) for row in rows]
+
+    def suggest(self, prefix: str, platform_ids: List[str] = None, limit: int = 10) -> List[str]:
+        """
+        Autocomplete titles for a partially typed query
+        Args:
+            prefix: Query typed so far; its last word is matched as a prefix
+            platform_ids: Restrict to these platforms
+            limit: Maximum number of titles
+        Returns:
+            Distinct titles, best match first
+        """
+        expression = self._match(prefix, prefix=True)
+        if expression is None:
+            return []
+        where, params = self._filter(platform_ids)
+        rows = self._connection().execute(
+            'SELECT b.title, MIN(f.rank) AS best FROM books_fts f JOIN books b ON b.rowid = f.rowid '
+            f'WHERE books_fts MATCH ?{where} GROUP BY b.title ORDER BY best LIMIT ?',
+            (expression,) + params + (limit,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get index size and ingestion counters
+        Returns:
+            Index statistics
+        """
+        conn = self._connection()
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        return {
+            'books': conn.execute('SELECT COUNT(*) FROM books').fetchone()[0],
+            'isbns': conn.execute('SELECT COUNT(*) FROM isbns').fetchone()[0],
+            'bytes': page_count * page_size,
+            'max_books': self.max_books,
+            'queued_batches': self._queue.qsize(),
+            'ingested': self.ingested,
+            'dropped': self.dropped,
+            'evicted': self.evicted
+        }
+
+_index: Optional[BookIndex] = None
+_index_lock = threading.Lock()
+_index_failed = False
+
+def get_book_index() -> Optional[BookIndex]:
+    """
+    Get the process-wide book index, creating it from Config on first use
+    Returns:
+        Shared BookIndex instance, or None when disabled or SQLite lacks FTS5
+    """
+    global _index, _index_failed
+    if _index is None and not _index_failed and Config.LOCAL_INDEX_PATH:
+        with _index_lock:
+            if _index is None and not _index_failed:
+                try:
+                    _index = BookIndex(Config.LOCAL_INDEX_PATH, Config.LOCAL_INDEX_MAX_BOOKS,
+                                       Config.LOCAL_INDEX_QUEUE_SIZE)
+                except sqlite3.Error as e:
+                    logger.warning(f"Local book index unavailable: {str(e)}")
+                    _index_failed = True
+    return _index
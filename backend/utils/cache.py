@@ -0,0 +1,424 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Entry states returned by cache lookups
+FRESH = 'fresh'
+STALE = 'stale'
+
+class CacheStats:
+    """Thread-safe hit/miss/eviction counters"""
+
+    FIELDS = ('hits', 'stale_hits', 'negative_hits', 'misses', 'stale_if_error_hits',
+              'stale_if_overload_hits', 'sets', 'evictions', 'expirations')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, field: str, amount: int = 1):
+        with self._lock:
+            self._counts[field] += amount
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+def payload_etag(payload: bytes) -> str:
+    """Version tag of a pickled value; identical on every worker that caches the same result"""
+    return hashlib.blake2b(payload, digest_size=12).hexdigest()
+
+class CacheEntry:
+    """
+    Cached value with its expiry deadlines: fresh until expires_at, served
+    stale (and refreshed) until stale_until, and kept as a last resort for
+    upstream failures until error_until.
+    In memory, an entry also keeps the encoded HTTP representations of its
+    value (see utils.http_cache), so each one is built once per entry.
+    """
+
+    __slots__ = ('value', 'size', 'expires_at', 'stale_until', 'error_until', 'negative',
+                 'etag', 'representations')
+
+    def __init__(self, value: Any, size: int, expires_at: float, stale_until: float,
+                 error_until: float, negative: bool = False, etag: str = None):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+        self.stale_until = stale_until
+        self.error_until = error_until
+        self.negative = negative
+        self.etag = etag
+        self.representations: Dict[Any, Any] = {}
+
+    def state(self, now: float) -> Optional[str]:
+        if now < self.expires_at:
+            return FRESH
+        if now < self.stale_until:
+            return STALE
+        return None
+
+class MemoryCache:
+    """In-process LRU bounded by entry count and total byte size"""
+
+    def __init__(self, max_entries: int, max_bytes: int, stats: CacheStats):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = stats
+        self.total_bytes = 0
+        self._entries: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, now: float) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if now >= entry.error_until:
+                self._remove(key)
+                self.stats.incr('expirations')
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CacheEntry):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self.total_bytes += entry.size
+            while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats.incr('evictions')
+
+    def attach(self, key: str, entry: CacheEntry, name: Any, representation: Any, size: int):
+        """Keep an encoded representation with an entry, counted against the byte budget"""
+        with self._lock:
+            if self._entries.get(key) is not entry or name in entry.representations:
+                return
+            entry.representations[name] = representation
+            entry.size += size
+            self.total_bytes += size
+            while len(self._entries) > 1 and self.total_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats.incr('evictions')
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.total_bytes -= entry.size
+
+class DiskCache:
+    """SQLite-backed cache tier shared by every worker process on the host"""
+
+    # Check the on-disk size limit every N writes rather than on each one
+    EVICTION_INTERVAL = 64
+
+    def __init__(self, path: str, max_bytes: int, stats: CacheStats):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = stats
+        self._local = threading.local()
+        self._writes = 0
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, '
+                'expires_at REAL NOT NULL, stale_until REAL NOT NULL, error_until REAL NOT NULL, '
+                'negative INTEGER NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS cache_error_until ON cache (error_until)')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, now: float) -> Optional[CacheEntry]:
+        row = self._connection().execute(
+            'SELECT value, size, expires_at, stale_until, error_until, negative FROM cache '
+            'WHERE key = ? AND error_until > ?',
+            (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        return CacheEntry(pickle.loads(row[0]), row[1], row[2], row[3], row[4], bool(row[5]),
+                          payload_etag(row[0]))
+
+    def set(self, key: str, entry: CacheEntry, payload: bytes):
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache (key, value, size, expires_at, stale_until, error_until, negative) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (key, payload, entry.size, entry.expires_at, entry.stale_until, entry.error_until, int(entry.negative))
+        )
+        self._writes += 1
+        if self._writes % self.EVICTION_INTERVAL == 0:
+            self._evict(conn)
+
+    def expires_at(self, key: str) -> Optional[float]:
+        row = self._connection().execute('SELECT expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+        return row[0] if row is not None else None
+
+    def delete(self, key: str):
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _evict(self, conn: sqlite3.Connection):
+        expired = conn.execute('DELETE FROM cache WHERE error_until <= ?', (time.time(),)).rowcount
+        if expired > 0:
+            self.stats.incr('expirations', expired)
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop the entries closest to expiry until we are back under budget
+        excess = total - self.max_bytes
+        rows = conn.execute('SELECT key, size FROM cache ORDER BY error_until').fetchall()
+        victims = []
+        for key, size in rows:
+            if excess <= 0:
+                break
+            victims.append((key,))
+            excess -= size
+        conn.executemany('DELETE FROM cache WHERE key = ?', victims)
+        self.stats.incr('evictions', len(victims))
+
+class ResponseCache:
+    """Two-tier (memory + optional disk) TTL cache with stale-while-revalidate"""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024,
+                 max_entry_bytes: int = 4 * 1024 * 1024, disk_path: str = '',
+                 disk_max_bytes: int = 256 * 1024 * 1024):
+        self.stats = CacheStats()
+        self.max_entry_bytes = max_entry_bytes
+        self.memory = MemoryCache(max_entries, max_bytes, self.stats)
+        self.disk = DiskCache(disk_path, disk_max_bytes, self.stats) if disk_path else None
+
+    @property
+    def blocking(self) -> bool:
+        """Whether lookups and stores may wait on SQLite (the disk tier)"""
+        return self.disk is not None
+
+    def get(self, key: str) -> Tuple[Any, Optional[str]]:
+        """
+        Look up a key in memory, then on disk
+        Args:
+            key: Cache key
+        Returns:
+            (value, state) where state is FRESH, STALE or None on a miss
+        """
+        now = time.time()
+        entry = self._lookup(key, now)
+        state = entry.state(now) if entry is not None else None
+        if state is None:
+            self.stats.incr('misses')
+            return None, None
+        if state == STALE:
+            self.stats.incr('stale_hits')
+        elif entry.negative:
+            self.stats.incr('negative_hits')
+        else:
+            self.stats.incr('hits')
+        return entry.value, state
+
+    def get_fresh(self, key: str) -> Any:
+        """
+        Look up a key for a fresh value only. Hits are counted; stale entries
+        and misses are not, as the caller goes on to the platform call, whose
+        pipeline looks the key up again and counts it then
+        Args:
+            key: Cache key
+        Returns:
+            The fresh value, or None
+        """
+        now = time.time()
+        entry = self._lookup(key, now)
+        if entry is None or entry.state(now) != FRESH:
+            return None
+        self.stats.incr('negative_hits' if entry.negative else 'hits')
+        return entry.value
+
+    def _lookup(self, key: str, now: float) -> Optional[CacheEntry]:
+        """Find a key in memory, then on disk, promoting disk hits to memory"""
+        entry = self.memory.get(key, now)
+        if entry is None and self.disk is not None:
+            try:
+                entry = self.disk.get(key, now)
+            except sqlite3.Error as e:
+                logger.warning(f"Disk cache read failed: {str(e)}")
+                entry = None
+            if entry is not None:
+                self.memory.set(key, entry)
+        return entry
+
+    def get_stale(self, key: str, counter: str = 'stale_if_error_hits') -> Any:
+        """
+        Look up an entry past its stale window, as a fallback when upstream
+        fails or is too busy
+        Args:
+            key: Cache key
+            counter: Stats field counting the fallback
+        Returns:
+            The retained value, or None
+        """
+        now = time.time()
+        entry = self.memory.get(key, now)
+        if entry is None and self.disk is not None:
+            try:
+                entry = self.disk.get(key, now)
+            except sqlite3.Error as e:
+                logger.warning(f"Disk cache read failed: {str(e)}")
+        if entry is None:
+            return None
+        self.stats.incr(counter)
+        return entry.value
+
+    def set(self, key: str, value: Any, ttl: float, stale_ttl: float = 0,
+            stale_if_error: float = 0, negative: bool = False):
+        """
+        Store a value in every tier
+        Args:
+            key: Cache key
+            value: Picklable value
+            ttl: Seconds the entry is fresh
+            stale_ttl: Extra seconds the entry may be served stale while refreshing
+            stale_if_error: Extra seconds after that the entry is kept for upstream failures
+            negative: Whether the value is a cached empty result
+        """
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_entry_bytes:
+            return
+        now = time.time()
+        stale_until = now + ttl + stale_ttl
+        entry = CacheEntry(value, len(payload), now + ttl, stale_until, stale_until + stale_if_error, negative,
+                           payload_etag(payload))
+        self.memory.set(key, entry)
+        self.stats.incr('sets')
+        if self.disk is not None:
+            try:
+                self.disk.set(key, entry, payload)
+            except sqlite3.Error as e:
+                logger.warning(f"Disk cache write failed: {str(e)}")
+
+    def peek(self, key: str) -> Optional[CacheEntry]:
+        """
+        Get the in-memory entry of a key without counting a lookup; used for
+        HTTP metadata of a value that was just served from the cache
+        Args:
+            key: Cache key
+        Returns:
+            The entry, or None
+        """
+        return self.memory.get(key, time.time())
+
+    def expires_at(self, key: str) -> Optional[float]:
+        """
+        Get when a key stops being fresh, in any tier, without counting a lookup
+        Args:
+            key: Cache key
+        Returns:
+            The latest freshness deadline (epoch seconds), or None if the key is not cached
+        """
+        now = time.time()
+        entry = self.memory.get(key, now)
+        deadline = entry.expires_at if entry is not None else None
+        if self.disk is not None:
+            # Another worker may have refreshed the shared tier already
+            try:
+                disk_deadline = self.disk.expires_at(key)
+            except sqlite3.Error as e:
+                logger.warning(f"Disk cache read failed: {str(e)}")
+                disk_deadline = None
+            if disk_deadline is not None and (deadline is None or disk_deadline > deadline):
+                deadline = disk_deadline
+        return deadline
+
+    def attach(self, key: str, entry: CacheEntry, name: Any, representation: Any, size: int):
+        """
+        Keep an encoded representation of an entry's value in memory
+        Args:
+            key: Cache key
+            entry: Entry returned by peek
+            name: Representation name (e.g. shape and content encoding)
+            representation: Encoded data
+            size: Bytes to count against the memory budget
+        """
+        self.memory.attach(key, entry, name, representation, size)
+
+    def delete(self, key: str):
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def info(self) -> Dict[str, Any]:
+        """
+        Get counters and sizes for monitoring
+        Returns:
+            Cache statistics
+        """
+        stats = self.stats.snapshot()
+        lookups = stats['hits'] + stats['stale_hits'] + stats['negative_hits'] + stats['misses']
+        stats['hit_ratio'] = round((lookups - stats['misses']) / lookups, 4) if lookups else 0.0
+        stats['memory_entries'] = len(self.memory)
+        stats['memory_bytes'] = self.memory.total_bytes
+        stats['disk_enabled'] = self.disk is not None
+        return stats
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> ResponseCache:
+    """
+    Get the process-wide response cache, creating it from Config on first use
+    Returns:
+        Shared ResponseCache instance
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    max_entries=Config.CACHE_MAX_ENTRIES,
+                    max_bytes=Config.CACHE_MAX_BYTES,
+                    max_entry_bytes=Config.CACHE_MAX_ENTRY_BYTES,
+                    disk_path=Config.CACHE_DISK_PATH,
+                    disk_max_bytes=Config.CACHE_DISK_MAX_BYTES
+                )
+    return _cache
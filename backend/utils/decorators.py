@@ -1,49 +1,419 @@
+import asyncio
+import contextlib
+import contextvars
 import functools
+import logging
+import threading
 import time
-from typing import Any, Callable
-from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Tuple
 from config import Config
+from utils.cache import get_cache, FRESH, STALE
+from utils.event_loop import run_sync
+from utils.singleflight import SingleFlight, AsyncSingleFlight
+from utils.errors import CircuitOpenError, RateLimitedError
+from utils.metrics import UPSTREAM_ERRORS, UPSTREAM_RETRIES
+from utils.popularity import get_popularity
+from utils.query import Query, canonical_query
+from utils.resilience import is_retryable, backoff_delay, get_breaker, get_retry_budget
 
-def retry_on_failure(max_retries: int = 3, delay: float = 1.0) -> Callable:
+logger = logging.getLogger(__name__)
+
+def _record_error(platform, breaker, error: Exception) -> bool:
+    """
+    Count a failed upstream attempt against the platform's breaker
+    Returns:
+        Whether the error is transient, i.e. worth retrying
     """
-    Retry decorator for failed requests
+    UPSTREAM_ERRORS.inc(platform.platform_id, type(error).__name__)
+    if isinstance(error, RateLimitedError):
+        # Never sent, so it says nothing about upstream health; retrying would spend more budget
+        return False
+    if not is_retryable(error):
+        # The upstream answered (e.g. a 404), so it is healthy
+        breaker.record_success()
+        return False
+    breaker.record_failure()
+    return True
+
+def guarded_call(platform, func: Callable, *args) -> Any:
+    """
+    Make a single upstream attempt behind the platform's circuit breaker,
+    recording its outcome like one attempt of retry_on_failure. For calls
+    that cannot go through the pipeline, such as a fetch whose body is
+    parsed while it streams; retries are left to the caller.
+    Args:
+        platform: Platform instance making the call
+        func: Performs the upstream request
+        args: Arguments for func
+    Returns:
+        The call's result
+    Raises:
+        CircuitOpenError: If the breaker rejects the call
+    """
+    breaker = get_breaker(platform.platform_id, platform.config)
+    get_retry_budget(platform.platform_id, platform.config).record_request()
+    breaker.before_call()
+    try:
+        result = func(*args)
+    except Exception as e:
+        _record_error(platform, breaker, e)
+        raise
+    breaker.record_success()
+    return result
+
+def retry_on_failure(max_retries: int = None, base_delay: float = None, max_delay: float = None) -> Callable:
+    """
+    Retry decorator for platform methods, guarded by a circuit breaker and a retry budget.
+
+    Only transient errors are retried, with jittered exponential backoff
+    (asyncio.sleep for coroutine methods, so the event loop never blocks).
+    Each attempt goes through the platform's circuit breaker first; for
+    coroutine methods, breaker calls on shared (SQLite) state run on the
+    loop's executor.
     Args:
-        max_retries: Maximum number of retry attempts
-        delay: Delay between retries in seconds
+        max_retries: Maximum number of attempts (defaults to the platform's max_retries)
+        base_delay: Backoff before the first retry in seconds
+        max_delay: Upper bound for any backoff in seconds
     """
     def decorator(func: Callable) -> Callable:
+        def settings(platform) -> tuple:
+            config = platform.config
+            attempts = max(platform.max_retries if max_retries is None else max_retries, 1)
+            base = config.get('retry_base_delay', 0.2) if base_delay is None else base_delay
+            cap = config.get('retry_max_delay', 2.0) if max_delay is None else max_delay
+            return attempts, base, cap
+
+        def should_retry(platform, breaker, error: Exception, attempt: int, attempts: int) -> bool:
+            if not _record_error(platform, breaker, error):
+                return False
+            if attempt + 1 >= attempts:
+                return False
+            if not get_retry_budget(platform.platform_id, platform.config).try_acquire():
+                return False
+            UPSTREAM_RETRIES.inc(platform.platform_id)
+            return True
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args) -> Any:
+                attempts, base, cap = settings(self)
+                breaker = get_breaker(self.platform_id, self.config)
+                get_retry_budget(self.platform_id, self.config).record_request()
+                for attempt in range(attempts):
+                    await run_sync(breaker.before_call, blocking=breaker.blocking)
+                    try:
+                        result = await func(self, *args)
+                    except Exception as e:
+                        if not await run_sync(should_retry, self, breaker, e, attempt, attempts,
+                                              blocking=breaker.blocking):
+                            raise
+                        delay = backoff_delay(attempt, base, cap)
+                        logger.warning(f"Retrying {func.__name__} on {self.platform_id} in {delay:.2f}s: {str(e)}")
+                        await asyncio.sleep(delay)
+                        continue
+                    await run_sync(breaker.record_success, blocking=breaker.blocking)
+                    return result
+            return async_wrapper
+
         @functools.wraps(func)
-        def wrapper(*args, **kwargs) -> Any:
-            last_error = None
-            for attempt in range(max_retries):
+        def wrapper(self, *args) -> Any:
+            attempts, base, cap = settings(self)
+            breaker = get_breaker(self.platform_id, self.config)
+            get_retry_budget(self.platform_id, self.config).record_request()
+            for attempt in range(attempts):
+                breaker.before_call()
                 try:
-                    return func(*args, **kwargs)
+                    result = func(self, *args)
                 except Exception as e:
-                    last_error = e
-                    if attempt < max_retries - 1:
-                        time.sleep(delay)
-            raise last_error
+                    if not should_retry(self, breaker, e, attempt, attempts):
+                        raise
+                    delay = backoff_delay(attempt, base, cap)
+                    logger.warning(f"Retrying {func.__name__} on {self.platform_id} in {delay:.2f}s: {str(e)}")
+                    # Sync platforms run on request or executor threads, never on the loop
+                    time.sleep(delay)
+                    continue
+                breaker.record_success()
+                return result
         return wrapper
     return decorator
 
-def cache_response(timeout: int = Config.CACHE_TIMEOUT) -> Callable:
+def _is_empty_result(result: Any) -> bool:
+    """Check whether a platform response carries no books"""
+    content = result.get('content') if isinstance(result, dict) else None
+    return isinstance(content, dict) and content.get('total', None) == 0
+
+def cache_key(platform_id: str, method: str, *args) -> str:
     """
-    Cache decorator for responses
+    Build the cache key for a platform method call
     Args:
-        timeout: Cache timeout in seconds
+        platform_id: Platform identifier (not the instance, so keys survive restarts)
+        method: Method name
+        args: Positional call arguments; a Query contributes its canonical form
+    """
+    return ':'.join([platform_id, method] + [arg.canonical if isinstance(arg, Query) else str(arg) for arg in args])
+
+_refresh_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='cache-refresh')
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+def _claim_refresh(key: str) -> bool:
+    """Mark a key as being refreshed; False if a refresh is already running"""
+    with _refreshing_lock:
+        if key in _refreshing:
+            return False
+        _refreshing.add(key)
+        return True
+
+def _release_refresh(key: str):
+    with _refreshing_lock:
+        _refreshing.discard(key)
+
+def _refresh_in_background(key: str, load: Callable[[], Any], store: Callable[[Any], None]):
+    """Revalidate a stale entry once, off the request thread"""
+    if not _claim_refresh(key):
+        return
+
+    def refresh():
+        try:
+            store(load())
+        except Exception as e:
+            logger.warning(f"Background refresh of {key} failed: {str(e)}")
+        finally:
+            _release_refresh(key)
+
+    _refresh_executor.submit(refresh)
+
+def _refresh_in_task(key: str, load: Callable[[], Awaitable], store: Callable[[Any], None]):
+    """Revalidate a stale entry once, as a task on the running event loop"""
+    if not _claim_refresh(key):
+        return
+
+    async def refresh():
+        try:
+            result = await load()
+            await run_sync(store, result, blocking=get_cache().blocking)
+        except Exception as e:
+            logger.warning(f"Background refresh of {key} failed: {str(e)}")
+        finally:
+            _release_refresh(key)
+
+    asyncio.ensure_future(refresh())
+
+# Set while the cache warmer refreshes entries: cache reads are skipped (the
+# result is still stored) and the queries do not count as user traffic
+_revalidating = contextvars.ContextVar('revalidating', default=False)
+
+@contextlib.contextmanager
+def revalidating():
+    """Run platform calls that bypass fresh cache entries and refresh them"""
+    revalidate_token = _revalidating.set(True)
+    canonical_token = _canonicalizing.set(True)
+    try:
+        yield
+    finally:
+        _canonicalizing.reset(canonical_token)
+        _revalidating.reset(revalidate_token)
+
+def _stale_or_raise(key: str, error: Exception) -> Any:
+    """Serve a retained entry when upstream is down, the breaker is open or the rate limit is reached"""
+    if isinstance(error, (CircuitOpenError, RateLimitedError)) or is_retryable(error):
+        value = get_cache().get_stale(key)
+        if value is not None:
+            logger.warning(f"Serving stale {key} after upstream failure: {str(error)}")
+            return value
+    raise error
+
+def cache_result(key: str, result: Any, timeout: int = None, stale_timeout: int = None,
+                 negative_timeout: int = None, is_empty: Callable[[Any], bool] = _is_empty_result):
+    """
+    Store a platform result with the freshness rules of cache_response
+    Args:
+        key: Cache key (see cache_key)
+        result: Platform response
+        timeout: Seconds a result stays fresh (defaults to Config.CACHE_TIMEOUT)
+        stale_timeout: Seconds a result may be served stale while it is refreshed
+        negative_timeout: Freshness of empty results
+        is_empty: Predicate selecting results that get the negative timeout
+    """
+    negative = is_empty(result)
+    if negative:
+        ttl = Config.CACHE_NEGATIVE_TIMEOUT if negative_timeout is None else negative_timeout
+    else:
+        ttl = Config.CACHE_TIMEOUT if timeout is None else timeout
+    stale = Config.CACHE_STALE_TIMEOUT if stale_timeout is None else stale_timeout
+    get_cache().set(key, result, ttl, stale, Config.CACHE_STALE_IF_ERROR, negative)
+
+def cache_response(timeout: int = None, stale_timeout: int = None, negative_timeout: int = None,
+                   is_empty: Callable[[Any], bool] = _is_empty_result) -> Callable:
+    """
+    Cache decorator for platform methods, keyed on platform id and arguments.
+    Works on plain and coroutine methods.
+    Args:
+        timeout: Seconds a result stays fresh (defaults to Config.CACHE_TIMEOUT)
+        stale_timeout: Seconds a result may be served stale while it is refreshed
+        negative_timeout: Freshness of empty results
+        is_empty: Predicate selecting results that get the negative timeout
+    """
+    def decorator(func: Callable) -> Callable:
+        def store(key: str, result: Any):
+            cache_result(key, result, timeout, stale_timeout, negative_timeout, is_empty)
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args) -> Any:
+                if not Config.ENABLE_CACHE:
+                    return await func(self, *args)
+
+                key = cache_key(self.platform_id, func.__name__, *args)
+                # The disk tier is SQLite: its lookups and stores run on the loop's executor
+                blocking = get_cache().blocking
+                if _revalidating.get():
+                    value, state = None, None
+                else:
+                    value, state = await run_sync(get_cache().get, key, blocking=blocking)
+                if state == FRESH:
+                    return value
+                if state == STALE:
+                    _refresh_in_task(key, lambda: func(self, *args), functools.partial(store, key))
+                    return value
+
+                try:
+                    result = await func(self, *args)
+                except Exception as e:
+                    return await run_sync(_stale_or_raise, key, e, blocking=blocking)
+                await run_sync(store, key, result, blocking=blocking)
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args) -> Any:
+            if not Config.ENABLE_CACHE:
+                return func(self, *args)
+
+            key = cache_key(self.platform_id, func.__name__, *args)
+            value, state = get_cache().get(key) if not _revalidating.get() else (None, None)
+            if state == FRESH:
+                return value
+            if state == STALE:
+                _refresh_in_background(key, lambda: func(self, *args), functools.partial(store, key))
+                return value
+
+            try:
+                result = func(self, *args)
+            except Exception as e:
+                return _stale_or_raise(key, e)
+            store(key, result)
+            return result
+
+        return wrapper
+    return decorator
+
+_single_flight = None
+_async_single_flight = None
+_single_flight_lock = threading.Lock()
+
+def get_single_flight() -> SingleFlight:
+    """
+    Get the process-wide request coalescer, creating it from Config on first use
+    Returns:
+        Shared SingleFlight instance
+    """
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight(Config.COALESCE_LOCK_DIR)
+    return _single_flight
+
+def get_async_single_flight() -> AsyncSingleFlight:
+    """
+    Get the request coalescer used by coroutine platform methods
+    Returns:
+        Shared AsyncSingleFlight instance
+    """
+    global _async_single_flight
+    if _async_single_flight is None:
+        with _single_flight_lock:
+            if _async_single_flight is None:
+                _async_single_flight = AsyncSingleFlight()
+    return _async_single_flight
+
+def coalesce_requests() -> Callable:
+    """
+    Coalesce concurrent identical platform calls into one upstream fetch.
+    Works on plain and coroutine methods.
     """
     def decorator(func: Callable) -> Callable:
-        # Only enable cache if configured
-        if not Config.ENABLE_CACHE:
-            return func
-            
-        @lru_cache(maxsize=128)
-        def cached_func(*args, **kwargs) -> Any:
-            return func(*args, **kwargs)
-            
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args) -> Any:
+                if not Config.ENABLE_COALESCING:
+                    return await func(self, *args)
+                key = cache_key(self.platform_id, func.__name__, *args)
+                return await get_async_single_flight().do(key, lambda: func(self, *args))
+            return async_wrapper
+
         @functools.wraps(func)
-        def wrapper(*args, **kwargs) -> Any:
-            return cached_func(*args, **kwargs)
-            
+        def wrapper(self, *args) -> Any:
+            if not Config.ENABLE_COALESCING:
+                return func(self, *args)
+            key = cache_key(self.platform_id, func.__name__, *args)
+            # A leader finishes within its attempts' timeouts unless it hangs
+            wait = self.config.get('timeout', 10) * (self.config.get('max_retries', 3) + 1)
+            return get_single_flight().do(key, lambda: func(self, *args), wait)
         return wrapper
-    return decorator 
\ No newline at end of file
+    return decorator
+
+# Set while a canonicalized call runs, so nested platform calls (iter_search
+# falling back to search, ...) do not count the same query twice
+_canonicalizing = contextvars.ContextVar('canonicalizing', default=False)
+
+def canonicalize_keyword(func: Callable) -> Callable:
+    """
+    Turn the keyword argument of a platform search method into a Query (see
+    utils.query): upstream still gets the user's text with whitespace
+    collapsed, while cache and coalescing keys use the canonical form, so
+    equivalent spellings share one upstream fetch and cache entry. First-page
+    searches also count towards the query's popularity (see utils.popularity).
+    Works on plain and coroutine methods.
+    """
+    popular = func.__name__ in ('search', 'iter_search')
+
+    def canonical(platform, keyword: str) -> Tuple[Query, Any]:
+        if _canonicalizing.get():
+            return Query(keyword), None
+        query = canonical_query(keyword)
+        if popular:
+            get_popularity().record(platform.platform_id, query.canonical, text=query)
+        return query, _canonicalizing.set(True)
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(self, keyword: str, *args) -> Any:
+            keyword, token = canonical(self, keyword)
+            try:
+                return await func(self, keyword, *args)
+            finally:
+                if token is not None:
+                    _canonicalizing.reset(token)
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(self, keyword: str, *args) -> Any:
+        keyword, token = canonical(self, keyword)
+        try:
+            return func(self, keyword, *args)
+        finally:
+            if token is not None:
+                _canonicalizing.reset(token)
+    return wrapper
+
+def platform_pipeline(func: Callable) -> Callable:
+    """
+    Wrap a platform's search/get_book_detail in the shared request pipeline:
+    coalescing, then caching (with stale fallback), then retries behind the
+    circuit breaker
+    """
+    return coalesce_requests()(cache_response()(retry_on_failure()(func)))
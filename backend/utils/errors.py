@@ -11,10 +11,28 @@ class PlatformNotFoundError(BookSearchError):
 
 class SearchError(BookSearchError):
     """Raised when search operation fails"""
-    def __init__(self, message: str, platform: str):
+    def __init__(self, message: str, platform: str, retryable: bool = False):
         super().__init__(f"Search failed on {platform}: {message}", 500)
+        self.retryable = retryable
 
 class BookNotFoundError(BookSearchError):
     """Raised when book is not found"""
     def __init__(self, book_id: str, platform: str):
-        super().__init__(f"Book {book_id} not found on {platform}", 404) 
\ No newline at end of file
+        super().__init__(f"Book {book_id} not found on {platform}", 404) 
+
+class CircuitOpenError(BookSearchError):
+    """Raised when a platform's circuit breaker rejects a call"""
+    def __init__(self, platform: str):
+        super().__init__(f"Platform {platform} is temporarily unavailable", 503)
+
+class OverloadedError(BookSearchError):
+    """Raised when admission control sheds a request"""
+    def __init__(self, platform: str, status_code: int, retry_after: int):
+        super().__init__(f"Platform {platform} is overloaded, retry in {retry_after}s", status_code)
+        self.retry_after = retry_after
+
+class RateLimitedError(BookSearchError):
+    """Raised when the outbound rate limit would delay a request too long"""
+    def __init__(self, platform: str, retry_after: int = 1):
+        super().__init__(f"Platform {platform} request rate limit reached", 503)
+        self.retry_after = retry_after
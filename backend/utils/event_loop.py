@@ -0,0 +1,138 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Optional
+from config import Config
+
+if TYPE_CHECKING:
+    import aiohttp
+
+logger = logging.getLogger(__name__)
+
+def _connect_trace() -> 'aiohttp.TraceConfig':
+    """
+    Time new connections (TCP and TLS). Requests that pass a dict as
+    trace_request_ctx get the seconds added under 'connect'.
+    """
+    import aiohttp
+    trace = aiohttp.TraceConfig()
+
+    async def on_create_start(session, context, params):
+        context.connect_started = time.perf_counter()
+
+    async def on_create_end(session, context, params):
+        timings = context.trace_request_ctx
+        if isinstance(timings, dict):
+            timings['connect'] = timings.get('connect', 0.0) + time.perf_counter() - context.connect_started
+
+    trace.on_connection_create_start.append(on_create_start)
+    trace.on_connection_create_end.append(on_create_end)
+    return trace
+
+class BackgroundLoop:
+    """
+    One long-lived asyncio loop per worker process, run on a daemon thread.
+
+    WSGI request threads submit coroutines with run(); every coroutine shares
+    the loop's single aiohttp.ClientSession, so upstream connections are
+    pooled and thousands of requests can be in flight at once.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        # Sync platforms and HTML parsing run here via run_in_executor
+        self.loop.set_default_executor(
+            ThreadPoolExecutor(max_workers=Config.ASYNC_EXECUTOR_WORKERS, thread_name_prefix='loop-executor')
+        )
+        self._session: Optional['aiohttp.ClientSession'] = None
+        self._thread = threading.Thread(target=self._run_forever, name='event-loop', daemon=True)
+        self._thread.start()
+
+    def _run_forever(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro: Awaitable, timeout: float = None) -> Any:
+        """
+        Run a coroutine on the loop and wait for its result from a sync thread
+        Args:
+            coro: Coroutine to run
+            timeout: Seconds to wait before giving up
+        Returns:
+            The coroutine's result
+        """
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            future.cancel()
+            raise
+
+    async def session(self) -> 'aiohttp.ClientSession':
+        """
+        Get the shared client session, creating it on first use
+        Returns:
+            aiohttp session bound to this loop
+        """
+        if self._session is None or self._session.closed:
+            # Imported here: workers serving synchronously never load aiohttp
+            import aiohttp
+            connector = aiohttp.TCPConnector(
+                limit=Config.ASYNC_CONNECTION_LIMIT,
+                limit_per_host=Config.ASYNC_CONNECTION_LIMIT_PER_HOST,
+                keepalive_timeout=30
+            )
+            self._session = aiohttp.ClientSession(connector=connector, headers=Config.DEFAULT_HEADERS,
+                                                  trace_configs=[_connect_trace()])
+        return self._session
+
+    def close(self):
+        """Close the shared session and stop the loop"""
+        async def shutdown():
+            if self._session is not None and not self._session.closed:
+                await self._session.close()
+        try:
+            self.run(shutdown(), timeout=5)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+_loop: Optional[BackgroundLoop] = None
+_loop_pid: Optional[int] = None
+_loop_lock = threading.Lock()
+
+def get_loop() -> BackgroundLoop:
+    """
+    Get this process's background loop, starting it on first use.
+
+    The loop is recreated after a fork, since a prefork server's workers
+    cannot share the parent's loop thread.
+    Returns:
+        Shared BackgroundLoop instance
+    """
+    global _loop, _loop_pid
+    if _loop is None or _loop_pid != os.getpid():
+        with _loop_lock:
+            if _loop is None or _loop_pid != os.getpid():
+                _loop = BackgroundLoop()
+                _loop_pid = os.getpid()
+                logger.info("Started background event loop")
+    return _loop
+
+async def run_sync(fn: Callable, *args, blocking: bool = True) -> Any:
+    """
+    Call a sync function from a coroutine without stalling the event loop
+    Args:
+        fn: Function to call
+        args: Its positional arguments
+        blocking: Whether fn may block (SQLite, file locks); only then does
+            it run on the loop's default executor, in-memory calls run inline
+    Returns:
+        fn's result
+    """
+    if not blocking:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(fn, *args))
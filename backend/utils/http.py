@@ -0,0 +1,131 @@
+import threading
+import time
+from typing import Dict, Any
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Seconds spent opening connections on this thread since the last take_connect_time()
+_connect_time = threading.local()
+
+def take_connect_time() -> float:
+    """
+    Get and reset the time this thread spent establishing new connections
+    (TCP and TLS); 0 when the last request reused a pooled connection
+    """
+    seconds = getattr(_connect_time, 'seconds', 0.0)
+    _connect_time.seconds = 0.0
+    return seconds
+
+def _record_connect(started: float):
+    _connect_time.seconds = getattr(_connect_time, 'seconds', 0.0) + time.perf_counter() - started
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _record_connect(started)
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _record_connect(started)
+
+class PoolStats:
+    """Thread-safe counters for connections opened vs. reused by a session"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections_opened = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_connection(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def snapshot(self) -> Dict[str, int]:
+        """
+        Get a consistent copy of the counters
+        Returns:
+            Requests sent, connections opened and connections reused
+        """
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'connections_opened': self.connections_opened,
+                'connections_reused': max(self.requests - self.connections_opened, 0)
+            }
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools report to a PoolStats instance"""
+
+    def __init__(self, stats: PoolStats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        stats = self.stats
+
+        # urllib3 builds pools from these classes; subclassing them per adapter
+        # lets us count every new socket without touching global state
+        class CountingHTTPConnectionPool(HTTPConnectionPool):
+            ConnectionCls = TimedHTTPConnection
+
+            def _new_conn(self):
+                stats.record_connection()
+                return super()._new_conn()
+
+        class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            ConnectionCls = TimedHTTPSConnection
+
+            def _new_conn(self):
+                stats.record_connection()
+                return super()._new_conn()
+
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool
+        }
+
+    def send(self, request, **kwargs):
+        self.stats.record_request()
+        return super().send(request, **kwargs)
+
+def create_session(config: Dict[str, Any], headers: Dict[str, str] = None) -> requests.Session:
+    """
+    Create a keep-alive session with a connection pool sized from platform config
+    Args:
+        config: Platform configuration (see Config.PLATFORMS)
+        headers: Default headers sent with every request
+    Returns:
+        Session with a `pool_stats` attribute
+    """
+    stats = PoolStats()
+    adapter = PooledHTTPAdapter(
+        stats,
+        pool_connections=config.get('pool_connections', 4),
+        pool_maxsize=config.get('pool_maxsize', 16),
+        pool_block=config.get('pool_block', False),
+        max_retries=0
+    )
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if headers:
+        session.headers.update(headers)
+    session.headers['Connection'] = 'keep-alive'
+    session.verify = config.get('verify_ssl', True)
+    session.pool_stats = stats
+    return session
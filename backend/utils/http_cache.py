@@ -0,0 +1,102 @@
+import gzip
+import hashlib
+import logging
+import time
+from typing import Any, Dict, NamedTuple, Optional
+from flask import Response, request
+from config import Config
+from utils.cache import CacheEntry, get_cache
+from utils.serialization import columnar, timed_dumps
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Content codings in order of preference
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+class Representation(NamedTuple):
+    """One encoded variant of a response body"""
+    etag: str
+    body: bytes
+    encoding: str  # '' for identity
+
+def negotiate_encoding() -> str:
+    """
+    Pick the content coding for the current request from Accept-Encoding
+    Returns:
+        'br', 'gzip', or '' for identity
+    """
+    accepted = request.accept_encodings
+    best, best_quality = '', 0
+    for encoding in ENCODINGS:
+        quality = accepted[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=Config.HTTP_BROTLI_QUALITY)
+    # mtime=0 keeps the bytes (and so the ETag) identical across workers
+    return gzip.compress(body, compresslevel=Config.HTTP_GZIP_LEVEL, mtime=0)
+
+def _represent(payload: Any, version: str, shape: str, encoding: str) -> Representation:
+    """Serialize and compress a payload; the ETag names the version, shape and coding"""
+    body = timed_dumps(columnar(payload) if shape == 'columns' else payload)
+    if version is None:
+        version = hashlib.blake2b(body, digest_size=12).hexdigest()
+    if encoding and len(body) < Config.HTTP_COMPRESS_MIN_BYTES:
+        encoding = ''
+    if encoding:
+        body = _compress(body, encoding)
+    etag = '-'.join(filter(None, (version, 'c' if shape == 'columns' else '', encoding)))
+    return Representation(etag, body, encoding)
+
+def _cache_control(entry: Optional[CacheEntry], now: float) -> str:
+    """Browser and proxy lifetime matching what is left of the backend entry"""
+    if entry is None or entry.negative:
+        return 'no-cache'
+    max_age = max(0, int(entry.expires_at - now))
+    stale = max(0, int(entry.stale_until - max(now, entry.expires_at)))
+    return f"public, max-age={max_age}, stale-while-revalidate={stale}"
+
+def cached_json_response(result: Dict[str, Any], key: str = None, shape: str = '') -> Response:
+    """
+    JSON response for a platform result with an ETag, Cache-Control and
+    content coding. When the result is the cached value of `key`, the ETag
+    comes from the cache entry and each encoded variant is kept with the
+    entry, so repeats are answered (or 304'd) without serializing again.
+    Args:
+        result: Platform response ({'content': ..., 'status': ...})
+        key: Cache key the result may have been served from (see cache_key)
+        shape: '' or 'columns' (see utils.serialization.json_response)
+    Returns:
+        Flask response, 304 when If-None-Match matches
+    """
+    now = time.time()
+    encoding = negotiate_encoding()
+    entry = get_cache().peek(key) if key and Config.ENABLE_CACHE else None
+    if entry is not None and (entry.value is not result or entry.etag is None):
+        entry = None
+
+    name = (shape, encoding)
+    representation = entry.representations.get(name) if entry is not None else None
+    if representation is None:
+        representation = _represent(result['content'], entry.etag if entry is not None else None, shape, encoding)
+        if entry is not None:
+            get_cache().attach(key, entry, name, representation, len(representation.body))
+
+    if request.if_none_match.contains_weak(representation.etag):
+        response = Response(status=304)
+    else:
+        response = Response(representation.body, status=result['status'], mimetype='application/json')
+        if representation.encoding:
+            response.headers['Content-Encoding'] = representation.encoding
+    response.set_etag(representation.etag)
+    response.headers['Cache-Control'] = _cache_control(entry, now)
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,177 @@
+import atexit
+import contextvars
+import itertools
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Any, Callable, List, Optional
+from config import Config
+
+# Id of the request being handled, attached to every record logged while it runs
+_request_id: contextvars.ContextVar = contextvars.ContextVar('request_id', default=None)
+
+# LogRecord attributes that are not user-supplied `extra` fields
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'request_id'}
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+def set_request_id(request_id: Optional[str]):
+    """Tag the records logged by the current thread (or task) with a request id"""
+    _request_id.set(request_id)
+
+def get_request_id() -> Optional[str]:
+    return _request_id.get()
+
+class lazy:
+    """
+    Log argument computed only if the record is actually formatted:
+    logger.debug("Preview: %s", lazy(lambda: content[:500].decode()))
+    """
+
+    __slots__ = ('_build',)
+
+    def __init__(self, build: Callable[[], Any]):
+        self._build = build
+
+    def __str__(self) -> str:
+        return str(self._build())
+
+class Sampler:
+    """
+    Lets one in `every` high-volume events through (the first one included),
+    so per-card debug logging stays bounded
+    """
+
+    def __init__(self, every: int):
+        self.every = max(int(every), 1)
+        self._counter = itertools.count()
+
+    def __call__(self) -> bool:
+        # itertools.count is atomic under the GIL
+        return next(self._counter) % self.every == 0
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, request id and `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        for name, value in record.__dict__.items():
+            if name not in _RECORD_ATTRIBUTES and not name.startswith('_'):
+                entry[name] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class RequestQueueHandler(QueueHandler):
+    """
+    Enqueue records without formatting them. The request id is captured here,
+    on the logging thread; message formatting, JSON encoding and file I/O all
+    happen on the listener thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.request_id = _request_id.get()
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block a request on logging; count what was lost instead
+            self.dropped += 1
+
+class LogPipeline:
+    """Root logger -> bounded queue -> listener thread -> console and JSON file handlers"""
+
+    def __init__(self, handlers: List[logging.Handler], queue_size: int):
+        self.queue: 'queue.Queue[logging.LogRecord]' = queue.Queue(queue_size)
+        self.handler = RequestQueueHandler(self.queue)
+        self.handlers = handlers
+        self.listener: Optional[QueueListener] = None
+
+    def start(self):
+        self.listener = QueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def restart_after_fork(self):
+        # The listener thread does not survive fork(); start a fresh one in the child
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.handler.queue = self.queue
+        self.listener = None
+        self.start()
+
+_pipeline: Optional[LogPipeline] = None
+_pipeline_lock = threading.Lock()
+
+def setup_logging() -> LogPipeline:
+    """
+    Route every logger through the background pipeline (once per process):
+    human-readable lines on the console, JSON lines in Config.LOG_FILE
+    Returns:
+        The running pipeline
+    """
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            return _pipeline
+        handlers: List[logging.Handler] = []
+        console = logging.StreamHandler()
+        console.setFormatter(logging.Formatter(TEXT_FORMAT))
+        handlers.append(console)
+        if Config.LOG_FILE:
+            directory = os.path.dirname(Config.LOG_FILE)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory, exist_ok=True)
+            file_handler = RotatingFileHandler(Config.LOG_FILE, maxBytes=Config.LOG_MAX_BYTES,
+                                               backupCount=Config.LOG_BACKUP_COUNT, encoding='utf-8')
+            file_handler.setFormatter(JsonFormatter() if Config.LOG_JSON else logging.Formatter(TEXT_FORMAT))
+            handlers.append(file_handler)
+
+        pipeline = LogPipeline(handlers, Config.LOG_QUEUE_SIZE)
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(pipeline.handler)
+        root.setLevel(Config.LOG_LEVEL)
+        pipeline.start()
+        atexit.register(pipeline.stop)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=pipeline.restart_after_fork)
+        _pipeline = pipeline
+        return pipeline
+
+def logging_stats() -> dict:
+    """
+    Get pipeline counters
+    Returns:
+        Queue depth and records dropped because the queue was full
+    """
+    if _pipeline is None:
+        return {'enabled': False}
+    return {
+        'enabled': True,
+        'queued': _pipeline.queue.qsize(),
+        'queue_size': _pipeline.queue.maxsize,
+        'dropped': _pipeline.handler.dropped
+    }
@@ -0,0 +1,275 @@
+import bisect
+import contextlib
+import contextvars
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Latency buckets in seconds, from a parsed cache hit up to a slow mirror
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (name suffix, label pairs, value) produced by a metric or a collector
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+class Metric:
+    """Base of the metric types: a named family of label-keyed series"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, label_values: Sequence[Any]) -> Tuple[str, ...]:
+        if len(label_values) != len(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(label_values)}")
+        return tuple(str(value) for value in label_values)
+
+    def samples(self) -> Iterator[Sample]:
+        raise NotImplementedError
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: Any, amount: float = 1):
+        key = self._key(label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield '', tuple(zip(self.labels, key)), value
+
+class Gauge(Metric):
+    """Value that goes up and down"""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: Any, amount: float = 1):
+        key = self._key(label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, *label_values: Any, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value: float, *label_values: Any):
+        key = self._key(label_values)
+        with self._lock:
+            self._values[key] = value
+
+    @contextlib.contextmanager
+    def track(self, *label_values: Any):
+        """Count the enclosed block as in progress"""
+        self.inc(*label_values)
+        try:
+            yield
+        finally:
+            self.dec(*label_values)
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield '', tuple(zip(self.labels, key)), value
+
+class Histogram(Metric):
+    """Distribution of observations in cumulative buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per series: bucket counts (non-cumulative, last one is +Inf), sum
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, *label_values: Any):
+        key = self._key(label_values)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextlib.contextmanager
+    def time(self, *label_values: Any):
+        """Observe the duration of the enclosed block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            items = [(key, list(series[0]), series[1]) for key, series in self._series.items()]
+        for key, counts, total in items:
+            labels = tuple(zip(self.labels, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield '_bucket', labels + (('le', _format_value(float(bound))),), cumulative
+            yield '_sum', labels, total
+            yield '_count', labels, cumulative
+
+class MetricsRegistry:
+    """
+    Metrics of this worker process, rendered in the Prometheus text format.
+    Collectors are called at scrape time to export counters kept elsewhere
+    (cache, breakers, pools) without double bookkeeping.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        # name -> (kind, documentation, callable returning samples)
+        self._collectors: Dict[str, Tuple[str, str, Callable[[], Iterator[Sample]]]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, name: str, kind: str, documentation: str,
+                           collect: Callable[[], Iterator[Sample]]):
+        """
+        Export values computed at scrape time
+        Args:
+            name: Metric name
+            kind: 'counter' or 'gauge'
+            documentation: HELP text
+            collect: Returns (suffix, labels, value) samples
+        """
+        with self._lock:
+            self._collectors[name] = (kind, documentation, collect)
+
+    def render(self) -> str:
+        """
+        Render every metric
+        Returns:
+            Prometheus text exposition format (version 0.0.4)
+        """
+        with self._lock:
+            families = [(metric.name, metric.kind, metric.documentation, metric.samples)
+                        for metric in self._metrics.values()]
+            families += [(name, kind, documentation, collect)
+                         for name, (kind, documentation, collect) in self._collectors.items()]
+        lines = []
+        for name, kind, documentation, samples in families:
+            try:
+                collected = list(samples())
+            except Exception as e:
+                lines.append(f"# {name} collection failed: {_escape(str(e))}")
+                continue
+            lines.append(f"# HELP {name} {_escape(documentation)}")
+            lines.append(f"# TYPE {name} {kind}")
+            for suffix, labels, value in collected:
+                label_text = ','.join(f'{label}="{_escape(label_value)}"' for label, label_value in labels)
+                lines.append(f"{name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text
+                             else f"{name}{suffix} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'booksearch_stage_seconds',
+    'Latency of one stage of a platform request: connect, ttfb, download, parse, serialize',
+    ('platform', 'stage')
+))
+UPSTREAM_REQUESTS = REGISTRY.register(Counter(
+    'booksearch_upstream_requests_total', 'Upstream HTTP requests by status class', ('platform', 'status')
+))
+UPSTREAM_ERRORS = REGISTRY.register(Counter(
+    'booksearch_upstream_errors_total', 'Failed platform call attempts by error type', ('platform', 'error')
+))
+UPSTREAM_RETRIES = REGISTRY.register(Counter(
+    'booksearch_upstream_retries_total', 'Platform call attempts that were retried', ('platform',)
+))
+UPSTREAM_IN_FLIGHT = REGISTRY.register(Gauge(
+    'booksearch_upstream_requests_in_flight', 'Upstream HTTP requests currently running', ('platform',)
+))
+DOWNLOAD_BYTES = REGISTRY.register(Counter(
+    'booksearch_download_bytes_total', 'File bytes relayed from upstream by the download proxy', ('platform',)
+))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'booksearch_http_request_seconds', 'Time to produce a response (headers, for streams)', ('endpoint', 'status')
+))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    'booksearch_http_requests_in_flight', 'Requests currently being handled', ('endpoint',)
+))
+
+# Stage timings of the request being profiled (see app.py), if any
+_stage_trace: contextvars.ContextVar = contextvars.ContextVar('stage_trace', default=None)
+
+def observe_stage(platform: str, stage: str, seconds: float):
+    """
+    Record the latency of one request stage
+    Args:
+        platform: Platform identifier
+        stage: 'connect', 'ttfb', 'download', 'parse' or 'serialize'
+        seconds: Duration
+    """
+    STAGE_SECONDS.observe(seconds, platform, stage)
+    trace = _stage_trace.get()
+    if trace is not None:
+        trace.append({'platform': platform, 'stage': stage, 'ms': round(seconds * 1000, 3)})
+
+@contextlib.contextmanager
+def stage(platform: str, name: str):
+    """Observe the duration of the enclosed block as a request stage"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(platform, name, time.perf_counter() - started)
+
+def start_stage_trace() -> List[Dict[str, Any]]:
+    """
+    Collect the stages observed by the current thread from now on (used by
+    the profiling hook; stages run on other threads are not seen)
+    Returns:
+        The list the stages are appended to
+    """
+    trace: List[Dict[str, Any]] = []
+    _stage_trace.set(trace)
+    return trace
+
+def stop_stage_trace():
+    _stage_trace.set(None)
+
+def render_metrics() -> str:
+    """
+    Render this worker's metrics
+    Returns:
+        Prometheus text exposition format
+    """
+    return REGISTRY.render()
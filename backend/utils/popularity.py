@@ -0,0 +1,188 @@
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from config import Config
+from utils.query import Query
+
+logger = logging.getLogger(__name__)
+
+# Request lines written by app.search: JSON lines with event 'search_request'
+# (see utils.logs), or in the text format, e.g.
+# "2024-05-01 12:00:00,123 - app - INFO - Received search request - Platform: zlibrary, Keyword: python"
+_SEARCH_LOG_LINE = re.compile(
+    r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d+ .*Received search request - Platform: ([^,]+), Keyword: (.+)$'
+)
+
+class QueryPopularity:
+    """
+    Exponentially decayed hit counts of canonical queries per platform.
+    A hit adds 1 to a query's score, and scores halve every `half_life`
+    seconds, so the ranking follows current traffic rather than all-time
+    totals. At most `max_keys` queries are tracked; the coldest are dropped.
+    The latest spelling of each query is kept too, to refresh it with the
+    text users actually send.
+    """
+
+    def __init__(self, half_life: float = 3600, max_keys: int = 5000):
+        self.half_life = half_life
+        self.max_keys = max_keys
+        self.recorded = 0
+        self._scores: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        self._texts: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+
+    def _decayed(self, score: float, updated: float, now: float) -> float:
+        return score * math.pow(0.5, max(0.0, now - updated) / self.half_life)
+
+    def record(self, platform_id: str, query: str, now: float = None, weight: float = 1.0, text: str = None):
+        """
+        Count one hit of a query
+        Args:
+            platform_id: Platform identifier
+            query: Canonical query (see utils.query.canonicalize)
+            now: Hit time (defaults to now; older hits count less)
+            weight: Score added by the hit
+            text: The query as sent upstream, if it differs from the canonical form
+        """
+        if not query:
+            return
+        now = time.time() if now is None else now
+        key = (platform_id, query)
+        with self._lock:
+            self.recorded += 1
+            current = self._scores.get(key)
+            if current is None:
+                score, updated = 0.0, now
+                if len(self._scores) >= self.max_keys:
+                    self._prune(now)
+            else:
+                score, updated = current
+            # Keep the later timestamp so out-of-order (seeded) hits decay correctly
+            latest = max(now, updated)
+            self._scores[key] = (self._decayed(score, updated, latest) + self._decayed(weight, now, latest), latest)
+            if text and now >= updated:
+                if text != query:
+                    self._texts[key] = str(text)
+                else:
+                    self._texts.pop(key, None)
+
+    def _prune(self, now: float):
+        """Drop the coldest tenth of the tracked queries; caller holds the lock"""
+        ranked = sorted(self._scores.items(), key=lambda item: self._decayed(item[1][0], item[1][1], now))
+        for key, _ in ranked[:max(1, len(ranked) // 10)]:
+            del self._scores[key]
+            self._texts.pop(key, None)
+
+    def text(self, platform_id: str, query: str) -> str:
+        """
+        Get the latest spelling of a tracked query
+        Args:
+            platform_id: Platform identifier
+            query: Canonical query
+        Returns:
+            The query as last sent upstream, or the canonical query itself
+        """
+        return self._texts.get((platform_id, query), query)
+
+    def top(self, limit: int, min_score: float = 0.0) -> List[Tuple[str, str, float]]:
+        """
+        Get the most popular queries right now
+        Args:
+            limit: Maximum number of queries
+            min_score: Ignore queries scoring below this
+        Returns:
+            (platform_id, query, score) tuples, most popular first
+        """
+        now = time.time()
+        with self._lock:
+            scored = [(platform_id, query, self._decayed(score, updated, now))
+                      for (platform_id, query), (score, updated) in self._scores.items()]
+        scored = [item for item in scored if item[2] >= min_score]
+        scored.sort(key=lambda item: item[2], reverse=True)
+        return scored[:limit]
+
+    def seed_from_log(self, path: str, max_bytes: int = 4 * 1024 * 1024) -> int:
+        """
+        Replay the search requests logged by app.py, so a restarted worker
+        knows the hot queries before traffic arrives
+        Args:
+            path: Log file (the rotated files next to it are not read)
+            max_bytes: Read at most this many bytes from the end of the file
+        Returns:
+            Number of replayed requests
+        """
+        if not path or not os.path.exists(path):
+            return 0
+        seeded = 0
+        try:
+            with open(path, 'rb') as f:
+                f.seek(max(0, os.path.getsize(path) - max_bytes))
+                lines = f.read().decode('utf-8', errors='replace').splitlines()
+        except OSError as e:
+            logger.warning(f"Cannot read search log {path}: {str(e)}")
+            return 0
+        for line in lines:
+            request = _parse_search_line(line)
+            if request is None:
+                continue
+            when, platform, keyword = request
+            query = Query(keyword)
+            self.record(platform.strip().lower(), query.canonical, now=when, text=query)
+            seeded += 1
+        logger.info(f"Seeded query popularity with {seeded} logged searches from {path}")
+        return seeded
+
+    def snapshot(self, top: int = 20) -> Dict[str, Any]:
+        """
+        Get popularity counters
+        Args:
+            top: Number of queries to list
+        Returns:
+            Tracked query count and the most popular queries with their scores
+        """
+        return {
+            'recorded': self.recorded,
+            'tracked': len(self._scores),
+            'half_life': self.half_life,
+            'top': [{'platform_id': platform_id, 'query': query, 'score': round(score, 3)}
+                    for platform_id, query, score in self.top(top)]
+        }
+
+def _parse_search_line(line: str) -> Optional[Tuple[float, str, str]]:
+    """(time, platform, keyword) of a logged search request, or None"""
+    try:
+        if line.startswith('{'):
+            entry = json.loads(line)
+            if entry.get('event') != 'search_request':
+                return None
+            when = datetime.strptime(entry['ts'][:19], '%Y-%m-%dT%H:%M:%S').timestamp()
+            return when, str(entry['platform']), str(entry['keyword'])
+        match = _SEARCH_LOG_LINE.match(line)
+        if match is None:
+            return None
+        stamp, platform, keyword = match.groups()
+        return datetime.strptime(stamp, '%Y-%m-%d %H:%M:%S').timestamp(), platform, keyword
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None
+
+_popularity: Optional[QueryPopularity] = None
+_popularity_lock = threading.Lock()
+
+def get_popularity() -> QueryPopularity:
+    """
+    Get the process-wide query popularity tracker
+    Returns:
+        Shared QueryPopularity instance
+    """
+    global _popularity
+    if _popularity is None:
+        with _popularity_lock:
+            if _popularity is None:
+                _popularity = QueryPopularity(Config.WARMER_HALF_LIFE, Config.WARMER_MAX_KEYS)
+    return _popularity
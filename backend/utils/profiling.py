@@ -0,0 +1,98 @@
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from config import Config
+from utils.metrics import start_stage_trace, stop_stage_trace
+
+# cProfile allows one active profiler per process on some Python versions,
+# and concurrent profiles would measure each other anyway
+_profile_lock = threading.Lock()
+
+_BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def is_authorized(token: Optional[str]) -> bool:
+    """
+    Check an admin token against Config.ADMIN_TOKEN
+    Args:
+        token: Token sent by the client
+    Returns:
+        False when no admin token is configured or it does not match
+    """
+    if not Config.ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode('utf-8'), Config.ADMIN_TOKEN.encode('utf-8'))
+
+class RequestProfiler:
+    """
+    cProfile plus stage timings for one request. Only the request thread is
+    profiled, so use sync serving (ASYNC_SERVING off) to see the path through
+    ZLibrary.search; hedged fetches and the async loop run elsewhere.
+    """
+
+    def __init__(self, top: int = None):
+        self.top = Config.PROFILE_TOP if top is None else top
+        self._profiler = cProfile.Profile()
+        self._stages: List[Dict[str, Any]] = []
+        self._started = 0.0
+        self._elapsed = 0.0
+        self._acquired = False
+
+    def start(self) -> bool:
+        """
+        Start profiling the current thread
+        Returns:
+            False if another request is being profiled
+        """
+        if not _profile_lock.acquire(blocking=False):
+            return False
+        self._acquired = True
+        self._stages = start_stage_trace()
+        self._started = time.perf_counter()
+        self._profiler.enable()
+        return True
+
+    def stop(self):
+        if not self._acquired:
+            return
+        self._profiler.disable()
+        stop_stage_trace()
+        self._elapsed = time.perf_counter() - self._started
+        self._acquired = False
+        _profile_lock.release()
+
+    def report(self, status: int) -> Dict[str, Any]:
+        """
+        Summarize the profile (call stop() first)
+        Args:
+            status: Status code the request would have returned
+        Returns:
+            Elapsed time, stage timings, the hottest functions by cumulative
+            time, and the same restricted to backend code (the hot path)
+        """
+        stats = pstats.Stats(self._profiler)
+        functions = []
+        for (filename, line, name), (_, calls, total, cumulative, _) in stats.stats.items():
+            functions.append({
+                'function': f"{os.path.relpath(filename, _BACKEND_ROOT) if filename.startswith(_BACKEND_ROOT) else filename}:{line}({name})",
+                'backend': filename.startswith(_BACKEND_ROOT),
+                'calls': calls,
+                'total_ms': round(total * 1000, 3),
+                'cumulative_ms': round(cumulative * 1000, 3)
+            })
+        functions.sort(key=lambda item: item['cumulative_ms'], reverse=True)
+
+        text = io.StringIO()
+        pstats.Stats(self._profiler, stream=text).sort_stats('cumulative').print_stats(self.top)
+        return {
+            'status': status,
+            'elapsed_ms': round(self._elapsed * 1000, 3),
+            'stages': self._stages,
+            'hot_path': [item for item in functions if item['backend']][:self.top],
+            'top': functions[:self.top],
+            'pstats': text.getvalue()
+        }
@@ -0,0 +1,166 @@
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set
+
+_ISBN_CHARS = re.compile(r'[\s\-‐-―]+')
+_WHITESPACE = re.compile(r'\s+')
+# Apostrophes join the word ("O'Reilly" -> "oreilly"); '#' and '+' are kept for "C#", "C++"
+_APOSTROPHES = str.maketrans('', '', "'’ʼ")
+_KEEP = frozenset('#+')
+
+def _isbn10_valid(digits: str) -> bool:
+    total = 0
+    for position, char in enumerate(digits):
+        value = 10 if char == 'X' and position == 9 else int(char) if char.isdigit() else None
+        if value is None:
+            return False
+        total += (10 - position) * value
+    return total % 11 == 0
+
+def _isbn13_valid(digits: str) -> bool:
+    if not digits.isdigit():
+        return False
+    return sum(int(char) * (3 if position % 2 else 1) for position, char in enumerate(digits)) % 10 == 0
+
+def to_isbn13(isbn10: str) -> str:
+    """
+    Convert a valid ISBN-10 to its ISBN-13
+    Args:
+        isbn10: Ten characters, digits with an optional trailing X
+    Returns:
+        The 978-prefixed ISBN-13
+    """
+    core = '978' + isbn10[:9]
+    check = (10 - sum(int(char) * (3 if position % 2 else 1) for position, char in enumerate(core)) % 10) % 10
+    return core + str(check)
+
+def parse_isbn(value: str) -> Optional[str]:
+    """
+    Recognize an ISBN-10/13, with or without hyphens and spaces
+    Args:
+        value: Raw query or attribute value
+    Returns:
+        The ISBN-13 digits when the checksum is valid, otherwise None
+    """
+    if not value:
+        return None
+    digits = _ISBN_CHARS.sub('', unicodedata.normalize('NFKC', value)).upper()
+    if len(digits) == 10 and _isbn10_valid(digits):
+        return to_isbn13(digits)
+    if len(digits) == 13 and digits[:3] in ('978', '979') and _isbn13_valid(digits):
+        return digits
+    return None
+
+def canonicalize(query: str) -> str:
+    """
+    Canonical form of a search query, shared by every platform and used as
+    the cache and coalescing key: NFKC, casefolded, punctuation stripped,
+    whitespace collapsed. ISBNs become their ISBN-13 digits.
+    Args:
+        query: Raw query
+    Returns:
+        Canonical query
+    """
+    if query is None:
+        return ''
+    isbn = parse_isbn(query)
+    if isbn is not None:
+        return isbn
+    folded = unicodedata.normalize('NFKC', query).casefold()
+    text = ''.join(
+        ' ' if unicodedata.category(char).startswith('P') and char not in _KEEP else char
+        for char in folded.translate(_APOSTROPHES)
+    )
+    # A query made only of punctuation keeps it rather than becoming empty
+    return _WHITESPACE.sub(' ', text).strip() or _WHITESPACE.sub(' ', folded).strip()
+
+class Query(str):
+    """
+    A search query as it is sent upstream: the user's text with whitespace
+    collapsed, otherwise unchanged. Its `canonical` form (see canonicalize)
+    keys the cache, coalescing and popularity, so equivalent spellings share
+    one entry without changing what the platform is asked for.
+    """
+
+    canonical: str
+
+    def __new__(cls, raw: str) -> 'Query':
+        if isinstance(raw, Query):
+            return raw
+        query = super().__new__(cls, _WHITESPACE.sub(' ', raw or '').strip())
+        query.canonical = canonicalize(raw)
+        return query
+
+class QueryStats:
+    """
+    Counts how many distinct raw queries collapse onto each canonical key.
+    Tracks the most recently used `max_keys` keys and up to `max_variants`
+    raw spellings per key.
+    """
+
+    def __init__(self, max_keys: int = 1000, max_variants: int = 32):
+        self.max_keys = max_keys
+        self.max_variants = max_variants
+        self.lookups = 0
+        self.rewritten = 0
+        self._variants: 'OrderedDict[str, Set[str]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, raw: str, canonical: str):
+        with self._lock:
+            self.lookups += 1
+            if raw != canonical:
+                self.rewritten += 1
+            variants = self._variants.get(canonical)
+            if variants is None:
+                variants = self._variants[canonical] = set()
+                while len(self._variants) > self.max_keys:
+                    self._variants.popitem(last=False)
+            else:
+                self._variants.move_to_end(canonical)
+            if len(variants) < self.max_variants:
+                variants.add(raw)
+
+    def snapshot(self, top: int = 20) -> Dict[str, Any]:
+        """
+        Get collapse counters
+        Args:
+            top: Number of canonical keys to list, most variants first
+        Returns:
+            Lookup counts and the canonical keys with the most raw spellings
+        """
+        with self._lock:
+            ranked = sorted(self._variants.items(), key=lambda item: len(item[1]), reverse=True)[:top]
+            distinct_raw = sum(len(variants) for variants in self._variants.values())
+            return {
+                'lookups': self.lookups,
+                'rewritten': self.rewritten,
+                'canonical_keys': len(self._variants),
+                'distinct_raw_queries': distinct_raw,
+                'top': [{'canonical': key, 'variants': len(variants), 'examples': sorted(variants)[:5]}
+                        for key, variants in ranked]
+            }
+
+_stats = QueryStats()
+
+def canonical_query(raw: str) -> Query:
+    """
+    Canonicalize a query and record the raw -> canonical mapping
+    Args:
+        raw: Query as received
+    Returns:
+        The query to send upstream, carrying its canonical form
+    """
+    query = Query(raw)
+    _stats.record(raw, query.canonical)
+    return query
+
+def query_stats() -> Dict[str, Any]:
+    """
+    Get query canonicalization statistics
+    Returns:
+        See QueryStats.snapshot
+    """
+    return _stats.snapshot()
@@ -0,0 +1,348 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from config import Config
+from utils.errors import RateLimitedError
+from utils.event_loop import run_sync
+
+logger = logging.getLogger(__name__)
+
+class Bucket(NamedTuple):
+    """Token bucket: `rate` tokens per second, holding at most `burst`"""
+    name: str
+    rate: float
+    burst: float
+
+def _refill(bucket: Bucket, row: Optional[Tuple[float, float]], now: float) -> float:
+    if row is None:
+        return bucket.burst
+    tokens, updated = row
+    return min(bucket.burst, tokens + max(0.0, now - updated) * bucket.rate)
+
+def _plan(buckets: List[Bucket], rows: Dict[str, Tuple[float, float]], now: float,
+          max_wait: float, count: int = 1) -> Tuple[Optional[float], Dict[str, float], int]:
+    """
+    Take up to `count` tokens from every bucket: as many as every bucket
+    holds whole, and at least one. Tokens may go negative: that is a
+    reservation, paid for by waiting until the bucket refills to zero.
+    Returns:
+        (seconds to wait, or None if longer than max_wait; new token counts;
+        tokens taken)
+    """
+    refilled = {bucket.name: _refill(bucket, rows.get(bucket.name), now) for bucket in buckets}
+    taken = max(1, min(count, int(min(refilled.values()))))
+    delay, tokens = 0.0, {}
+    for bucket in buckets:
+        left = refilled[bucket.name] - taken
+        tokens[bucket.name] = left
+        if left < 0:
+            delay = max(delay, -left / bucket.rate)
+    if delay > max_wait:
+        return None, {}, 0
+    return delay, tokens, taken
+
+def _penalized(bucket: Bucket, row: Optional[Tuple[float, float]], now: float, seconds: float) -> float:
+    # Leave the bucket so that its next token is `seconds` away
+    return min(_refill(bucket, row, now), 1 - seconds * bucket.rate)
+
+class MemoryRateStore:
+    """Bucket state private to this process"""
+
+    blocking = False
+
+    def __init__(self):
+        self._rows: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, buckets: List[Bucket], now: float, max_wait: float,
+                count: int = 1) -> Tuple[Optional[float], int]:
+        with self._lock:
+            delay, tokens, taken = _plan(buckets, self._rows, now, max_wait, count)
+            for name, left in tokens.items():
+                self._rows[name] = (left, now)
+            return delay, taken
+
+    def penalize(self, bucket: Bucket, now: float, seconds: float):
+        with self._lock:
+            self._rows[bucket.name] = (_penalized(bucket, self._rows.get(bucket.name), now, seconds), now)
+
+class SQLiteRateStore:
+    """Bucket state in a SQLite file, shared by every worker on the host"""
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS buckets ('
+            'name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=2.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _rows(self, conn: sqlite3.Connection, names: List[str]) -> Dict[str, Tuple[float, float]]:
+        placeholders = ','.join('?' * len(names))
+        return {name: (tokens, updated) for name, tokens, updated in conn.execute(
+            f'SELECT name, tokens, updated FROM buckets WHERE name IN ({placeholders})', names
+        )}
+
+    def reserve(self, buckets: List[Bucket], now: float, max_wait: float,
+                count: int = 1) -> Tuple[Optional[float], int]:
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front, so read-modify-write is atomic across workers
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            delay, tokens, taken = _plan(buckets, self._rows(conn, [bucket.name for bucket in buckets]),
+                                         now, max_wait, count)
+            conn.executemany(
+                'INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)',
+                [(name, left, now) for name, left in tokens.items()]
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return delay, taken
+
+    def penalize(self, bucket: Bucket, now: float, seconds: float):
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = self._rows(conn, [bucket.name]).get(bucket.name)
+            conn.execute('INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)',
+                         (bucket.name, _penalized(bucket, row, now, seconds), now))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+class RateLimiter:
+    """
+    Outbound request budget of one platform: a token bucket for the platform
+    and one per mirror, shared by every worker through the store.
+
+    Each request takes a token from both buckets at once. When they are
+    empty the request reserves a future token and waits for it, up to
+    `max_wait` seconds; past that it fails with RateLimitedError, which the
+    cache layer answers with a retained result (see utils.decorators).
+
+    To spare the shared store a write transaction per request, a reservation
+    takes up to `lease_size` tokens while the buckets hold them; the spare
+    ones are spent by this process's next requests to the same mirror within
+    `lease_ttl` seconds, and dropped after that. Dropped tokens only lower
+    the rate actually sent.
+    """
+
+    def __init__(self, name: str, store, rate: float, burst: float,
+                 mirror_rate: float = 0, mirror_burst: float = 0, max_wait: float = 2.0,
+                 lease_size: int = 1, lease_ttl: float = 1.0):
+        self.name = name
+        self.store = store
+        self.platform_bucket = Bucket(name, rate, max(burst, 1)) if rate > 0 else None
+        self.mirror_rate = mirror_rate
+        self.mirror_burst = max(mirror_burst, 1)
+        self.max_wait = max_wait
+        self.lease_size = max(int(lease_size), 1)
+        self.lease_ttl = lease_ttl
+        self.granted = 0
+        self.leased = 0
+        self.delayed = 0
+        self.rejected = 0
+        self.penalized = 0
+        self.wait_seconds = 0.0
+        # mirror URL -> (spare tokens, monotonic expiry), for the process in _lease_pid
+        self._leases: Dict[str, Tuple[int, float]] = {}
+        self._lease_pid = os.getpid()
+        self._lock = threading.Lock()
+
+    @property
+    def blocking(self) -> bool:
+        """Whether reserving may wait on SQLite (shared state)"""
+        return self.store.blocking
+
+    def _buckets(self, mirror_url: str) -> List[Bucket]:
+        buckets = [self.platform_bucket] if self.platform_bucket is not None else []
+        if self.mirror_rate > 0:
+            buckets.append(Bucket(f"{self.name}@{mirror_url}", self.mirror_rate, self.mirror_burst))
+        return buckets
+
+    def reserve(self, mirror_url: str) -> float:
+        """
+        Take a token for one request to a mirror
+        Args:
+            mirror_url: Base URL of the mirror
+        Returns:
+            Seconds to wait before sending the request
+        Raises:
+            RateLimitedError: If the wait would exceed max_wait
+        """
+        buckets = self._buckets(mirror_url)
+        if not buckets:
+            return 0.0
+        if self._take_leased(mirror_url):
+            return 0.0
+        try:
+            delay, taken = self.store.reserve(buckets, time.time(), self.max_wait, self.lease_size)
+        except sqlite3.Error as e:
+            # Fail open: a broken state file must not stop all traffic
+            logger.warning(f"Rate limiter state unavailable: {str(e)}")
+            return 0.0
+        with self._lock:
+            if delay is None:
+                self.rejected += 1
+                raise RateLimitedError(self.name)
+            self.granted += 1
+            if delay > 0:
+                self.delayed += 1
+                self.wait_seconds += delay
+            if taken > 1:
+                self._leases[mirror_url] = (taken - 1, time.monotonic() + self.lease_ttl)
+        return delay
+
+    def _take_leased(self, mirror_url: str) -> bool:
+        """Spend a spare token of this process's lease on the mirror, if one is left"""
+        with self._lock:
+            if self._lease_pid != os.getpid():
+                # Leases taken by the parent are not this forked process's to spend
+                self._leases.clear()
+                self._lease_pid = os.getpid()
+            spare, expires = self._leases.get(mirror_url, (0, 0.0))
+            if spare <= 0 or time.monotonic() >= expires:
+                return False
+            self._leases[mirror_url] = (spare - 1, expires)
+            self.granted += 1
+            self.leased += 1
+            return True
+
+    def acquire(self, mirror_url: str):
+        """Take a token, sleeping until it is due (sync platforms)"""
+        delay = self.reserve(mirror_url)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, mirror_url: str):
+        """
+        Take a token, waiting on the event loop until it is due (async
+        platforms); a shared store is written from the loop's executor
+        """
+        if self._take_leased(mirror_url):
+            return
+        delay = await run_sync(self.reserve, mirror_url, blocking=self.blocking)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def penalize(self, mirror_url: str, seconds: float):
+        """
+        Back off every worker after the upstream throttled us (HTTP 429)
+        Args:
+            mirror_url: Base URL of the mirror that answered 429
+            seconds: Its Retry-After, or a default pause
+        """
+        with self._lock:
+            self.penalized += 1
+            # Spare tokens would keep sending during the pause
+            self._leases.clear()
+        now = time.time()
+        for bucket in self._buckets(mirror_url):
+            try:
+                self.store.penalize(bucket, now, seconds)
+            except sqlite3.Error as e:
+                logger.warning(f"Rate limiter state update failed: {str(e)}")
+        logger.warning(f"{self.name} throttled by {mirror_url}, pausing requests for {seconds:.1f}s")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'rate': self.platform_bucket.rate if self.platform_bucket is not None else 0,
+                'mirror_rate': self.mirror_rate,
+                'granted': self.granted,
+                'leased': self.leased,
+                'delayed': self.delayed,
+                'rejected': self.rejected,
+                'penalized': self.penalized,
+                'wait_seconds': round(self.wait_seconds, 3)
+            }
+
+def retry_after_seconds(value: Optional[str], default: float) -> float:
+    """
+    Parse a Retry-After header given in seconds
+    Args:
+        value: Header value
+        default: Pause used when the header is missing or an HTTP date
+    Returns:
+        Seconds to pause, capped at a minute
+    """
+    try:
+        return min(max(float(value), 0.0), 60.0)
+    except (TypeError, ValueError):
+        return default
+
+_store = None
+_limiters: Dict[str, RateLimiter] = {}
+_registry_lock = threading.Lock()
+_store_lock = threading.Lock()
+
+def get_rate_store():
+    """
+    Get the token bucket store, shared by every worker unless
+    Config.RATE_LIMIT_STATE_PATH is empty
+    Returns:
+        SQLiteRateStore or MemoryRateStore instance
+    """
+    global _store
+    if _store is None:
+        # Not _registry_lock: get_rate_limiter calls this holding it
+        with _store_lock:
+            if _store is None:
+                _store = (SQLiteRateStore(Config.RATE_LIMIT_STATE_PATH) if Config.RATE_LIMIT_STATE_PATH
+                          else MemoryRateStore())
+    return _store
+
+def get_rate_limiter(platform_id: str, config: Optional[Dict] = None) -> RateLimiter:
+    """
+    Get the outbound rate limiter of a platform
+    Args:
+        platform_id: Platform identifier
+        config: Platform configuration (see Config.PLATFORMS)
+    Returns:
+        Shared RateLimiter instance
+    """
+    limiter = _limiters.get(platform_id)
+    if limiter is None:
+        config = config or {}
+        with _registry_lock:
+            limiter = _limiters.get(platform_id)
+            if limiter is None:
+                limiter = _limiters[platform_id] = RateLimiter(
+                    platform_id, get_rate_store(),
+                    rate=config.get('rate_limit', 0),
+                    burst=config.get('rate_burst', 1),
+                    mirror_rate=config.get('mirror_rate_limit', 0),
+                    mirror_burst=config.get('mirror_rate_burst', 1),
+                    max_wait=config.get('rate_max_wait', 2.0),
+                    lease_size=config.get('rate_lease_size', 1),
+                    lease_ttl=config.get('rate_lease_ttl', 1.0)
+                )
+    return limiter
+
+def rate_limit_stats() -> Dict[str, Dict]:
+    """
+    Get rate limiter counters per platform
+    Returns:
+        Statistics keyed by platform id
+    """
+    return {platform_id: limiter.stats() for platform_id, limiter in list(_limiters.items())}
@@ -0,0 +1,129 @@
+import json
+import sys
+from operator import attrgetter
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# C-accelerated JSON string escaping from the standard library
+_encode_string = json.encoder.encode_basestring
+
+class Book:
+    """
+    Search result record shared by every platform.
+
+    Slotted and immutable, so a record carries no per-instance dict.
+    Low-cardinality fields are interned so the thousands of cards in the
+    cache share one string per value. Records read like the dicts they
+    replace (book['title'], book.get('isbn')) and serialize straight to JSON
+    with to_json(), which is memoized: a cached record is encoded once no
+    matter how many responses it appears in.
+    """
+
+    FIELDS = (
+        'title', 'author', 'year', 'isbn', 'publisher',
+        'extension', 'filesize', 'language',
+        'source', 'platform_id', 'book_url',
+        'pages', 'quality', 'rating'
+    )
+    __slots__ = FIELDS + ('_json',)
+    _FIELD_SET = frozenset(FIELDS)
+
+    # Fields with few distinct values ('Unknown', '0.0', 'pdf', 'english', ...)
+    _INTERNED = frozenset(('author', 'year', 'publisher', 'extension', 'language',
+                           'source', 'platform_id', 'pages', 'quality', 'rating'))
+
+    # '{"title":', ',"author":', ... precomputed once
+    _KEYS = tuple(('{' if index == 0 else ',') + _encode_string(name) + ':' for index, name in enumerate(FIELDS))
+
+    def __init__(self, title: Optional[str] = None, author: Optional[str] = None, year: Optional[str] = None,
+                 isbn: Optional[str] = None, publisher: Optional[str] = None, extension: Optional[str] = None,
+                 filesize: Optional[str] = None, language: Optional[str] = None, source: Optional[str] = None,
+                 platform_id: Optional[str] = None, book_url: Optional[str] = None, pages: Optional[str] = None,
+                 quality: Optional[str] = None, rating: Optional[str] = None):
+        values = (title, author, year, isbn, publisher, extension, filesize, language,
+                  source, platform_id, book_url, pages, quality, rating)
+        for name, value in zip(self.FIELDS, values):
+            if name in self._INTERNED and type(value) is str:
+                value = sys.intern(value)
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, '_json', None)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"Book records are immutable (tried to set '{name}')")
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Book':
+        """Build a record from a book dict, ignoring unknown keys"""
+        return cls(**{name: data.get(name) for name in cls.FIELDS})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def values(self) -> Tuple[Any, ...]:
+        """Field values in FIELDS order (one row of the columnar shape)"""
+        return _field_values(self)
+
+    def to_json(self) -> str:
+        """Serialize to a compact JSON object without building an intermediate dict"""
+        encoded = self._json
+        if encoded is None:
+            encoded = ''.join([
+                key + ('null' if value is None else _encode_string(value if type(value) is str else str(value)))
+                for key, value in zip(self._KEYS, _field_values(self))
+            ]) + '}'
+            object.__setattr__(self, '_json', encoded)
+        return encoded
+
+    # Dict-style read access, so code written against book dicts keeps working
+    def __getitem__(self, name: str) -> Any:
+        if name not in self._FIELD_SET:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        # Like dict.get: a field stored as None returns None, not the default
+        if name not in self._FIELD_SET:
+            return default
+        return getattr(self, name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._FIELD_SET
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.FIELDS
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        return ((name, getattr(self, name)) for name in self.FIELDS)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, Book):
+            return self.values() == other.values()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self.values())
+
+    def __repr__(self) -> str:
+        return f"Book({self.to_dict()!r})"
+
+    def __reduce__(self):
+        # Positional values only: smaller pickles in the disk cache, and
+        # interning is reapplied on load
+        return Book, self.values()
+
+_field_values = attrgetter(*Book.FIELDS)
+
+def columnar(books: List[Any]) -> Dict[str, Any]:
+    """
+    Columnar shape of a book list: field names once, one array per book
+    Args:
+        books: Book records (or book dicts)
+    Returns:
+        {'fields': [...], 'rows': [[...], ...]}
+    """
+    return {
+        'fields': list(Book.FIELDS),
+        'rows': [list(book.values()) if isinstance(book, Book) else [book.get(name) for name in Book.FIELDS]
+                 for book in books]
+    }
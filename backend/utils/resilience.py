@@ -0,0 +1,364 @@
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+from config import Config
+from utils.errors import BookSearchError, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Decide whether a failed upstream call is worth retrying
+    Args:
+        error: Exception raised by the call
+    Returns:
+        True for transient failures (timeouts, connection errors, 5xx/429)
+    """
+    if isinstance(error, BookSearchError):
+        return getattr(error, 'retryable', False)
+    return isinstance(error, _transient_errors())
+
+_TRANSIENT_ERRORS: Optional[Tuple[type, ...]] = None
+
+def _transient_errors() -> Tuple[type, ...]:
+    # requests is imported on the first failure, not at startup; by then the
+    # platform that failed has loaded it anyway. aiohttp is only looked up:
+    # until a session loads it, none of its errors can be raised
+    global _TRANSIENT_ERRORS
+    if _TRANSIENT_ERRORS is None:
+        import requests
+        errors = (
+            requests.ConnectionError, requests.Timeout,
+            asyncio.TimeoutError, ConnectionError, TimeoutError
+        )
+        aiohttp = sys.modules.get('aiohttp')
+        if aiohttp is None:
+            return errors
+        _TRANSIENT_ERRORS = errors + (aiohttp.ClientError,)
+    return _TRANSIENT_ERRORS
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    Exponential backoff with full jitter
+    Args:
+        attempt: Zero-based retry number
+        base: Delay before the first retry
+        cap: Upper bound for any delay
+    Returns:
+        Seconds to wait before the next attempt
+    """
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of recent traffic, so a degraded upstream sees
+    at most (1 + ratio) times normal load instead of (1 + max_retries) times.
+
+    Traffic is counted per process: each worker spends its own budget on its
+    own requests, which keeps the same ratio host-wide, but min_retries is
+    allowed per worker.
+    """
+
+    def __init__(self, ratio: float, window: float = 10.0, min_retries: int = 3):
+        self.ratio = ratio
+        self.window = window
+        self.min_retries = min_retries
+        self._requests = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+        self.exhausted = 0
+
+    def _trim(self, now: float):
+        horizon = now - self.window
+        while self._requests and self._requests[0] < horizon:
+            self._requests.popleft()
+        while self._retries and self._retries[0] < horizon:
+            self._retries.popleft()
+
+    def record_request(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            self._requests.append(now)
+
+    def try_acquire(self) -> bool:
+        """
+        Spend one retry if the budget allows it
+        Returns:
+            Whether the retry may be sent
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+                self.exhausted += 1
+                return False
+            self._retries.append(now)
+            return True
+
+class MemoryBreakerStore:
+    """Breaker state private to this process"""
+
+    blocking = False
+
+    def __init__(self):
+        self._rows: Dict[str, Tuple[int, float, float]] = {}
+        self._lock = threading.Lock()
+
+    def load(self, name: str) -> Tuple[int, float, float]:
+        with self._lock:
+            return self._rows.get(name, (0, 0.0, 0.0))
+
+    def claim_probe(self, name: str, now: float, probe_timeout: float) -> bool:
+        with self._lock:
+            failures, opened_until, probe_until = self._rows.get(name, (0, 0.0, 0.0))
+            if probe_until > now:
+                return False
+            self._rows[name] = (failures, opened_until, now + probe_timeout)
+            return True
+
+    def record_success(self, name: str):
+        with self._lock:
+            self._rows.pop(name, None)
+
+    def record_failure(self, name: str, now: float, threshold: int, recovery_timeout: float):
+        with self._lock:
+            failures, opened_until, _ = self._rows.get(name, (0, 0.0, 0.0))
+            failures += 1
+            if failures >= threshold or opened_until:
+                opened_until = now + recovery_timeout
+            self._rows[name] = (failures, opened_until, 0.0)
+
+class SQLiteBreakerStore:
+    """Breaker state in a SQLite file, shared by every worker on the host"""
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS breakers ('
+            'name TEXT PRIMARY KEY, failures INTEGER NOT NULL, '
+            'opened_until REAL NOT NULL, probe_until REAL NOT NULL)'
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=2.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def load(self, name: str) -> Tuple[int, float, float]:
+        row = self._connection().execute(
+            'SELECT failures, opened_until, probe_until FROM breakers WHERE name = ?', (name,)
+        ).fetchone()
+        return row if row else (0, 0.0, 0.0)
+
+    def claim_probe(self, name: str, now: float, probe_timeout: float) -> bool:
+        # Atomic across processes: only one worker flips probe_until forward
+        cursor = self._connection().execute(
+            'UPDATE breakers SET probe_until = ? WHERE name = ? AND probe_until <= ?',
+            (now + probe_timeout, name, now)
+        )
+        return cursor.rowcount == 1
+
+    def record_success(self, name: str):
+        self._connection().execute('DELETE FROM breakers WHERE name = ?', (name,))
+
+    def record_failure(self, name: str, now: float, threshold: int, recovery_timeout: float):
+        self._connection().execute(
+            'INSERT INTO breakers (name, failures, opened_until, probe_until) '
+            'VALUES (?, 1, CASE WHEN ? <= 1 THEN ? ELSE 0 END, 0) '
+            'ON CONFLICT(name) DO UPDATE SET '
+            'failures = failures + 1, '
+            'opened_until = CASE WHEN failures + 1 >= ? OR opened_until > 0 THEN ? ELSE opened_until END, '
+            'probe_until = 0',
+            (name, threshold, now + recovery_timeout, threshold, now + recovery_timeout)
+        )
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker for one platform.
+
+    After `failure_threshold` consecutive transient failures the breaker opens
+    and calls fail fast with CircuitOpenError. Once `recovery_timeout` has
+    passed it goes half-open and lets a single probe through; the probe's
+    outcome closes it or opens it again.
+
+    The stored state is read at most once per `state_ttl` seconds, and only
+    written when it changes, so a healthy platform costs the shared store one
+    read per TTL instead of several queries per call. Within the TTL a worker
+    may keep serving from a breaker another worker has just opened, and a
+    success may not reset failures other workers recorded meanwhile.
+    """
+
+    def __init__(self, name: str, store, failure_threshold: int = 5,
+                 recovery_timeout: float = 30.0, probe_timeout: float = 10.0, state_ttl: float = 0.0):
+        self.name = name
+        self.store = store
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.probe_timeout = probe_timeout
+        self.state_ttl = state_ttl
+        self.rejected = 0
+        # (monotonic expiry, stored row) of the last read
+        self._cached: Tuple[float, Tuple[int, float, float]] = (0.0, (0, 0.0, 0.0))
+
+    @property
+    def blocking(self) -> bool:
+        """Whether the breaker's calls may wait on SQLite (shared state)"""
+        return self.store.blocking
+
+    def state(self, now: float = None, fresh: bool = False) -> str:
+        now = time.time() if now is None else now
+        _, opened_until, _ = self._load(fresh)
+        if not opened_until:
+            return CLOSED
+        return OPEN if now < opened_until else HALF_OPEN
+
+    def before_call(self):
+        """
+        Check the breaker before an upstream call
+        Raises:
+            CircuitOpenError: If the breaker is open, or half-open with a probe in flight
+        """
+        now = time.time()
+        state = self.state(now)
+        if state == HALF_OPEN:
+            # Another worker's probe may have closed it since the last read
+            state = self.state(now, fresh=True)
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and self._claim_probe(now):
+            logger.info(f"Circuit breaker for {self.name} is half-open, sending probe")
+            return
+        self.rejected += 1
+        raise CircuitOpenError(self.name)
+
+    def record_success(self):
+        failures, opened_until, _ = self._load()
+        if not failures and not opened_until:
+            return
+        if opened_until:
+            logger.info(f"Circuit breaker for {self.name} closed")
+        self._safely(self.store.record_success, self.name)
+        self._remember((0, 0.0, 0.0))
+
+    def record_failure(self):
+        was = self.state()
+        self._safely(self.store.record_failure, self.name, time.time(), self.failure_threshold, self.recovery_timeout)
+        self._load(fresh=True)
+        if was != OPEN and self.state() == OPEN:
+            logger.warning(f"Circuit breaker for {self.name} opened")
+
+    def _load(self, fresh: bool = False) -> Tuple[int, float, float]:
+        expires, row = self._cached
+        if not fresh and time.monotonic() < expires:
+            return row
+        try:
+            row = self.store.load(self.name)
+        except sqlite3.Error as e:
+            logger.warning(f"Circuit breaker state unavailable: {str(e)}")
+            return 0, 0.0, 0.0
+        self._remember(row)
+        return row
+
+    def _remember(self, row: Tuple[int, float, float]):
+        self._cached = (time.monotonic() + self.state_ttl, tuple(row))
+
+    def _claim_probe(self, now: float) -> bool:
+        try:
+            return self.store.claim_probe(self.name, now, self.probe_timeout)
+        except sqlite3.Error as e:
+            logger.warning(f"Circuit breaker state unavailable: {str(e)}")
+            return True
+
+    def _safely(self, method, *args):
+        try:
+            method(*args)
+        except sqlite3.Error as e:
+            logger.warning(f"Circuit breaker state update failed: {str(e)}")
+
+_store = None
+_breakers: Dict[str, CircuitBreaker] = {}
+_budgets: Dict[str, RetryBudget] = {}
+_registry_lock = threading.Lock()
+
+def _get_store():
+    global _store
+    if _store is None:
+        _store = SQLiteBreakerStore(Config.BREAKER_STATE_PATH) if Config.BREAKER_STATE_PATH else MemoryBreakerStore()
+    return _store
+
+def get_breaker(platform_id: str, config: Optional[Dict] = None) -> CircuitBreaker:
+    """
+    Get the circuit breaker of a platform
+    Args:
+        platform_id: Platform identifier
+        config: Platform configuration (see Config.PLATFORMS)
+    Returns:
+        Shared CircuitBreaker instance
+    """
+    breaker = _breakers.get(platform_id)
+    if breaker is None:
+        config = config or {}
+        with _registry_lock:
+            breaker = _breakers.get(platform_id)
+            if breaker is None:
+                breaker = _breakers[platform_id] = CircuitBreaker(
+                    platform_id, _get_store(),
+                    failure_threshold=config.get('breaker_failure_threshold', 5),
+                    recovery_timeout=config.get('breaker_recovery_timeout', 30.0),
+                    state_ttl=Config.BREAKER_STATE_TTL
+                )
+    return breaker
+
+def get_retry_budget(platform_id: str, config: Optional[Dict] = None) -> RetryBudget:
+    """
+    Get the retry budget of a platform
+    Args:
+        platform_id: Platform identifier
+        config: Platform configuration (see Config.PLATFORMS)
+    Returns:
+        RetryBudget instance of this process
+    """
+    budget = _budgets.get(platform_id)
+    if budget is None:
+        config = config or {}
+        with _registry_lock:
+            budget = _budgets.get(platform_id)
+            if budget is None:
+                budget = _budgets[platform_id] = RetryBudget(config.get('retry_budget_ratio', 0.2))
+    return budget
+
+def resilience_stats() -> Dict[str, Dict]:
+    """
+    Get breaker state and retry budget counters per platform
+    Returns:
+        Statistics keyed by platform id
+    """
+    return {
+        platform_id: {
+            'state': breaker.state(),
+            'rejected': breaker.rejected,
+            'retry_budget_exhausted': _budgets[platform_id].exhausted if platform_id in _budgets else 0
+        }
+        for platform_id, breaker in list(_breakers.items())
+    }
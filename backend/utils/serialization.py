@@ -0,0 +1,94 @@
+import json
+from typing import Any
+from flask import Response, has_request_context, request
+from utils.metrics import stage
+from utils.records import Book, columnar as book_columns
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_encode_string = json.encoder.encode_basestring
+
+def _default(value: Any) -> Any:
+    if isinstance(value, Book):
+        return value.to_dict()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+# Compact and UTF-8 as is: no spaces, no \uXXXX escapes for non-ASCII titles
+_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_default)
+
+def _encode(value: Any) -> str:
+    """
+    Encode a payload, splicing in the memoized JSON of Book records.
+    Containers holding no Book go to the C encoder in one call.
+    """
+    if isinstance(value, Book):
+        return value.to_json()
+    if isinstance(value, dict):
+        if not _holds_book(value):
+            return _encoder.encode(value)
+        return '{' + ','.join(_encode_string(str(key)) + ':' + _encode(item) for key, item in value.items()) + '}'
+    if isinstance(value, (list, tuple)):
+        if value and isinstance(value[0], Book):
+            return '[' + ','.join([book.to_json() if isinstance(book, Book) else _encode(book) for book in value]) + ']'
+        if not _holds_book(value):
+            return _encoder.encode(value)
+        return '[' + ','.join(_encode(item) for item in value) + ']'
+    return _encoder.encode(value)
+
+def _holds_book(value: Any) -> bool:
+    if isinstance(value, Book):
+        return True
+    if isinstance(value, dict):
+        return any(_holds_book(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_holds_book(item) for item in value)
+    return False
+
+def dumps(payload: Any) -> bytes:
+    """
+    Serialize a response payload to compact UTF-8 JSON
+    Args:
+        payload: JSON-compatible data, possibly holding Book records
+    Returns:
+        Encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return _encode(payload).encode('utf-8')
+
+def timed_dumps(payload: Any) -> bytes:
+    """dumps() recorded as the 'serialize' stage of the current request's platform"""
+    view_args = request.view_args if has_request_context() else None
+    with stage((view_args or {}).get('platform', 'all').lower(), 'serialize'):
+        return dumps(payload)
+
+def columnar(payload: Any) -> Any:
+    """
+    Rewrite every 'books' list in a response into the columnar shape
+    (see utils.records.columnar); other keys are left untouched
+    """
+    if isinstance(payload, dict):
+        return {
+            key: book_columns(item) if key == 'books' and isinstance(item, list) else columnar(item)
+            for key, item in payload.items()
+        }
+    return payload
+
+def json_response(payload: Any, status: int = 200, shape: str = None) -> Response:
+    """
+    Build a JSON response through the fast serializer
+    Args:
+        payload: Response data
+        status: HTTP status code
+        shape: 'columns' to send book lists as field names plus rows
+    Returns:
+        Flask response
+    """
+    if shape == 'columns':
+        payload = columnar(payload)
+    return Response(timed_dumps(payload), status=status, mimetype='application/json')
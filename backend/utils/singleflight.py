@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-worker coalescing is unavailable
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+class _Call:
+    """An in-flight call that followers wait on"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into one execution.
+
+    Within a process, followers block on the leader's result, for at most
+    the timeout given to do(); past it they make the call themselves, so a
+    hung leader cannot hold them forever. When `lock_dir` is set, leaders in
+    different worker processes also serialize on a per-key lock file, so the
+    second worker finds the result in the shared disk cache instead of
+    fetching upstream again. Lock files are removed on release.
+    """
+
+    def __init__(self, lock_dir: str = ''):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'executions': 0, 'deduplicated': 0, 'cross_worker_waits': 0,
+                       'follower_timeouts': 0}
+        self.lock_dir = lock_dir if fcntl is not None else ''
+        if lock_dir and fcntl is None:
+            logger.warning("fcntl is unavailable, cross-worker request coalescing is disabled")
+        if self.lock_dir and not os.path.exists(self.lock_dir):
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: float = None) -> Any:
+        """
+        Run fn once for all concurrent callers with the same key
+        Args:
+            key: Normalized request key
+            fn: Zero-argument callable doing the actual work
+            timeout: Seconds a follower waits for the leader before calling
+                fn itself (None waits indefinitely)
+        Returns:
+            The shared result of fn
+        Raises:
+            Whatever fn raised, re-raised in every waiting caller
+        """
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._stats['executions'] += 1
+            else:
+                self._stats['deduplicated'] += 1
+
+        if not leader:
+            if not call.done.wait(timeout):
+                with self._lock:
+                    self._stats['follower_timeouts'] += 1
+                logger.warning(f"Coalesced call {key} still running after {timeout}s, calling directly")
+                return fn()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, fn)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _run(self, key: str, fn: Callable[[], Any]) -> Any:
+        if not self.lock_dir:
+            return fn()
+
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        path = os.path.join(self.lock_dir, f"{digest}.lock")
+        lock_file = self._lock_file(path)
+        try:
+            return fn()
+        finally:
+            # Unlinked while still locked: a worker blocked on this file sees
+            # it is gone once it gets the lock and retries on a new one
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            lock_file.close()
+
+    def _lock_file(self, path: str):
+        """Open and exclusively lock the lock file at path, waiting for other workers"""
+        while True:
+            lock_file = open(path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                with self._lock:
+                    self._stats['cross_worker_waits'] += 1
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # The previous holder may have unlinked the file after it was
+            # opened here; that lock protects nothing, so start over
+            try:
+                current = os.stat(path)
+                opened = os.fstat(lock_file.fileno())
+                if (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino):
+                    return lock_file
+            except FileNotFoundError:
+                pass
+            lock_file.close()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get coalescing counters
+        Returns:
+            Calls seen, upstream executions, deduplicated calls and
+            followers that stopped waiting for a leader
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
+
+class AsyncSingleFlight:
+    """
+    Coalesce concurrent coroutine calls that share a key.
+
+    Must only be used from one event loop (the worker's background loop).
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._stats = {'calls': 0, 'executions': 0, 'deduplicated': 0}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]) -> Any:
+        """
+        Await fn once for all concurrent callers with the same key
+        Args:
+            key: Normalized request key
+            fn: Zero-argument callable returning an awaitable
+        Returns:
+            The shared result of fn
+        """
+        self._stats['calls'] += 1
+        task = self._calls.get(key)
+        if task is not None:
+            self._stats['deduplicated'] += 1
+        else:
+            # The shared fetch runs as its own task, so a caller hitting its
+            # deadline cancels only its wait, not everyone else's result
+            self._stats['executions'] += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved in case every caller gave up waiting
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get coalescing counters
+        Returns:
+            Calls seen, upstream executions and deduplicated calls
+        """
+        stats = dict(self._stats)
+        stats['in_flight'] = len(self._calls)
+        return stats